@@ -4,16 +4,32 @@ Premium UI with themes, accessibility, responsive design, drive mode & offline s
 """
 
 import streamlit as st
-import pandas as pd
-import folium
-from folium import plugins
-from streamlit_folium import st_folium
+from streamlit.errors import StreamlitAPIException
 import time
 import json
-import base64
+import logging
+import hashlib
+import re
+import threading
+import uuid
+import inspect
+import concurrent.futures
 from datetime import datetime
-from dijkstra import load_cities, build_graph, dijkstra, calculate_distance_km
-from locations_data import get_all_locations, get_location_categories
+from xml.sax.saxutils import escape
+from collections import ChainMap, OrderedDict
+from types import MappingProxyType
+from dijkstra import calculate_distance_km
+from route_engine import (
+    RouteEngine, snap_location, get_road_distance, est_time,
+    fuel_liters, fuel_cost, build_route_segments, remaining_road_distance,
+)
+from gazetteer import CITY_CATEGORY
+from places_data import get_all_places, DEFAULT_PLACES
+from spatial_index import GridIndex
+
+
+# Developer telemetry (map cache, route prefetch) goes here, not to the page
+logger = logging.getLogger(__name__)
 
 
 # ==================== PAGE CONFIG ====================
@@ -25,41 +41,139 @@ st.set_page_config(
     menu_items=None  # Disable menu
 )
 
-# Add viewport meta tag for proper mobile rendering and early warning suppression
+# Add viewport meta tag for proper mobile rendering
 st.markdown("""
 <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=5.0, user-scalable=yes">
+""", unsafe_allow_html=True)
+
+
+# ==================== CLIENT CONTROLLER ====================
+# Scripts inside st.markdown are inserted as inert HTML and never run, so the
+# page behaviour lives in one script served through a 1px component
+# iframe. It installs itself once on the parent page (mobile sidebar overlay,
+# sidebar show/hide, console noise filter) and is purely event-driven: no
+# polling timers and no subtree-wide MutationObservers.
+CLIENT_CONTROLLER = """
 <script>
-    // Early warning suppression - runs immediately to catch Streamlit warnings
+    // SafarPak page controller. Runs inside a 1px component iframe and
+    // installs itself once on the app page; later reruns only push new state.
     (function() {
+        const win = window.parent;
+        const doc = win.document;
+        const state = { sidebarVisible: __SIDEBAR_VISIBLE__ };
+        
+        if (win.__safarpakController) {
+            win.__safarpakController.update(state);
+            return;
+        }
+        
+        // Suppress harmless browser/Streamlit console noise
         const suppressPatterns = [
             'Unrecognized feature:', 'ambient-light-sensor', 'battery', 'document-domain',
             'layout-animations', 'legacy-image-formats', 'oversized-images', 'vr', 'wake-lock',
             'iframe which has both allow-scripts and allow-same-origin',
             'A form field element should have an id or name attribute',
             'form field element has neither an id nor a name attribute',
-            'No label associated with a form field', 'index.CqTPbV5Y.js', 'Understand this warning'
+            'No label associated with a form field', 'Understand this warning'
         ];
+        function shouldSuppress(args) {
+            const msg = args.join(' ');
+            return suppressPatterns.some(p => msg.includes(p));
+        }
+        ['warn', 'error', 'log'].forEach(function(level) {
+            const original = win.console[level];
+            win.console[level] = function(...args) {
+                if (!shouldSuppress(args)) original.apply(win.console, args);
+            };
+        });
         
-        function shouldSuppress(msg) {
-            return suppressPatterns.some(p => msg && msg.includes && msg.includes(p));
+        // Mobile overlay behind the open sidebar; tapping it closes the sidebar
+        const overlay = doc.createElement('div');
+        overlay.id = 'sidebar-overlay';
+        overlay.style.cssText = 'position:fixed;inset:0;background:rgba(0,0,0,0.5);z-index:997;display:none;opacity:0;transition:opacity 0.3s ease;';
+        doc.body.appendChild(overlay);
+        
+        let sidebar = null;
+        let framePending = false;
+        const sidebarObserver = new win.MutationObserver(schedule);
+        
+        function findSidebar() {
+            return doc.querySelector('section[data-testid="stSidebar"]');
         }
         
-        const origWarn = console.warn;
-        const origError = console.error;
-        const origLog = console.log;
+        function isSidebarOpen() {
+            return !!sidebar && (sidebar.getAttribute('aria-expanded') === 'true' || sidebar.offsetWidth > 0);
+        }
         
-        console.warn = function(...args) {
-            if (!shouldSuppress(args.join(' '))) origWarn.apply(console, args);
-        };
-        console.error = function(...args) {
-            if (!shouldSuppress(args.join(' '))) origError.apply(console, args);
-        };
-        console.log = function(...args) {
-            if (!shouldSuppress(args.join(' '))) origLog.apply(console, args);
+        function closeSidebar() {
+            const toggle = doc.querySelector('button[aria-label*="sidebar" i]');
+            if (toggle) toggle.click();
+        }
+        
+        // Watch only the sidebar's own attributes, re-attaching if React replaces it
+        function attachSidebar() {
+            const current = findSidebar();
+            if (current === sidebar) return;
+            sidebarObserver.disconnect();
+            sidebar = current;
+            if (sidebar) {
+                sidebarObserver.observe(sidebar, { attributes: true, attributeFilter: ['aria-expanded', 'class'] });
+            }
+        }
+        
+        function applySidebarVisibility() {
+            if (!sidebar) return;
+            if (state.sidebarVisible) {
+                sidebar.style.removeProperty('display');
+                sidebar.style.removeProperty('visibility');
+            } else {
+                sidebar.style.setProperty('display', 'none', 'important');
+                sidebar.style.setProperty('visibility', 'hidden', 'important');
+            }
+        }
+        
+        function render() {
+            framePending = false;
+            attachSidebar();
+            applySidebarVisibility();
+            const showOverlay = win.innerWidth <= 768 && state.sidebarVisible && isSidebarOpen();
+            overlay.style.display = showOverlay ? 'block' : 'none';
+            overlay.style.opacity = showOverlay ? '1' : '0';
+            doc.body.style.overflow = showOverlay ? 'hidden' : '';
+        }
+        
+        // Coalesce bursts of events into one DOM pass per animation frame
+        function schedule() {
+            if (framePending) return;
+            framePending = true;
+            win.requestAnimationFrame(render);
+        }
+        
+        overlay.addEventListener('click', closeSidebar);
+        win.addEventListener('resize', schedule, { passive: true });
+        doc.addEventListener('click', function(e) {
+            if (win.innerWidth > 768 || !isSidebarOpen()) return;
+            const target = e.target;
+            if (sidebar.contains(target) || target === overlay || target.closest('button[aria-label*="sidebar" i]')) return;
+            closeSidebar();
+        }, true);
+        
+        // The sidebar may mount after this script; retry a few times, then rely on events
+        let attempts = 0;
+        (function waitForSidebar() {
+            schedule();
+            if (!findSidebar() && ++attempts < 10) win.setTimeout(waitForSidebar, 250);
+        })();
+        
+        win.__safarpakController = {
+            update: function(next) {
+                Object.assign(state, next);
+                schedule();
+            }
         };
     })();
 </script>
-""", unsafe_allow_html=True)
+"""
 
 
 # ==================== THEME SYSTEM ====================
@@ -2179,200 +2293,401 @@ def get_theme_css(theme):
     """
 
 
-# ==================== SAMPLE DATA ====================
-def get_nearby_places(city, category):
-    """Get nearby places for a specific city and category."""
-    # Define places for different major cities/areas
-    city_places = {
-        # Karachi locations
-        "Karachi": {
-            "restaurants": [
-                {"name": "Kolachi", "type": "Seafood", "rating": 4.6, "distance": "1.2 km", "price": "$$$"},
-                {"name": "BBQ Tonight", "type": "Pakistani BBQ", "rating": 4.5, "distance": "0.8 km", "price": "$$"},
-                {"name": "Café Zouk", "type": "Continental", "rating": 4.4, "distance": "1.5 km", "price": "$$"},
-                {"name": "Burns Road Food Street", "type": "Street Food", "rating": 4.7, "distance": "2.0 km", "price": "$"},
-                {"name": "Okra", "type": "Fine Dining", "rating": 4.8, "distance": "1.8 km", "price": "$$$"},
-            ],
-            "hotels": [
-                {"name": "Pearl Continental", "type": "5-Star", "rating": 4.8, "distance": "1.0 km", "price": "$$$"},
-                {"name": "Marriott Hotel", "type": "5-Star", "rating": 4.7, "distance": "1.5 km", "price": "$$$"},
-                {"name": "Ramada Hotel", "type": "4-Star", "rating": 4.4, "distance": "0.8 km", "price": "$$"},
-                {"name": "Avari Towers", "type": "5-Star", "rating": 4.6, "distance": "2.2 km", "price": "$$$"},
-            ],
-            "cafes": [
-                {"name": "Gloria Jean's", "type": "Coffee Shop", "rating": 4.4, "distance": "0.5 km", "price": "$$"},
-                {"name": "Espresso", "type": "Café", "rating": 4.3, "distance": "0.7 km", "price": "$$"},
-                {"name": "The Second Cup", "type": "Coffee Shop", "rating": 4.2, "distance": "1.0 km", "price": "$$"},
-                {"name": "Butlers Chocolate Café", "type": "Café", "rating": 4.5, "distance": "1.3 km", "price": "$$"},
-            ],
-            "parks": [
-                {"name": "Beach Park", "type": "Recreation", "rating": 4.5, "distance": "3.0 km", "price": "Free"},
-                {"name": "Safari Park", "type": "Zoo & Park", "rating": 4.3, "distance": "8.0 km", "price": "Rs.50"},
-                {"name": "Hill Park", "type": "Public Park", "rating": 4.4, "distance": "5.0 km", "price": "Free"},
-            ],
-        },
-        # Islamabad locations
-        "Islamabad": {
-            "restaurants": [
-                {"name": "Monal Restaurant", "type": "Pakistani", "rating": 4.7, "distance": "8.0 km", "price": "$$$"},
-                {"name": "Savour Foods", "type": "Pakistani", "rating": 4.6, "distance": "1.2 km", "price": "$$"},
-                {"name": "Kabul Restaurant", "type": "Afghani", "rating": 4.5, "distance": "0.8 km", "price": "$$"},
-                {"name": "Chaaye Khana", "type": "Café Restaurant", "rating": 4.4, "distance": "1.5 km", "price": "$$"},
-                {"name": "Des Pardes", "type": "Pakistani", "rating": 4.3, "distance": "2.0 km", "price": "$$"},
-            ],
-            "hotels": [
-                {"name": "Serena Hotel", "type": "5-Star", "rating": 4.9, "distance": "2.0 km", "price": "$$$"},
-                {"name": "Islamabad Hotel", "type": "4-Star", "rating": 4.5, "distance": "1.5 km", "price": "$$"},
-                {"name": "Ramada Hotel", "type": "4-Star", "rating": 4.4, "distance": "3.0 km", "price": "$$"},
-                {"name": "Hotel One", "type": "Business", "rating": 4.2, "distance": "2.5 km", "price": "$$"},
-            ],
-            "cafes": [
-                {"name": "Gloria Jean's", "type": "Coffee Shop", "rating": 4.4, "distance": "0.5 km", "price": "$$"},
-                {"name": "Coffee Bean & Tea Leaf", "type": "Coffee Shop", "rating": 4.3, "distance": "1.0 km", "price": "$$"},
-                {"name": "The Second Cup", "type": "Coffee Shop", "rating": 4.2, "distance": "0.8 km", "price": "$$"},
-            ],
-            "parks": [
-                {"name": "Fatima Jinnah Park", "type": "National Park", "rating": 4.6, "distance": "2.5 km", "price": "Free"},
-                {"name": "Lake View Park", "type": "Recreation", "rating": 4.4, "distance": "3.0 km", "price": "$"},
-                {"name": "Daman-e-Koh", "type": "Viewpoint", "rating": 4.8, "distance": "5.0 km", "price": "Free"},
-                {"name": "Shakarparian Park", "type": "Public Park", "rating": 4.5, "distance": "4.0 km", "price": "Free"},
-            ],
-        },
-        # Lahore locations
-        "Lahore": {
-            "restaurants": [
-                {"name": "Cuckoo's Den", "type": "Pakistani", "rating": 4.8, "distance": "2.0 km", "price": "$$$"},
-                {"name": "Butt Karahi", "type": "Pakistani BBQ", "rating": 4.7, "distance": "1.5 km", "price": "$$"},
-                {"name": "Food Street", "type": "Street Food", "rating": 4.6, "distance": "3.0 km", "price": "$"},
-                {"name": "Salt'n Pepper", "type": "Pakistani", "rating": 4.5, "distance": "1.2 km", "price": "$$"},
-                {"name": "Haveli Restaurant", "type": "Pakistani", "rating": 4.4, "distance": "4.0 km", "price": "$$"},
-            ],
-            "hotels": [
-                {"name": "Pearl Continental", "type": "5-Star", "rating": 4.8, "distance": "1.5 km", "price": "$$$"},
-                {"name": "Nishat Hotel", "type": "5-Star", "rating": 4.7, "distance": "2.0 km", "price": "$$$"},
-                {"name": "Avari Hotel", "type": "5-Star", "rating": 4.6, "distance": "1.8 km", "price": "$$$"},
-            ],
-            "cafes": [
-                {"name": "Gloria Jean's", "type": "Coffee Shop", "rating": 4.4, "distance": "0.5 km", "price": "$$"},
-                {"name": "Espresso", "type": "Café", "rating": 4.3, "distance": "0.7 km", "price": "$$"},
-            ],
-            "parks": [
-                {"name": "Jinnah Park", "type": "Public Park", "rating": 4.5, "distance": "2.0 km", "price": "Free"},
-                {"name": "Race Course Park", "type": "Recreation", "rating": 4.6, "distance": "3.5 km", "price": "Rs.20"},
-            ],
-        },
-    }
-    
-    # Try to find matching city (check if city name contains any key)
-    matched_city = None
-    city_lower = city.lower()
-    
-    # Check for major cities in the location name
-    for key in city_places.keys():
-        key_lower = key.lower()
-        # Check if city name contains the key or vice versa
-        if key_lower in city_lower or city_lower in key_lower:
-            matched_city = key
-            break
-    
-    # Also check for common area prefixes (DHA, F-7, etc.)
-    if not matched_city:
-        if "karachi" in city_lower or "dha" in city_lower:
-            matched_city = "Karachi"
-        elif "islamabad" in city_lower or "f-" in city_lower or "g-" in city_lower:
-            matched_city = "Islamabad"
-        elif "lahore" in city_lower:
-            matched_city = "Lahore"
-    
-    # If no match found, use default data
-    if matched_city and category in city_places[matched_city]:
-        return city_places[matched_city][category]
-    
-    # Default fallback data
-    default_data = {
-        "restaurants": [
-            {"name": "Local Restaurant", "type": "Pakistani", "rating": 4.0, "distance": "0.5 km", "price": "$$"},
-            {"name": "Food Point", "type": "Fast Food", "rating": 3.8, "distance": "1.0 km", "price": "$"},
-        ],
-        "hotels": [
-            {"name": "Local Hotel", "type": "3-Star", "rating": 3.5, "distance": "1.0 km", "price": "$$"},
-        ],
-        "cafes": [
-            {"name": "Local Café", "type": "Coffee Shop", "rating": 3.8, "distance": "0.5 km", "price": "$$"},
-        ],
-        "parks": [
-            {"name": "Local Park", "type": "Public Park", "rating": 4.0, "distance": "1.0 km", "price": "Free"},
-        ],
-    }
+THEME_NAMES = ("dark", "light", "colorblind")
+
+
+def minify_css(css):
+    """Strip comments and redundant whitespace from a stylesheet."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = css.replace(";}", "}")
+    return css.strip()
+
+
+@st.cache_resource
+def compile_theme_stylesheets():
+    """Minify every theme's stylesheet once per process, keyed by content hash.
     
-    return default_data.get(category, [])
+    Returns {theme: (hash, css)}. The hash goes into the <style> tag so the
+    browser-side diff sees identical markup on reruns that keep the same theme.
+    """
+    sheets = {}
+    for name in THEME_NAMES:
+        css = minify_css(get_theme_css(name))
+        digest = hashlib.sha1(css.encode()).hexdigest()[:12]
+        sheets[name] = (digest, css.replace("<style>", f'<style data-theme="{name}" data-hash="{digest}">', 1))
+    return sheets
+
+
+def get_theme_stylesheet(theme):
+    """Return the precompiled, minified stylesheet for a theme."""
+    sheets = compile_theme_stylesheets()
+    return sheets.get(theme, sheets["dark"])[1]
+
+
+# ==================== NEARBY PLACES ====================
+@st.cache_resource
+def load_place_index():
+    """Spatial index of nearby places for each category, built once per process."""
+    indexes = {}
+    for place in get_all_places():
+        indexes.setdefault(place["category"], GridIndex(cell_deg=0.1)).insert(place["lat"], place["lon"], MappingProxyType(place))
+    return MappingProxyType(indexes)
+
+
+def get_nearby_places(location, category, all_locations, limit=5, radius_km=30):
+    """Get the closest places of a category to a location, by actual distance."""
+    index = load_place_index().get(category)
+    coords = all_locations[location]
+    if index is not None:
+        hits = index.nearest(coords["lat"], coords["lon"], k=limit, max_km=radius_km)
+        if hits:
+            return [{**place, "distance": f"{dist:.1f} km"} for dist, place in hits]
+    
+    # Nothing listed near this stop: fall back to generic suggestions
+    return DEFAULT_PLACES.get(category, [])
 
 
 # ==================== HELPER FUNCTIONS ====================
-@st.cache_data
-def load_data():
-    return load_cities("pak_cities.csv")
+# The city list, location store, graphs and snapping table live in one
+# RouteEngine shared by every session through st.cache_resource. Its stores
+# are read-only views; per-session custom locations live in overlays on top
+# of them (see main()).
+@st.cache_resource
+def get_route_engine():
+    return RouteEngine()
+
+
+# ==================== ROUTE JOBS ====================
+# Route searches run on a shared worker pool so slow queries (large range
+# thresholds, cold graph caches) never block a session's script thread.
+ROUTE_WORKERS = 4
 
+# Seconds the script waits for a job before handing it to the polling fragment
+ROUTE_INLINE_WAIT = 0.15
 
-@st.cache_data
-def load_all_locations():
-    cities = load_cities("pak_cities.csv")
-    all_locations = {city["name"]: {"lat": city["lat"], "lon": city["lon"], "type": "city"} for city in cities}
-    for name, coords in get_all_locations().items():
-        if name not in all_locations:
-            all_locations[name] = {"lat": coords[0], "lon": coords[1], "type": "area"}
-    return all_locations
+# Seconds between polls while a job is still running
+ROUTE_POLL_INTERVAL = 0.5
 
 
-@st.cache_data
-def build_city_graph(threshold):
-    return build_graph(load_data(), threshold_km=threshold)
+@st.cache_resource
+def get_route_executor():
+    return concurrent.futures.ThreadPoolExecutor(max_workers=ROUTE_WORKERS, thread_name_prefix="route")
 
 
-def find_nearest_city(loc_coords, cities):
-    min_dist, nearest = float('inf'), None
-    for city in cities:
-        dist = calculate_distance_km(loc_coords["lat"], loc_coords["lon"], city["lat"], city["lon"])
-        if dist < min_dist:
-            min_dist, nearest = dist, city["name"]
-    return nearest, min_dist
+def compute_route(source, dest, threshold, endpoints, snap_table, src_city=None, tree_future=None):
+    """Worker-side route search; touches only shared read-only stores."""
+    # A speculative tree still being built is finished sooner than a fresh search
+    trees = {src_city: tree_future.result()} if tree_future is not None else None
+    return get_route_engine().route(source, dest, threshold, endpoints, snap_table, trees)
+
+
+def submit_route_job(source, dest, threshold, all_locations, snap_table, settings):
+    """Start a route search in the background and return its job record."""
+    # The worker gets its own copies of the session-specific pieces
+    engine = get_route_engine()
+    endpoints = ChainMap({source: all_locations[source], dest: all_locations[dest]}, engine.locations)
+    src_city, _ = engine.snap(source, all_locations, snap_table)
+    tree_future = get_tree_cache().claim(threshold, src_city)
+    future = get_route_executor().submit(compute_route, source, dest, threshold, endpoints, ChainMap({}, snap_table), src_city, tree_future)
+    return {
+        'id': uuid.uuid4().hex,
+        'future': future,
+        'source': source,
+        'dest': dest,
+        'threshold': threshold,
+        'settings': settings,
+        'started': time.perf_counter(),
+    }
 
 
-def find_route(source, dest, all_locations, cities, graph):
-    src_coords, dst_coords = all_locations[source], all_locations[dest]
-    direct = calculate_distance_km(src_coords["lat"], src_coords["lon"], dst_coords["lat"], dst_coords["lon"])
+def cancel_route_job(job):
+    """Drop a superseded job. Queued jobs never start; a running one finishes and is ignored."""
+    job['future'].cancel()
+
+
+def finish_route_job(job, all_locations):
+    """Store a finished job's route (or its error, shown by main()) in session state and clear the job."""
+    st.session_state.route_job = None
+    try:
+        path, straight_distance, route_mode = job['future'].result()
+    except concurrent.futures.CancelledError:
+        return
+    except Exception as e:
+        # Kept in session state so it survives the rerun that follows a polled job
+        st.session_state.route_error = f"⚠️ Route search failed: {e}"
+        return
+    
+    if path:
+        # Apply road factor for realistic distance
+        distance = get_road_distance(straight_distance)
+        settings = job['settings']
+        mode_key, fuel_avg, fuel_price = settings['mode_key'], settings['fuel_avg'], settings['fuel_price']
+        st.session_state.route_data = {
+            'path': path,
+            'distance': distance,
+            'straight_distance': straight_distance,
+            'route_mode': route_mode,
+            **settings,
+            'liters': fuel_liters(distance, mode_key, fuel_avg),
+            'fuel_cost': fuel_cost(distance, mode_key, fuel_avg, fuel_price),
+            'segments': build_route_segments(path, all_locations),
+        }
+        st.session_state.route_source = job['source']
+        st.session_state.route_dest = job['dest']
+
+
+def _poll_route_job(all_locations):
+    job = st.session_state.get('route_job')
+    if job is None:
+        return
+    if job['future'].done():
+        finish_route_job(job, all_locations)
+        st.rerun()
+    elapsed = time.perf_counter() - job['started']
+    st.info(f"⏳ Finding route from {job['source']} to {job['dest']}… ({elapsed:.1f}s)")
+
+
+# Streamlit releases without fragments never call this (see main())
+poll_route_job = st.fragment(run_every=ROUTE_POLL_INTERVAL)(_poll_route_job) if hasattr(st, "fragment") else _poll_route_job
+
+
+# ==================== ROUTE PREFETCH ====================
+# Users pick the source first and the destination a few seconds later, so a
+# single-source search from the source's city starts as soon as it is picked.
+# FIND ROUTE then only reads its path out of the finished tree.
+TREE_WORKERS = 2
+
+# Number of shortest-path trees kept in memory across all sessions
+TREE_CACHE_SIZE = 64
+
+
+@st.cache_resource
+def get_tree_executor():
+    # Separate from the route pool: route jobs wait on trees, so sharing
+    # one pool could leave every worker waiting on a queued tree
+    return concurrent.futures.ThreadPoolExecutor(max_workers=TREE_WORKERS, thread_name_prefix="tree")
+
+
+def build_route_tree(threshold, src_city):
+    return get_route_engine().shortest_path_tree(threshold, src_city)
+
+
+class TreeCache:
+    """Process-wide LRU cache of speculative shortest-path trees.
     
-    if direct < 50:
-        return [source, dest], round(direct, 2), "local"
+    Entries are keyed by (range threshold, source city) and hold the future
+    of the background search, so a route can claim a tree that is still
+    being built. Counters record how speculation pays off:
     
-    src_city, src_dist = find_nearest_city(src_coords, cities)
-    dst_city, dst_dist = find_nearest_city(dst_coords, cities)
+    - hits: FIND ROUTE found a finished tree for its source
+    - late: FIND ROUTE found the tree still being built and waited for it
+    - misses: FIND ROUTE found no tree (evicted, or never speculated)
+    - wasted: a tree was evicted without ever answering a route
+    """
     
-    if src_city == dst_city:
-        return [source, dest], round(direct, 2), "local"
+    def __init__(self, max_entries=TREE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.late = 0
+        self.misses = 0
+        self.wasted = 0
+    
+    def speculate(self, threshold, src_city):
+        """Start building the tree for src_city unless it is cached already."""
+        key = (threshold, src_city)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            future = get_tree_executor().submit(build_route_tree, threshold, src_city)
+            self.entries[key] = {'future': future, 'used': False}
+            self.started += 1
+            while len(self.entries) > self.max_entries:
+                _, evicted = self.entries.popitem(last=False)
+                if not evicted['used']:
+                    evicted['future'].cancel()
+                    self.wasted += 1
+    
+    def claim(self, threshold, src_city):
+        """Return the tree future for a route about to be searched, or None."""
+        with self.lock:
+            entry = self.entries.get((threshold, src_city))
+            if entry is None or entry['future'].cancelled():
+                self.misses += 1
+                return None
+            self.entries.move_to_end((threshold, src_city))
+            entry['used'] = True
+            if entry['future'].done():
+                self.hits += 1
+            else:
+                self.late += 1
+            return entry['future']
+    
+    def stats(self):
+        with self.lock:
+            idle = sum(1 for entry in self.entries.values() if not entry['used'])
+            return {
+                'started': self.started,
+                'hits': self.hits,
+                'late': self.late,
+                'misses': self.misses,
+                'wasted': self.wasted,
+                'idle': idle,
+            }
+
+
+@st.cache_resource
+def get_tree_cache():
+    return TreeCache()
+
+
+def speculate_route_tree(source, threshold, all_locations, snap_table):
+    """Prefetch the shortest-path tree for routes starting at source."""
+    src_city, _ = get_route_engine().snap(source, all_locations, snap_table)
+    get_tree_cache().speculate(threshold, src_city)
+
+
+# ==================== LOCATION SEARCH ====================
+# Search-as-you-type above each location picker. Matching runs on the server
+# against the engine's search index, so only a handful of results reach the
+# browser; the selectbox below lists every location only while that is small.
+SEARCH_MATCHES = 8
+
+# Pause in typing after which the search box commits (Streamlit's `live`
+# inputs). True is Streamlit's 250 ms default; a duration string such as
+# "200ms" is parsed with pandas, which would load it on every first render
+SEARCH_LIVE_DELAY = True
+
+# Above this many locations a picker's selectbox lists the cities and the
+# current choice only; everything else is reached through search
+PICKER_FULL_LIST_MAX = 2000
+
+_SEARCH_INPUT_ARGS = {"live": SEARCH_LIVE_DELAY} if "live" in inspect.signature(st.text_input).parameters else {}
+
+
+def picker_options(location_ids, selected_index, city_ids):
+    """(options, index) for a location selectbox."""
+    if len(location_ids) <= PICKER_FULL_LIST_MAX:
+        return location_ids, selected_index
+    current = location_ids[selected_index]
+    return [current] + [i for i in city_ids if i != current], 0
+
+
+def pick_search_match(side, index):
+    """Select a search result in the `side` picker ("src" or "dst") and clear the search."""
+    st.session_state[f"{side}_index"] = index
+    st.session_state[f"{side}_query"] = ""
+    # Drop the selectbox's own state so it picks up the new index
+    if side in st.session_state:
+        del st.session_state[side]
+
+
+def _location_search(side, all_locations):
+    query = st.text_input("Search", key=f"{side}_query", placeholder="🔎 Search places…",
+                          label_visibility="collapsed", **_SEARCH_INPUT_ARGS)
+    if not query.strip():
+        return
+    matches = all_locations.search(query, SEARCH_MATCHES)
+    if not matches:
+        st.caption("No matching places")
+        return
+    for rank, (loc_id, alias) in enumerate(matches):
+        name = all_locations.name_of(loc_id)
+        label = f"{name} ({alias})" if alias else name
+        if st.button(label, key=f"{side}_match_{rank}", on_click=pick_search_match,
+                     args=(side, all_locations.index(name)), use_container_width=True):
+            # Typing only reruns this fragment; a pick updates the whole page
+            st.rerun()
+
+
+# Without fragments every keystroke reruns the whole script
+location_search = st.fragment(_location_search) if hasattr(st, "fragment") else _location_search
+
+
+# ==================== MAPS ====================
+# Map tiles that match each app theme
+MAP_TILES = {"dark": "CartoDB dark_matter", "light": "CartoDB positron", "colorblind": "CartoDB dark_matter"}
+
+# Number of rendered maps kept in memory across all sessions
+MAP_CACHE_SIZE = 64
+
+
+class MapCache:
+    """Process-wide LRU cache of rendered folium map HTML.
     
-    try:
-        city_path, city_dist = dijkstra(graph, src_city, dst_city)
-        if city_path:
-            path = [source] + ([src_city] if source != src_city else [])
-            path += city_path[1:-1]
-            path += ([dst_city] if dest != dst_city else []) + [dest]
-            seen, unique = set(), []
-            for p in path:
-                if p not in seen:
-                    seen.add(p)
-                    unique.append(p)
-            return unique, round(src_dist + city_dist + dst_dist, 2), "intercity"
-    except:
-        pass
-    return [source, dest], round(direct, 2), "direct"
-
-
-def create_map(path, locations, mode="car"):
+    A folium.Map cannot be safely rendered twice (each render appends its
+    scripts again), so the finished HTML document is cached instead and
+    displayed with embed_html. Keys describe everything that changes
+    the map: stop coordinates, travel mode and tile theme.
+    """
+    
+    def __init__(self, max_entries=MAP_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get_or_render(self, key, build_map):
+        """Return (html, hit, elapsed_ms), building and rendering the map on a miss."""
+        start = time.perf_counter()
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return html, True, (time.perf_counter() - start) * 1000
+        
+        html = build_map().get_root().render()
+        with self.lock:
+            self.entries[key] = html
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.misses += 1
+        return html, False, (time.perf_counter() - start) * 1000
+
+
+@st.cache_resource
+def get_map_cache():
+    return MapCache()
+
+
+def embed_html(html, height):
+    """Show an HTML document in a script-enabled iframe."""
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=height)
+    else:
+        # Streamlit releases before st.iframe
+        import streamlit.components.v1 as components
+        components.html(html, height=height)
+
+
+def render_cached_map(key, build_map, height):
+    """Show a display-only map, reusing rendered HTML when nothing has changed."""
+    html, hit, elapsed_ms = get_map_cache().get_or_render(key, build_map)
+    embed_html(html, height)
+    return hit, elapsed_ms
+
+
+def route_map_key(path, locations):
+    return tuple((loc, locations[loc]["lat"], locations[loc]["lon"]) for loc in path)
+
+
+def create_map(path, locations, mode="car", tiles=MAP_TILES["dark"]):
     coords = [(locations[loc]["lat"], locations[loc]["lon"]) for loc in path]
     center = [sum(c[0] for c in coords)/len(coords), sum(c[1] for c in coords)/len(coords)]
     
-    m = folium.Map(location=center, zoom_start=6, tiles='CartoDB dark_matter')
+    # folium is imported on first use so pages without a map never pay for it
+    import folium
+    from folium import plugins
+    
+    m = folium.Map(location=center, zoom_start=6, tiles=tiles)
     
     colors = {"car": "#22c55e", "bike": "#f59e0b", "cycle": "#3b82f6", "walk": "#8b5cf6"}
     color = colors.get(mode, "#22c55e")
@@ -2394,26 +2709,42 @@ def create_map(path, locations, mode="car"):
     return m
 
 
-def get_road_distance(straight_dist):
-    """Convert straight-line distance to approximate road distance.
-    Roads are typically 1.3-1.5x longer than straight line distance."""
-    ROAD_FACTOR = 1.4  # Average road winding factor
-    return round(straight_dist * ROAD_FACTOR, 1)
-
-
-def est_time(dist, speed):
-    """Estimate travel time based on distance and speed."""
-    hrs = dist / speed if speed > 0 else 0
-    if hrs < 1:
-        return f"{int(hrs * 60)} min"
-    else:
-        h = int(hrs)
-        m = int((hrs - h) * 60)
-        return f"{h}h {m}m"
+def create_drive_map(current_loc, next_loc, locations, tiles=MAP_TILES["dark"]):
+    """Mini map of the current drive-mode segment."""
+    current = [locations[current_loc]["lat"], locations[current_loc]["lon"]]
+    upcoming = [locations[next_loc]["lat"], locations[next_loc]["lon"]]
+    
+    import folium
+    from folium import plugins
+    
+    drive_map = folium.Map(location=current, zoom_start=10, tiles=tiles)
+    
+    # Add markers for current segment
+    folium.Marker(
+        current,
+        tooltip="📍 You are here",
+        icon=folium.Icon(color='green', icon='car', prefix='fa')
+    ).add_to(drive_map)
+    
+    folium.Marker(
+        upcoming,
+        tooltip=f"🎯 Next: {next_loc}",
+        icon=folium.Icon(color='blue', icon='flag', prefix='fa')
+    ).add_to(drive_map)
+    
+    # Add route line
+    segment_coords = [current, upcoming]
+    folium.PolyLine(segment_coords, weight=6, color='#22c55e', opacity=0.9).add_to(drive_map)
+    plugins.AntPath(segment_coords, delay=800, weight=4, color='#22c55e', pulse_color='#fff').add_to(drive_map)
+    
+    drive_map.fit_bounds(segment_coords, padding=[50, 50])
+    return drive_map
 
 
 def create_map_picker(center_lat=30.3753, center_lon=69.3451, default_zoom=10):
     """Create an interactive map for location picking with a draggable marker."""
+    import folium
+    
     m = folium.Map(location=[center_lat, center_lon], zoom_start=default_zoom, tiles='CartoDB dark_matter')
     
     # Create a red icon - use explicit red color
@@ -2453,21 +2784,14 @@ def create_map_picker(center_lat=30.3753, center_lon=69.3451, default_zoom=10):
 
 def find_nearest_location_name(lat, lon, all_locations, cities):
     """Find the nearest location name to given coordinates."""
-    min_dist = float('inf')
-    nearest_name = None
-    
-    # Check all locations
-    for name, coords in all_locations.items():
-        dist = calculate_distance_km(lat, lon, coords["lat"], coords["lon"])
-        if dist < min_dist:
-            min_dist = dist
-            nearest_name = name
-    
-    # If nearest location is more than 5km away, use coordinates
-    if min_dist > 5:
+    # Indexed lookup over the known places (R*Tree or grid) plus this session's pins
+    nearest = all_locations.nearest(lat, lon, max_km=5)
+
+    # If no location is within 5km, use coordinates
+    if nearest is None:
         return f"Custom Location ({lat:.4f}, {lon:.4f})"
-    
-    return nearest_name
+
+    return nearest[1]
 
 
 def add_custom_location(lat, lon, all_locations, location_names):
@@ -2480,12 +2804,28 @@ def add_custom_location(lat, lon, all_locations, location_names):
     return custom_name
 
 
+def open_tabs(labels, key):
+    """Create tabs that track which one is selected, so only it needs to render."""
+    try:
+        return st.tabs(labels, key=key, on_change="rerun")
+    except TypeError:
+        # Streamlit releases without tab state render every tab
+        return st.tabs(labels)
+
+
+def tab_is_open(tab):
+    return getattr(tab, "open", None) is not False
+
+
 def format_route(path):
     return ' <span style="color: var(--accent);">→</span> '.join(f'<span style="color: var(--text-primary);">{p}</span>' for p in path)
 
 
-def generate_offline_data(path, distance, all_locations, mode_key, fuel_avg, fuel_price, speed):
+def generate_offline_data(path, distance, all_locations, mode_key, fuel_avg, fuel_price, speed, segments=None):
     """Generate downloadable route data for offline use."""
+    if segments is None:
+        segments = build_route_segments(path, all_locations)
+    
     route_data = {
         "app": "SafarPak",
         "generated": datetime.now().strftime("%Y-%m-%d %H:%M"),
@@ -2502,7 +2842,6 @@ def generate_offline_data(path, distance, all_locations, mode_key, fuel_avg, fue
         "coordinates": []
     }
     
-    cumulative = 0
     for i, loc in enumerate(path):
         coords = all_locations[loc]
         route_data["coordinates"].append({
@@ -2514,25 +2853,22 @@ def generate_offline_data(path, distance, all_locations, mode_key, fuel_avg, fue
         
         if i < len(path) - 1:
             next_loc = path[i + 1]
-            next_coords = all_locations[next_loc]
-            seg_straight = calculate_distance_km(coords["lat"], coords["lon"], 
-                                                next_coords["lat"], next_coords["lon"])
-            seg_dist = get_road_distance(seg_straight)
-            cumulative += seg_dist
+            seg_dist = segments["road"][i]
             
             route_data["directions"].append({
                 "step": i + 1,
                 "from": loc,
                 "to": next_loc,
                 "distance_km": round(seg_dist, 1),
-                "cumulative_km": round(cumulative, 1),
+                "cumulative_km": round(segments["cum_road"][i + 1], 1),
+                "bearing_deg": round(segments["bearings"][i]),
                 "est_time": est_time(seg_dist, speed),
                 "instruction": f"Head towards {next_loc}"
             })
     
     # Fuel calculation
     if mode_key in ["car", "bike"]:
-        liters = distance / (fuel_avg * (1.5 if mode_key == "bike" else 1))
+        liters = fuel_liters(distance, mode_key, fuel_avg)
         route_data["fuel"] = {
             "liters_needed": round(liters, 2),
             "cost_estimate": round(liters * fuel_price, 0),
@@ -2607,34 +2943,62 @@ def create_text_route(route_data):
     return text
 
 
-def get_download_link(content, filename, file_type="text"):
-    """Generate a download link for the content."""
-    if file_type == "json":
-        b64 = base64.b64encode(json.dumps(content, indent=2).encode()).decode()
-        mime = "application/json"
-    else:
-        b64 = base64.b64encode(content.encode()).decode()
-        mime = "text/plain"
-    
-    return f'<a href="data:{mime};base64,{b64}" download="{filename}" class="download-btn">📥 Download {filename}</a>'
+def create_gpx(route_data):
+    """Create a GPX 1.1 document (waypoints plus an ordered route) for GPS apps."""
+    points = []
+    for c in route_data['coordinates']:
+        points.append((c['lat'], c['lon'], escape(c['name'])))
+    
+    gpx = ['<?xml version="1.0" encoding="UTF-8"?>',
+           '<gpx version="1.1" creator="SafarPak" xmlns="http://www.topografix.com/GPX/1/1">',
+           f'  <metadata><name>{escape(route_data["route"]["from"])} to {escape(route_data["route"]["to"])}</name>'
+           f'<time>{datetime.now().strftime("%Y-%m-%dT%H:%M:%S")}</time></metadata>']
+    for lat, lon, name in points:
+        gpx.append(f'  <wpt lat="{lat:.6f}" lon="{lon:.6f}"><name>{name}</name></wpt>')
+    gpx.append('  <rte>')
+    gpx.append(f'    <name>SafarPak {escape(route_data["route"]["transport_mode"])} route</name>')
+    for lat, lon, name in points:
+        gpx.append(f'    <rtept lat="{lat:.6f}" lon="{lon:.6f}"><name>{name}</name></rtept>')
+    gpx.append('  </rte>')
+    gpx.append('</gpx>')
+    return "\n".join(gpx) + "\n"
 
 
-def get_direction_icon(from_loc, to_loc, all_locations):
-    """Get appropriate direction icon based on bearing."""
-    from_coords = all_locations[from_loc]
-    to_coords = all_locations[to_loc]
-    
-    lat_diff = to_coords["lat"] - from_coords["lat"]
-    lon_diff = to_coords["lon"] - from_coords["lon"]
+def create_geojson(route_data):
+    """Create a GeoJSON FeatureCollection with the route line and each stop."""
+    coords = route_data['coordinates']
+    features = [{
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": [[c['lon'], c['lat']] for c in coords]},
+        "properties": {**route_data['route'], "name": f"{route_data['route']['from']} to {route_data['route']['to']}"},
+    }]
+    for c in coords:
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [c['lon'], c['lat']]},
+            "properties": {"name": c['name'], "stop_number": c['stop_number']},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def lazy_download_button(label, make_data, file_name, mime, key):
+    """Download button whose file is only built when the user clicks it.
     
-    if abs(lat_diff) > abs(lon_diff):
-        return "⬆️" if lat_diff > 0 else "⬇️"
-    else:
-        return "➡️" if lon_diff > 0 else "⬅️"
+    Nothing but the button goes into the rerun payload. Streamlit releases
+    that cannot take a callable get the generated data up front instead.
+    """
+    try:
+        st.download_button(label, data=make_data, file_name=file_name, mime=mime, key=key,
+                           on_click="ignore", use_container_width=True)
+    except (TypeError, StreamlitAPIException):
+        st.download_button(label, data=make_data(), file_name=file_name, mime=mime, key=key,
+                           use_container_width=True)
 
 
 def create_map_picker(center_lat=30.3753, center_lon=69.3451, default_zoom=10):
     """Create an interactive map for location picking."""
+    import folium
+    
     m = folium.Map(location=[center_lat, center_lon], zoom_start=default_zoom, tiles='CartoDB dark_matter')
     
     # Add click handler to show coordinates
@@ -2664,21 +3028,14 @@ def create_map_picker(center_lat=30.3753, center_lon=69.3451, default_zoom=10):
 
 def find_nearest_location_name(lat, lon, all_locations, cities):
     """Find the nearest location name to given coordinates."""
-    min_dist = float('inf')
-    nearest_name = None
-    
-    # Check all locations
-    for name, coords in all_locations.items():
-        dist = calculate_distance_km(lat, lon, coords["lat"], coords["lon"])
-        if dist < min_dist:
-            min_dist = dist
-            nearest_name = name
-    
-    # If nearest location is more than 5km away, use coordinates
-    if min_dist > 5:
+    # Indexed lookup over the known places (R*Tree or grid) plus this session's pins
+    nearest = all_locations.nearest(lat, lon, max_km=5)
+
+    # If no location is within 5km, use coordinates
+    if nearest is None:
         return f"Custom Location ({lat:.4f}, {lon:.4f})"
-    
-    return nearest_name
+
+    return nearest[1]
 
 
 def add_custom_location(lat, lon, all_locations, location_names):
@@ -2693,407 +3050,39 @@ def add_custom_location(lat, lon, all_locations, location_names):
 
 # ==================== MAIN APP ====================
 def main():
-    # Fix sidebar closing on mobile devices
-    st.markdown("""
-    <script>
-        (function() {
-            // Mobile sidebar close functionality
-            function setupMobileSidebar() {
-                const sidebar = document.querySelector('section[data-testid="stSidebar"]');
-                
-                if (!sidebar) return;
-                
-                // Create overlay for mobile
-                let overlay = document.getElementById('sidebar-overlay');
-                if (!overlay) {
-                    overlay = document.createElement('div');
-                    overlay.id = 'sidebar-overlay';
-                    overlay.style.cssText = `
-                        position: fixed;
-                        top: 0;
-                        left: 0;
-                        right: 0;
-                        bottom: 0;
-                        background: rgba(0, 0, 0, 0.5);
-                        z-index: 997;
-                        display: none;
-                        opacity: 0;
-                        transition: opacity 0.3s ease;
-                    `;
-                    document.body.appendChild(overlay);
-                    
-                    // Close sidebar when overlay is clicked
-                    overlay.addEventListener('click', function() {
-                        closeSidebar();
-                    });
-                }
-                
-                // Function to check if sidebar is open
-                function isSidebarOpen() {
-                    const sidebar = document.querySelector('section[data-testid="stSidebar"]');
-                    if (!sidebar) return false;
-                    
-                    const style = window.getComputedStyle(sidebar);
-                    const transform = style.transform;
-                    const ariaExpanded = sidebar.getAttribute('aria-expanded') === 'true';
-                    const isVisible = sidebar.offsetWidth > 0 && transform !== 'matrix(1, 0, 0, 1, -9999, 0)';
-                    
-                    return ariaExpanded || isVisible;
-                }
-                
-                // Function to close sidebar
-                function closeSidebar() {
-                    const toggleBtn = document.querySelector('[data-testid="stHeader"] button[aria-label*="sidebar"], [data-testid="stHeader"] button[aria-label*="Sidebar"]');
-                    
-                    if (toggleBtn) {
-                        toggleBtn.click();
-                    } else {
-                        // Fallback: find any sidebar toggle button
-                        const allToggleBtns = document.querySelectorAll('button[aria-label*="sidebar"], button[aria-label*="Sidebar"]');
-                        if (allToggleBtns.length > 0) {
-                            allToggleBtns[0].click();
-                        }
-                    }
-                    
-                    // Hide overlay
-                    if (overlay) {
-                        overlay.style.opacity = '0';
-                        setTimeout(() => {
-                            overlay.style.display = 'none';
-                        }, 300);
-                    }
-                    
-                    document.body.style.overflow = '';
-                }
-                
-                // Show/hide overlay based on sidebar state
-                function updateOverlay() {
-                    if (window.innerWidth <= 768) {
-                        if (isSidebarOpen()) {
-                            overlay.style.display = 'block';
-                            setTimeout(() => {
-                                overlay.style.opacity = '1';
-                            }, 10);
-                            document.body.style.overflow = 'hidden';
-                        } else {
-                            overlay.style.opacity = '0';
-                            setTimeout(() => {
-                                overlay.style.display = 'none';
-                            }, 300);
-                            document.body.style.overflow = '';
-                        }
-                    } else {
-                        overlay.style.display = 'none';
-                        document.body.style.overflow = '';
-                    }
-                }
-                
-                // Monitor sidebar state
-                const observer = new MutationObserver(function() {
-                    updateOverlay();
-                });
-                
-                if (sidebar) {
-                    observer.observe(sidebar, {
-                        attributes: true,
-                        attributeFilter: ['aria-expanded', 'class', 'style'],
-                        childList: false,
-                        subtree: false
-                    });
-                    
-                    window.addEventListener('resize', updateOverlay);
-                    
-                    // Close on outside click
-                    document.addEventListener('click', function(e) {
-                        if (window.innerWidth <= 768 && isSidebarOpen()) {
-                            const clickedElement = e.target;
-                            const isInsideSidebar = sidebar.contains(clickedElement);
-                            const isToggleButton = clickedElement.closest('button[aria-label*="sidebar"]') || 
-                                                  clickedElement.closest('button[aria-label*="Sidebar"]');
-                            
-                            if (!isInsideSidebar && !isToggleButton && clickedElement !== overlay) {
-                                closeSidebar();
-                            }
-                        }
-                    });
-                }
-                
-                updateOverlay();
-            }
-            
-            // Run when DOM is ready
-            if (document.readyState === 'loading') {
-                document.addEventListener('DOMContentLoaded', setupMobileSidebar);
-            } else {
-                setupMobileSidebar();
-            }
-            
-            setTimeout(setupMobileSidebar, 500);
-            setTimeout(setupMobileSidebar, 1000);
-        })();
-    </script>
-    """, unsafe_allow_html=True)
-    
-    # Enable scrolling with mouse wheel and touchpad and suppress console warnings
-    st.markdown("""
-    <script>
-        (function() {
-            // Suppress harmless Streamlit console warnings - comprehensive filtering
-            const originalWarn = console.warn;
-            const originalError = console.error;
-            const originalLog = console.log;
-            
-            // Create a function to check if message should be suppressed
-            function shouldSuppress(message) {
-                if (!message || typeof message !== 'string') return false;
-                
-                const suppressedPatterns = [
-                    'Unrecognized feature:',
-                    'ambient-light-sensor',
-                    'battery',
-                    'document-domain',
-                    'layout-animations',
-                    'legacy-image-formats',
-                    'oversized-images',
-                    'vr',
-                    'wake-lock',
-                    'iframe which has both allow-scripts and allow-same-origin',
-                    'A form field element should have an id or name attribute',
-                    'form field element has neither an id nor a name attribute',
-                    'No label associated with a form field',
-                    'index.CqTPbV5Y.js',
-                    'Understand this warning'
-                ];
-                
-                return suppressedPatterns.some(pattern => message.includes(pattern));
-            }
-            
-            console.warn = function(...args) {
-                const message = args.join(' ');
-                if (shouldSuppress(message)) {
-                    return; // Suppress these warnings
-                }
-                // Show other warnings
-                originalWarn.apply(console, args);
-            };
-            
-            console.error = function(...args) {
-                const message = args.join(' ');
-                if (shouldSuppress(message)) {
-                    return; // Suppress these errors
-                }
-                // Show other errors
-                originalError.apply(console, args);
-            };
-            
-            // Also filter console.log for these warnings
-            console.log = function(...args) {
-                const message = args.join(' ');
-                if (shouldSuppress(message)) {
-                    return; // Suppress these logs
-                }
-                // Show other logs
-                originalLog.apply(console, args);
-            };
-            
-            // Suppress warnings from Streamlit's iframe
-            window.addEventListener('message', function(event) {
-                // Filter out messages that might contain warnings
-                if (event.data && typeof event.data === 'string' && shouldSuppress(event.data)) {
-                    event.stopPropagation();
-                }
-            }, true);
-            
-            // Ensure scroll events work properly
-            document.addEventListener('wheel', function(e) {
-                // Allow default scroll behavior
-                e.stopPropagation();
-            }, { passive: true });
-            
-            document.addEventListener('touchmove', function(e) {
-                // Allow touch scrolling
-                e.stopPropagation();
-            }, { passive: true });
-            
-            // Remove any event listeners that might prevent scrolling
-            document.body.style.overflow = 'auto';
-            document.documentElement.style.overflow = 'auto';
-        })();
-    </script>
-    """, unsafe_allow_html=True)
-    
-    # Remove toggle button - inject into head for maximum priority
-    st.markdown("""
-    <script>
-        (function() {
-            // Inject style into head for maximum priority
-            const style = document.createElement('style');
-            style.textContent = `
-                button[name="keyboard_double_arrow_left"],
-                section[data-testid="stSidebar"] button[name="keyboard_double_arrow_left"],
-                #root > div:first-child > div:first-child > div > div > div > section > div:first-child > div > div:nth-child(6) > div > div:nth-child(2) > button,
-                #root > div:first-child > div:first-child > div > div > div > section > div:first-child > div > div:nth-of-type(6) > div > div:nth-of-type(2) > button,
-                #root > div:first-child > div:first-child > div > div > div > section > div:first-child > div > div:nth-child(7) > div > div:nth-child(2) > button,
-                #root > div:first-child > div:first-child > div > div > div > section > div:first-child > div > div:nth-of-type(7) > div > div:nth-of-type(2) > button {
-                    display: none !important;
-                    visibility: hidden !important;
-                    opacity: 0 !important;
-                    width: 0 !important;
-                    height: 0 !important;
-                    padding: 0 !important;
-                    margin: 0 !important;
-                    position: absolute !important;
-                    left: -9999px !important;
-                    pointer-events: none !important;
-                }
-            `;
-            document.head.appendChild(style);
-            
-            function removeBtn() {
-                // Method 1: Direct XPath evaluation for div[6] button
-                try {
-                    const xpath6 = '//*[@id="root"]/div[1]/div[1]/div/div/div/section/div[1]/div/div[6]/div/div[2]/button';
-                    const result6 = document.evaluate(xpath6, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null);
-                    const btn6 = result6.singleNodeValue;
-                    if (btn6) {
-                        btn6.style.cssText = 'display:none!important;visibility:hidden!important;opacity:0!important;width:0!important;height:0!important;padding:0!important;margin:0!important;position:absolute!important;left:-9999px!important;pointer-events:none!important;';
-                        try { 
-                            btn6.remove();
-                        } catch(e) {
-                            btn6.parentNode && btn6.parentNode.removeChild(btn6);
-                        }
-                    }
-                } catch(e) {}
-                
-                // Method 2: Direct XPath evaluation for div[7] button
-                try {
-                    const xpath7 = '//*[@id="root"]/div[1]/div[1]/div/div/div/section/div[1]/div/div[7]/div/div[2]/button';
-                    const result7 = document.evaluate(xpath7, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null);
-                    const btn7 = result7.singleNodeValue;
-                    if (btn7) {
-                        btn7.style.cssText = 'display:none!important;visibility:hidden!important;opacity:0!important;width:0!important;height:0!important;padding:0!important;margin:0!important;position:absolute!important;left:-9999px!important;pointer-events:none!important;';
-                        try { 
-                            btn7.remove();
-                        } catch(e) {
-                            btn7.parentNode && btn7.parentNode.removeChild(btn7);
-                        }
-                    }
-                } catch(e) {}
-                
-                // Method 3: Navigate DOM structure programmatically for div[6]
-                try {
-                    const root = document.getElementById('root');
-                    if (root) {
-                        const div1 = root.firstElementChild;
-                        if (div1) {
-                            const div2 = div1.firstElementChild;
-                            if (div2) {
-                                const section = div2.querySelector('section');
-                                if (section) {
-                                    const sectionDiv1 = section.firstElementChild;
-                                    if (sectionDiv1) {
-                                        const innerDiv = sectionDiv1.firstElementChild;
-                                        if (innerDiv && innerDiv.children.length > 5) {
-                                            const div6 = innerDiv.children[5];
-                                            if (div6) {
-                                                const innerDiv2 = div6.firstElementChild;
-                                                if (innerDiv2 && innerDiv2.children.length > 1) {
-                                                    const div2 = innerDiv2.children[1];
-                                                    if (div2) {
-                                                        const btn = div2.querySelector('button');
-                                                        if (btn) {
-                                                            btn.style.cssText = 'display:none!important;visibility:hidden!important;opacity:0!important;width:0!important;height:0!important;padding:0!important;margin:0!important;position:absolute!important;left:-9999px!important;pointer-events:none!important;';
-                                                            try { 
-                                                                btn.remove();
-                                                            } catch(e) {
-                                                                btn.parentNode && btn.parentNode.removeChild(btn);
-                                                            }
-                                                        }
-                                                    }
-                                                }
-                                            }
-                                        }
-                                        // Also check for div[7]
-                                        if (innerDiv && innerDiv.children.length > 6) {
-                                            const div7 = innerDiv.children[6];
-                                            if (div7) {
-                                                const innerDiv2 = div7.firstElementChild;
-                                                if (innerDiv2 && innerDiv2.children.length > 1) {
-                                                    const div2 = innerDiv2.children[1];
-                                                    if (div2) {
-                                                        const btn = div2.querySelector('button');
-                                                        if (btn) {
-                                                            btn.style.cssText = 'display:none!important;visibility:hidden!important;opacity:0!important;width:0!important;height:0!important;padding:0!important;margin:0!important;position:absolute!important;left:-9999px!important;pointer-events:none!important;';
-                                                            try { 
-                                                                btn.remove();
-                                                            } catch(e) {
-                                                                btn.parentNode && btn.parentNode.removeChild(btn);
-                                                            }
-                                                        }
-                                                    }
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                } catch(e) {}
-                
-                // Method 4: By name attribute (backup)
-                const buttons = document.querySelectorAll('button[name="keyboard_double_arrow_left"]');
-                buttons.forEach(b => {
-                    b.style.cssText = 'display:none!important;visibility:hidden!important;opacity:0!important;width:0!important;height:0!important;padding:0!important;margin:0!important;position:absolute!important;left:-9999px!important;pointer-events:none!important;';
-                    try { b.remove(); } catch(e) {}
-                });
-            }
-            
-            removeBtn();
-            if (document.readyState === 'loading') {
-                document.addEventListener('DOMContentLoaded', removeBtn);
-            }
-            setInterval(removeBtn, 1);
-            requestAnimationFrame(function loop() { removeBtn(); requestAnimationFrame(loop); });
-            
-            const observer = new MutationObserver(removeBtn);
-            if (document.body) {
-                observer.observe(document.body, {childList: true, subtree: true, attributes: true});
-            }
-        })();
-    </script>
-    """, unsafe_allow_html=True)
-    
     # Initialize theme in session state
     if 'theme' not in st.session_state:
         st.session_state.theme = 'dark'
     
-    # Initialize custom locations in session state
-    if 'custom_locations' not in st.session_state:
-        st.session_state.custom_locations = {}
-    
     # Load data first
     try:
-        cities = load_data()
-        all_locations = load_all_locations()
+        engine = get_route_engine()
+        cities = engine.city_store
+        
+        # Layer the saved custom pins over the shared store; pins persist
+        # across sessions and restarts, the shared locations are never written
+        custom_locations = engine.custom_locations
+        all_locations = engine.location_view(custom_locations)
         
-        # Merge custom locations from session state
-        all_locations.update(st.session_state.custom_locations)
+        # Nearest-city lookups for the base locations plus the custom pins (saved with each pin)
+        snap_table = engine.snap_view(custom_locations.snaps)
         
-        location_names = sorted(all_locations.keys())
-        location_categories = get_location_categories()
+        location_names = all_locations.names()
+        location_ids = all_locations.ids()
+        location_categories = engine.location_categories
+        place_names = engine.gazetteer.names
         
         # Check if there's a stored destination location name and update index
         if hasattr(st.session_state, 'selected_dest_location') and st.session_state.selected_dest_location:
-            if st.session_state.selected_dest_location in location_names:
-                st.session_state.dst_index = location_names.index(st.session_state.selected_dest_location)
+            if st.session_state.selected_dest_location in all_locations:
+                st.session_state.dst_index = all_locations.index(st.session_state.selected_dest_location)
                 # Clear it after using
                 st.session_state.selected_dest_location = None
         
         # Check if there's a stored source location name and update index
         if hasattr(st.session_state, 'selected_src_location') and st.session_state.selected_src_location:
-            if st.session_state.selected_src_location in location_names:
-                st.session_state.src_index = location_names.index(st.session_state.selected_src_location)
+            if st.session_state.selected_src_location in all_locations:
+                st.session_state.src_index = all_locations.index(st.session_state.selected_src_location)
                 # Clear it after using
                 st.session_state.selected_src_location = None
     except FileNotFoundError:
@@ -3120,137 +3109,29 @@ def main():
         
         # Location browser
         st.markdown("**📍 Location Browser**")
-        for cat, locs in location_categories.items():
-            with st.expander(f"{cat} ({len(locs)})"):
-                for loc in locs[:8]:
-                    st.caption(f"• {loc}")
-                if len(locs) > 8:
-                    st.caption(f"*+{len(locs)-8} more*")
+        for cat, loc_ids in location_categories.items():
+            if cat == CITY_CATEGORY:
+                continue
+            with st.expander(f"{cat} ({len(loc_ids)})"):
+                for loc_id in loc_ids[:8]:
+                    st.caption(f"• {place_names[loc_id]}")
+                if len(loc_ids) > 8:
+                    st.caption(f"*+{len(loc_ids)-8} more*")
         
         st.markdown("---")
         st.metric("Total Locations", len(location_names))
-    
-    # Remove white 3-line toggle button FIRST - before CSS
-    st.markdown("""
-    <script>
-        (function() {
-            function removeToggle() {
-                document.querySelectorAll('button[name="keyboard_double_arrow_left"]').forEach(btn => btn.remove());
-            }
-            removeToggle();
-            setInterval(removeToggle, 100);
-            new MutationObserver(removeToggle).observe(document.body, {childList: true, subtree: true});
-        })();
-    </script>
-    """, unsafe_allow_html=True)
+        
+        # How often the background route prefetch pays off
+        if logger.isEnabledFor(logging.DEBUG):
+            prefetch = get_tree_cache().stats()
+            answered = prefetch['hits'] + prefetch['late']
+            logger.debug(
+                "Route prefetch: %d/%d routes answered from a prefetched tree (%d still building), %d trees wasted, %d unused in cache",
+                answered, answered + prefetch['misses'], prefetch['late'], prefetch['wasted'], prefetch['idle'],
+            )
     
     # Apply theme CSS
-    st.markdown(get_theme_css(st.session_state.theme), unsafe_allow_html=True)
-    
-    # Remove white 3-line toggle button - aggressive removal
-    st.markdown("""
-    <script>
-        (function() {
-            function removeToggleButton() {
-                // Method 1: Remove by name attribute
-                const toggleBtns = document.querySelectorAll('button[name="keyboard_double_arrow_left"]');
-                toggleBtns.forEach(btn => {
-                    btn.style.display = 'none';
-                    btn.style.visibility = 'hidden';
-                    btn.remove();
-                });
-                
-                // Method 2: Find in sidebar section
-                const sidebar = document.querySelector('section[data-testid="stSidebar"]');
-                if (sidebar) {
-                    // Find all buttons in sidebar
-                    const allSidebarBtns = sidebar.querySelectorAll('button');
-                    allSidebarBtns.forEach(btn => {
-                        const btnName = btn.getAttribute('name') || '';
-                        if (btnName === 'keyboard_double_arrow_left') {
-                            btn.style.display = 'none';
-                            btn.style.visibility = 'hidden';
-                            btn.remove();
-                        }
-                    });
-                    
-                    // Also check first div's first button
-                    const firstDiv = sidebar.querySelector('> div:first-child');
-                    if (firstDiv) {
-                        const firstBtn = firstDiv.querySelector('button:first-child');
-                        if (firstBtn) {
-                            const btnName = firstBtn.getAttribute('name') || '';
-                            if (btnName === 'keyboard_double_arrow_left') {
-                                firstBtn.style.display = 'none';
-                                firstBtn.style.visibility = 'hidden';
-                                firstBtn.remove();
-                            }
-                        }
-                    }
-                }
-                
-                // Method 3: Find by position (bottom left area)
-                const allButtons = document.querySelectorAll('button');
-                allButtons.forEach(btn => {
-                    const btnName = btn.getAttribute('name') || '';
-                    if (btnName === 'keyboard_double_arrow_left') {
-                        const rect = btn.getBoundingClientRect();
-                        // If it's in the bottom left area
-                        if (rect.left < 100 && rect.bottom > window.innerHeight - 150) {
-                            btn.style.display = 'none';
-                            btn.style.visibility = 'hidden';
-                            btn.remove();
-                        }
-                    }
-                });
-            }
-            
-            // Run immediately
-            removeToggleButton();
-            
-            // Run on various events
-            if (document.readyState === 'loading') {
-                document.addEventListener('DOMContentLoaded', removeToggleButton);
-            }
-            
-            // Run multiple times with different delays
-            [10, 50, 100, 200, 300, 500, 1000, 2000].forEach(delay => {
-                setTimeout(removeToggleButton, delay);
-            });
-            
-            // Continuous monitoring every 200ms
-            setInterval(removeToggleButton, 200);
-            
-            // MutationObserver for dynamic content
-            const observer = new MutationObserver(function(mutations) {
-                removeToggleButton();
-            });
-            
-            if (document.body) {
-                observer.observe(document.body, { 
-                    childList: true, 
-                    subtree: true, 
-                    attributes: true,
-                    attributeFilter: ['style', 'class', 'name']
-                });
-            }
-            
-            // Also observe sidebar specifically
-            const sidebarObserver = new MutationObserver(function(mutations) {
-                removeToggleButton();
-            });
-            
-            const sidebar = document.querySelector('section[data-testid="stSidebar"]');
-            if (sidebar) {
-                sidebarObserver.observe(sidebar, { 
-                    childList: true, 
-                    subtree: true, 
-                    attributes: true 
-                });
-            }
-        })();
-    </script>
-    """, unsafe_allow_html=True)
+    st.markdown(get_theme_stylesheet(st.session_state.theme), unsafe_allow_html=True)
     
     # Header
     st.markdown("""
@@ -3300,50 +3181,8 @@ def main():
     
     st.markdown("</div>", unsafe_allow_html=True)
     
-    # JavaScript to toggle sidebar based on session state - runs on every rerun
-    sidebar_should_be_visible = st.session_state.sidebar_visible
-    st.markdown(f"""
-    <script>
-        (function() {{
-            function toggleSidebar(show) {{
-                const sidebar = document.querySelector('[data-testid="stSidebar"], section[data-testid="stSidebar"]');
-                if (sidebar) {{
-                    if (show) {{
-                        sidebar.style.cssText = 'display: flex !important; visibility: visible !important; transform: translateX(0) !important; opacity: 1 !important; width: 21rem !important;';
-                    }} else {{
-                        sidebar.style.cssText = 'display: none !important; visibility: hidden !important;';
-                    }}
-                    return true;
-                }}
-                return false;
-            }}
-            
-            // Apply immediately
-            const applied = toggleSidebar({str(sidebar_should_be_visible).lower()});
-            
-            // If sidebar should be visible but wasn't found, try clicking Streamlit's native button
-            if ({str(sidebar_should_be_visible).lower()} && !applied) {{
-                setTimeout(function() {{
-                    const header = document.querySelector('[data-testid="stHeader"]');
-                    if (header) {{
-                        const buttons = header.querySelectorAll('button');
-                        for (let btn of buttons) {{
-                            const ariaLabel = (btn.getAttribute('aria-label') || '').toLowerCase();
-                            if (ariaLabel.includes('sidebar') || ariaLabel.includes('menu')) {{
-                                btn.click();
-                                break;
-                            }}
-                        }}
-                        // Fallback: click first button
-                        if (buttons.length > 0 && !document.querySelector('[data-testid="stSidebar"]')) {{
-                            buttons[0].click();
-                        }}
-                    }}
-                }}, 300);
-            }}
-        }})();
-    </script>
-    """, unsafe_allow_html=True)
+    # Page controller: installs once per page, later reruns only push the sidebar state
+    embed_html(CLIENT_CONTROLLER.replace("__SIDEBAR_VISIBLE__", str(st.session_state.sidebar_visible).lower()), height=1)
     
     # Input Section
     col1, col2 = st.columns(2)
@@ -3354,9 +3193,9 @@ def main():
     if 'show_map_picker_to' not in st.session_state:
         st.session_state.show_map_picker_to = False
     if 'src_index' not in st.session_state:
-        st.session_state.src_index = location_names.index("DHA Karachi") if "DHA Karachi" in location_names else 0
+        st.session_state.src_index = all_locations.index("DHA Karachi") if "DHA Karachi" in all_locations else 0
     if 'dst_index' not in st.session_state:
-        st.session_state.dst_index = location_names.index("F-7 Islamabad") if "F-7 Islamabad" in location_names else 1
+        st.session_state.dst_index = all_locations.index("F-7 Islamabad") if "F-7 Islamabad" in all_locations else 1
     
     with col1:
         st.markdown("""
@@ -3373,12 +3212,15 @@ def main():
             if st.session_state.src_index >= len(location_names):
                 st.session_state.src_index = 0
             
-            source = st.selectbox("From", location_names, 
-                                 index=st.session_state.src_index,
+            location_search("src", all_locations)
+            src_options, src_option_index = picker_options(location_ids, st.session_state.src_index, engine.city_ids)
+            src_id = st.selectbox("From", src_options,
+                                 index=src_option_index, format_func=all_locations.name_of,
                                  label_visibility="collapsed", key="src")
+            source = all_locations.name_of(src_id)
             # Update index when user manually changes selection
-            if source in location_names:
-                st.session_state.src_index = location_names.index(source)
+            if source in all_locations:
+                st.session_state.src_index = all_locations.index(source)
         
         with btn_col:
             if st.button("🗺️", key="map_picker_from_btn", help="Pick location on map", use_container_width=True):
@@ -3407,6 +3249,7 @@ def main():
             # Show current coordinates before map
             st.info(f"📍 Current marker position: {center[0]:.6f}, {center[1]:.6f}")
             
+            from streamlit_folium import st_folium
             map_picker = create_map_picker(center[0], center[1], default_zoom=10)
             map_data = st_folium(map_picker, width=None, height=400, key="map_picker_from", returned_objects=["last_clicked", "last_object_clicked", "all_drawings"])
             
@@ -3461,29 +3304,24 @@ def main():
                         nearest = find_nearest_location_name(selected_lat, selected_lon, all_locations, cities)
                         
                         if nearest.startswith("Custom Location"):
-                            # Add as custom location
-                            custom_name = f"Custom Location ({selected_lat:.4f}, {selected_lon:.4f})"
-                            # Store in session state
-                            st.session_state.custom_locations[custom_name] = {"lat": selected_lat, "lon": selected_lon, "type": "custom"}
-                            selected_name = custom_name
+                            # Save as a custom location (with its nearest city); a pin
+                            # within a few metres of a saved one reuses that pin
+                            selected_name = custom_locations.add(selected_lat, selected_lon)
                         else:
                             selected_name = nearest
                         
-                        # Update all_locations to include the new custom location (if any)
-                        all_locations.update(st.session_state.custom_locations)
-                        
                         # Ensure the selected location exists in all_locations
                         if selected_name not in all_locations:
                             # Add it if it doesn't exist
                             all_locations[selected_name] = {"lat": selected_lat, "lon": selected_lon, "type": "custom"}
-                            st.session_state.custom_locations[selected_name] = {"lat": selected_lat, "lon": selected_lon, "type": "custom"}
                         
                         # Update location_names list
-                        location_names = sorted(all_locations.keys())
+                        location_names = all_locations.names()
+                        location_ids = all_locations.ids()
                         
                         # Update the selectbox index
                         try:
-                            new_index = location_names.index(selected_name)
+                            new_index = all_locations.index(selected_name)
                             st.session_state.src_index = new_index
                             # Store the selected location name in session state for verification
                             st.session_state.selected_src_location = selected_name
@@ -3524,12 +3362,15 @@ def main():
             if st.session_state.dst_index >= len(location_names):
                 st.session_state.dst_index = 0
             
-            dest = st.selectbox("To", location_names,
-                               index=st.session_state.dst_index,
+            location_search("dst", all_locations)
+            dst_options, dst_option_index = picker_options(location_ids, st.session_state.dst_index, engine.city_ids)
+            dst_id = st.selectbox("To", dst_options,
+                               index=dst_option_index, format_func=all_locations.name_of,
                                label_visibility="collapsed", key="dst")
+            dest = all_locations.name_of(dst_id)
             # Update index when user manually changes selection
-            if dest in location_names:
-                st.session_state.dst_index = location_names.index(dest)
+            if dest in all_locations:
+                st.session_state.dst_index = all_locations.index(dest)
         
         with btn_col2:
             if st.button("🗺️", key="map_picker_to_btn", help="Pick location on map", use_container_width=True):
@@ -3558,6 +3399,7 @@ def main():
             # Show current coordinates before map
             st.info(f"📍 Current marker position: {center[0]:.6f}, {center[1]:.6f}")
             
+            from streamlit_folium import st_folium
             map_picker = create_map_picker(center[0], center[1], default_zoom=10)
             map_data = st_folium(map_picker, width=None, height=400, key="map_picker_to", returned_objects=["last_clicked", "last_object_clicked", "all_drawings"])
             
@@ -3612,11 +3454,9 @@ def main():
                         nearest = find_nearest_location_name(selected_lat, selected_lon, all_locations, cities)
                         
                         if nearest.startswith("Custom Location"):
-                            # Add as custom location
-                            custom_name = f"Custom Location ({selected_lat:.4f}, {selected_lon:.4f})"
-                            # Store in session state
-                            st.session_state.custom_locations[custom_name] = {"lat": selected_lat, "lon": selected_lon, "type": "custom"}
-                            selected_name = custom_name
+                            # Save as a custom location (with its nearest city); a pin
+                            # within a few metres of a saved one reuses that pin
+                            selected_name = custom_locations.add(selected_lat, selected_lon)
                         else:
                             selected_name = nearest
                         
@@ -3624,23 +3464,14 @@ def main():
                         if selected_name not in all_locations:
                             # Add it if it doesn't exist
                             all_locations[selected_name] = {"lat": selected_lat, "lon": selected_lon, "type": "custom"}
-                            st.session_state.custom_locations[selected_name] = {"lat": selected_lat, "lon": selected_lon, "type": "custom"}
-                        
-                        # Update all_locations to include all custom locations from session state
-                        all_locations.update(st.session_state.custom_locations)
                         
                         # Update location_names list - recalculate from all_locations
-                        location_names = sorted(all_locations.keys())
-                        
-                        # Verify the location is in the list
-                        if selected_name not in location_names:
-                            # Force add it
-                            location_names.append(selected_name)
-                            location_names.sort()
+                        location_names = all_locations.names()
+                        location_ids = all_locations.ids()
                         
                         # Update the selectbox index
                         try:
-                            new_index = location_names.index(selected_name)
+                            new_index = all_locations.index(selected_name)
                             st.session_state.dst_index = new_index
                             # Store the selected location name in session state for verification
                             st.session_state.selected_dest_location = selected_name
@@ -3694,6 +3525,9 @@ def main():
     with c5:
         fuel_price = st.number_input("💰 Fuel Price (Rs/L)", 100, 400, 260, 5)
     
+    # Start searching from the source now, while the destination is still being picked
+    speculate_route_tree(source, threshold, all_locations, snap_table)
+    
     # Direct distance
     if source != dest:
         direct_straight = calculate_distance_km(
@@ -3716,59 +3550,69 @@ def main():
     if (st.session_state.route_source is not None and st.session_state.route_source != source) or \
        (st.session_state.route_dest is not None and st.session_state.route_dest != dest):
         st.session_state.route_data = None
+        st.session_state.route_error = None
     
     # Update stored source/dest
     if st.session_state.route_data is None:
         st.session_state.route_source = source
         st.session_state.route_dest = dest
     
+    # A running route job is superseded as soon as the inputs it was started for change
+    job = st.session_state.get('route_job')
+    if job and (job['source'], job['dest'], job['threshold']) != (source, dest, threshold):
+        cancel_route_job(job)
+        st.session_state.route_job = None
+    
     # Find Route Button
     if st.button("🔍 FIND ROUTE", use_container_width=True):
         if source == dest:
             st.warning("⚠️ Select different locations!")
             st.session_state.route_data = None
         else:
-            progress = st.progress(0)
-            progress.progress(30)
-            graph = build_city_graph(threshold)
-            progress.progress(60)
-            path, straight_distance, route_mode = find_route(source, dest, all_locations, cities, graph)
-            # Apply road factor for realistic distance
-            distance = get_road_distance(straight_distance)
-            progress.progress(100)
-            time.sleep(0.2)
-            progress.empty()
-            
-            if path:
-                # Store route data in session state
-                st.session_state.route_data = {
-                    'path': path,
-                    'distance': distance,
-                    'straight_distance': straight_distance,
-                    'route_mode': route_mode,
-                    'selected_speed': selected_speed,
-                    'mode_key': mode_key,
-                    'fuel_avg': fuel_avg,
-                    'fuel_price': fuel_price,
-                    'liters': distance / (fuel_avg * (1.5 if mode_key == "bike" else 1)) if mode_key in ["car", "bike"] else 0,
-                    'fuel_cost': int((distance / (fuel_avg * (1.5 if mode_key == "bike" else 1))) * fuel_price) if mode_key in ["car", "bike"] else 0,
-                }
-                st.session_state.route_source = source
-                st.session_state.route_dest = dest
+            if st.session_state.get('route_job'):
+                cancel_route_job(st.session_state.route_job)
+            st.session_state.route_error = None
+            settings = {
+                'selected_speed': selected_speed,
+                'mode_key': mode_key,
+                'fuel_avg': fuel_avg,
+                'fuel_price': fuel_price,
+            }
+            st.session_state.route_job = submit_route_job(source, dest, threshold, all_locations, snap_table, settings)
+    
+    # Collect the job result: quick queries finish inline, slow ones are polled
+    if st.session_state.get('route_job'):
+        job = st.session_state.route_job
+        concurrent.futures.wait([job['future']], timeout=ROUTE_INLINE_WAIT)
+        if job['future'].done():
+            finish_route_job(job, all_locations)
+        elif hasattr(st, "fragment"):
+            poll_route_job(all_locations)
+        else:
+            # Streamlit releases without fragments wait on the script thread
+            concurrent.futures.wait([job['future']])
+            finish_route_job(job, all_locations)
+    
+    if st.session_state.get('route_error'):
+        st.error(st.session_state.route_error)
     
     # Display route if it exists in session state
     if st.session_state.route_data:
         path = st.session_state.route_data['path']
         distance = st.session_state.route_data['distance']
+        tiles = MAP_TILES.get(st.session_state.theme, MAP_TILES["dark"])
         route_mode = st.session_state.route_data['route_mode']
+        if 'segments' not in st.session_state.route_data:
+            st.session_state.route_data['segments'] = build_route_segments(path, all_locations)
+        segments = st.session_state.route_data['segments']
         # Use current settings for display (speed, fuel) but keep route path
         # Recalculate fuel with current settings
         if mode_key in ["car", "bike"]:
-            liters = distance / (fuel_avg * (1.5 if mode_key == "bike" else 1))
-            fuel_cost = int(liters * fuel_price)
-            fuel_display = f"Rs.{fuel_cost:,}"
+            liters = fuel_liters(distance, mode_key, fuel_avg)
+            trip_fuel_cost = fuel_cost(distance, mode_key, fuel_avg, fuel_price)
+            fuel_display = f"Rs.{trip_fuel_cost:,}"
         else:
-            liters, fuel_cost = 0, 0
+            liters, trip_fuel_cost = 0, 0
             fuel_display = "Free 🌱"
         travel_time = est_time(distance, selected_speed)
         
@@ -3808,7 +3652,7 @@ def main():
                         <span>Avg: {fuel_avg} km/L</span>
                         <span>Liters: {liters:.1f} L</span>
                         <span>@ Rs.{fuel_price}/L</span>
-                        <span class="fuel-total">= Rs.{fuel_cost:,}</span>
+                        <span class="fuel-total">= Rs.{trip_fuel_cost:,}</span>
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
@@ -3829,287 +3673,289 @@ def main():
                 st.markdown(stops_html, unsafe_allow_html=True)
             
             # Tabs
-            tabs = st.tabs(["🗺️ MAP", "🚗 DRIVE", "📍 DIRECTIONS", "💾 OFFLINE", "🍽️ FOOD", "🏨 STAY", "☕ CAFÉS", "🌳 PARKS"])
+            # Only the selected tab builds its content on each rerun
+            tabs = open_tabs(["🗺️ MAP", "🚗 DRIVE", "📍 DIRECTIONS", "💾 OFFLINE", "🍽️ FOOD", "🏨 STAY", "☕ CAFÉS", "🌳 PARKS"], key="result_tab")
             
             with tabs[0]:  # MAP
-                st.markdown('<div class="map-container">', unsafe_allow_html=True)
-                st_folium(create_map(path, all_locations, mode_key), width=None, height=450, returned_objects=[])
-                st.markdown('</div>', unsafe_allow_html=True)
-                st.markdown('<p style="text-align:center;color:var(--text-muted);margin-top:0.5rem;">🟢 Start • 🔵 Stop • 🔴 End</p>', unsafe_allow_html=True)
-            
-            with tabs[1]:  # DRIVE MODE
-                # Initialize drive mode state
-                if 'drive_step' not in st.session_state:
-                    st.session_state.drive_step = 0
-                
-                current_step = st.session_state.drive_step
+                if tab_is_open(tabs[0]):
+                    st.markdown('<div class="map-container">', unsafe_allow_html=True)
+                    map_hit, map_ms = render_cached_map(
+                        ("route", route_map_key(path, all_locations), mode_key, tiles),
+                        lambda: create_map(path, all_locations, mode_key, tiles),
+                        height=450,
+                    )
+                    st.markdown('</div>', unsafe_allow_html=True)
+                    st.markdown('<p style="text-align:center;color:var(--text-muted);margin-top:0.5rem;">🟢 Start • 🔵 Stop • 🔴 End</p>', unsafe_allow_html=True)
+                    logger.debug("Map %s in %.1f ms", "served from cache" if map_hit else "rendered", map_ms)
                 
-                if current_step < len(path) - 1:
-                    current_loc = path[current_step]
-                    next_loc = path[current_step + 1]
+            with tabs[1]:  # DRIVE MODE
+                if tab_is_open(tabs[1]):
+                    # Initialize drive mode state
+                    if 'drive_step' not in st.session_state:
+                        st.session_state.drive_step = 0
                     
-                    seg_dist_straight = calculate_distance_km(
-                        all_locations[current_loc]["lat"], all_locations[current_loc]["lon"],
-                        all_locations[next_loc]["lat"], all_locations[next_loc]["lon"]
-                    )
-                    seg_dist = get_road_distance(seg_dist_straight)
+                    current_step = st.session_state.drive_step
                     
-                    # Calculate remaining distance
-                    remaining_straight = 0
-                    for i in range(current_step, len(path) - 1):
-                        remaining_straight += calculate_distance_km(
-                            all_locations[path[i]]["lat"], all_locations[path[i]]["lon"],
-                            all_locations[path[i+1]]["lat"], all_locations[path[i+1]]["lon"]
-                        )
-                    remaining = get_road_distance(remaining_straight)
+                    if current_step < len(path) - 1:
+                        current_loc = path[current_step]
+                        next_loc = path[current_step + 1]
                     
-                    progress_pct = ((distance - remaining) / distance) * 100 if distance > 0 else 0
-                    eta = est_time(remaining, selected_speed)
-                    direction_icon = get_direction_icon(current_loc, next_loc, all_locations)
+                        seg_dist = segments["road"][current_step]
                     
-                    # Create mini map for current segment
-                    drive_map = folium.Map(
-                        location=[all_locations[current_loc]["lat"], all_locations[current_loc]["lon"]],
-                        zoom_start=10,
-                        tiles='CartoDB dark_matter'
-                    )
+                        # Remaining distance from the precomputed prefix sums
+                        remaining = remaining_road_distance(segments, current_step)
                     
-                    # Add markers for current segment
-                    folium.Marker(
-                        [all_locations[current_loc]["lat"], all_locations[current_loc]["lon"]],
-                        tooltip="📍 You are here",
-                        icon=folium.Icon(color='green', icon='car', prefix='fa')
-                    ).add_to(drive_map)
+                        progress_pct = ((distance - remaining) / distance) * 100 if distance > 0 else 0
+                        eta = est_time(remaining, selected_speed)
+                        direction_icon = segments["icons"][current_step]
                     
-                    folium.Marker(
-                        [all_locations[next_loc]["lat"], all_locations[next_loc]["lon"]],
-                        tooltip=f"🎯 Next: {next_loc}",
-                        icon=folium.Icon(color='blue', icon='flag', prefix='fa')
-                    ).add_to(drive_map)
-                    
-                    # Add route line
-                    segment_coords = [
-                        [all_locations[current_loc]["lat"], all_locations[current_loc]["lon"]],
-                        [all_locations[next_loc]["lat"], all_locations[next_loc]["lon"]]
-                    ]
-                    folium.PolyLine(segment_coords, weight=6, color='#22c55e', opacity=0.9).add_to(drive_map)
-                    plugins.AntPath(segment_coords, delay=800, weight=4, color='#22c55e', pulse_color='#fff').add_to(drive_map)
+                        # Navigation Header Card
+                        st.markdown(f"""
+                            <div style="background: linear-gradient(135deg, #1a472a 0%, #0d1f12 100%); border-radius: 16px; padding: 20px; margin-bottom: 15px; border: 2px solid #22c55e;">
+                                <div style="display: flex; align-items: center; justify-content: space-between; margin-bottom: 15px;">
+                                    <div style="display: flex; align-items: center; gap: 10px;">
+                                        <div style="width: 12px; height: 12px; background: #22c55e; border-radius: 50%; animation: pulse 1.5s infinite;"></div>
+                                        <span style="color: #22c55e; font-weight: 700; font-size: 0.9rem; text-transform: uppercase; letter-spacing: 1px;">NAVIGATING</span>
+                                    </div>
+                                    <span style="color: #888; font-size: 0.85rem;">Step {current_step + 1}/{len(path) - 1}</span>
+                                </div>
+                                <div style="text-align: center;">
+                                    <div style="font-size: 4rem; margin-bottom: 5px;">{direction_icon}</div>
+                                    <p style="color: #fff; font-size: 1.8rem; font-weight: 700; margin: 10px 0;">Head to {next_loc}</p>
+                                    <p style="color: #22c55e; font-size: 3rem; font-weight: 800;">~{seg_dist:.0f} <span style="font-size: 1.2rem; color: #888;">km</span></p>
+                                </div>
+                        </div>
+                        """, unsafe_allow_html=True)
                     
-                    drive_map.fit_bounds(segment_coords, padding=[50, 50])
+                        # Mini Map
+                        render_cached_map(
+                            ("drive", route_map_key([current_loc, next_loc], all_locations), tiles),
+                            lambda: create_drive_map(current_loc, next_loc, all_locations, tiles),
+                            height=250,
+                        )
                     
-                    # Navigation Header Card
-                    st.markdown(f"""
-                        <div style="background: linear-gradient(135deg, #1a472a 0%, #0d1f12 100%); border-radius: 16px; padding: 20px; margin-bottom: 15px; border: 2px solid #22c55e;">
-                            <div style="display: flex; align-items: center; justify-content: space-between; margin-bottom: 15px;">
-                                <div style="display: flex; align-items: center; gap: 10px;">
-                                    <div style="width: 12px; height: 12px; background: #22c55e; border-radius: 50%; animation: pulse 1.5s infinite;"></div>
-                                    <span style="color: #22c55e; font-weight: 700; font-size: 0.9rem; text-transform: uppercase; letter-spacing: 1px;">NAVIGATING</span>
-                                </div>
-                                <span style="color: #888; font-size: 0.85rem;">Step {current_step + 1}/{len(path) - 1}</span>
+                        # Info Cards Row
+                        col_info1, col_info2, col_info3 = st.columns(3)
+                        with col_info1:
+                            st.markdown(f"""
+                            <div style="background: #111; border-radius: 12px; padding: 15px; text-align: center;">
+                                <p style="color: #666; font-size: 0.75rem; margin-bottom: 5px;">📍 FROM</p>
+                                <p style="color: #fff; font-size: 1rem; font-weight: 600;">{current_loc}</p>
                             </div>
-                            <div style="text-align: center;">
-                                <div style="font-size: 4rem; margin-bottom: 5px;">{direction_icon}</div>
-                                <p style="color: #fff; font-size: 1.8rem; font-weight: 700; margin: 10px 0;">Head to {next_loc}</p>
-                                <p style="color: #22c55e; font-size: 3rem; font-weight: 800;">~{seg_dist:.0f} <span style="font-size: 1.2rem; color: #888;">km</span></p>
+                            """, unsafe_allow_html=True)
+                        with col_info2:
+                            st.markdown(f"""
+                            <div style="background: #111; border-radius: 12px; padding: 15px; text-align: center;">
+                                <p style="color: #666; font-size: 0.75rem; margin-bottom: 5px;">🎯 TO</p>
+                                <p style="color: #22c55e; font-size: 1rem; font-weight: 600;">{next_loc}</p>
                             </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Mini Map
-                    st_folium(drive_map, width=None, height=250, returned_objects=[])
+                            """, unsafe_allow_html=True)
+                        with col_info3:
+                            st.markdown(f"""
+                            <div style="background: #111; border-radius: 12px; padding: 15px; text-align: center;">
+                                <p style="color: #666; font-size: 0.75rem; margin-bottom: 5px;">⏱️ SEGMENT</p>
+                                <p style="color: #4ade80; font-size: 1rem; font-weight: 600;">{est_time(seg_dist, selected_speed)}</p>
+                            </div>
+                            """, unsafe_allow_html=True)
                     
-                    # Info Cards Row
-                    col_info1, col_info2, col_info3 = st.columns(3)
-                    with col_info1:
+                        # Progress Bar
                         st.markdown(f"""
-                        <div style="background: #111; border-radius: 12px; padding: 15px; text-align: center;">
-                            <p style="color: #666; font-size: 0.75rem; margin-bottom: 5px;">📍 FROM</p>
-                            <p style="color: #fff; font-size: 1rem; font-weight: 600;">{current_loc}</p>
+                        <div style="background: #111; border-radius: 12px; padding: 15px; margin: 15px 0;">
+                            <div style="display: flex; justify-content: space-between; margin-bottom: 10px;">
+                                <span style="color: #888; font-size: 0.85rem;">Journey Progress</span>
+                                <span style="color: #22c55e; font-weight: 600;">{progress_pct:.0f}%</span>
+                            </div>
+                            <div style="background: #222; border-radius: 10px; height: 12px; overflow: hidden;">
+                                <div style="background: linear-gradient(90deg, #22c55e, #4ade80); width: {progress_pct:.0f}%; height: 100%; border-radius: 10px; transition: width 0.5s;"></div>
+                            </div>
+                            <div style="display: flex; justify-content: space-between; margin-top: 10px;">
+                                <span style="color: #888;">📏 {remaining:.0f} km left</span>
+                                <span style="color: #22c55e; font-weight: 600;">🕐 ETA: {eta}</span>
+                            </div>
                         </div>
                         """, unsafe_allow_html=True)
-                    with col_info2:
+                    
+                        # Next stop preview
+                        if current_step + 2 < len(path):
+                            st.markdown(f"""
+                            <div style="background: #0a0a0a; border: 1px solid #222; border-radius: 12px; padding: 12px;">
+                                <p style="color: #666; font-size: 0.75rem; margin-bottom: 5px;">⏭️ THEN CONTINUE TO</p>
+                                <p style="color: #888; font-size: 0.95rem;">{path[current_step + 2]}</p>
+                            </div>
+                            """, unsafe_allow_html=True)
+                    
+                        st.markdown("<br>", unsafe_allow_html=True)
+                    
+                        # Navigation Controls
+                        col_d1, col_d2, col_d3 = st.columns([1, 1, 1])
+                        with col_d1:
+                            if st.button("⬅️ BACK", use_container_width=True, disabled=(current_step == 0)):
+                                if st.session_state.drive_step > 0:
+                                    st.session_state.drive_step -= 1
+                                    st.rerun()
+                        with col_d2:
+                            if st.button("🔄 RESTART", use_container_width=True):
+                                st.session_state.drive_step = 0
+                                st.rerun()
+                        with col_d3:
+                            if st.button("NEXT ➡️", use_container_width=True, type="primary"):
+                                if st.session_state.drive_step < len(path) - 2:
+                                    st.session_state.drive_step += 1
+                                    st.rerun()
+                    
+                    else:
+                        # Arrived at destination
                         st.markdown(f"""
-                        <div style="background: #111; border-radius: 12px; padding: 15px; text-align: center;">
-                            <p style="color: #666; font-size: 0.75rem; margin-bottom: 5px;">🎯 TO</p>
-                            <p style="color: #22c55e; font-size: 1rem; font-weight: 600;">{next_loc}</p>
+                        <div style="background: linear-gradient(135deg, #1a472a 0%, #0d1f12 100%); border-radius: 20px; padding: 40px; text-align: center; border: 3px solid #22c55e;">
+                            <div style="font-size: 5rem; margin-bottom: 15px;">🏁</div>
+                            <h2 style="color: #22c55e; font-size: 2rem; margin-bottom: 10px;">You Have Arrived!</h2>
+                            <p style="color: #fff; font-size: 1.3rem; margin-bottom: 5px;">{path[-1]}</p>
+                            <p style="color: #888; font-size: 1rem;">Journey Complete • Total: ~{distance:.0f} km</p>
                         </div>
                         """, unsafe_allow_html=True)
-                    with col_info3:
+                    
+                        if st.button("🔄 Start Over", use_container_width=True):
+                            st.session_state.drive_step = 0
+                            st.rerun()
+                    
+                        st.balloons()
+                
+            with tabs[2]:  # DIRECTIONS
+                if tab_is_open(tabs[2]):
+                    st.markdown("### 🧭 Directions")
+                    st.markdown(f"*Distances are road estimates at **{selected_speed} km/h***")
+                    badge_color = "var(--info)" if route_mode == "local" else "var(--success)"
+                    badge_text = "🏙️ Local" if route_mode == "local" else "🛣️ Inter-City"
+                    st.markdown(f'<span style="background:{badge_color};color:white;padding:4px 12px;border-radius:20px;font-size:0.8rem;">{badge_text}</span>', unsafe_allow_html=True)
+                    
+                    for i in range(len(path) - 1):
+                        frm, to = path[i], path[i+1]
+                        seg_dist = segments["road"][i]
+                        cumulative = segments["cum_road"][i + 1]
+                        direction = segments["icons"][i]
                         st.markdown(f"""
-                        <div style="background: #111; border-radius: 12px; padding: 15px; text-align: center;">
-                            <p style="color: #666; font-size: 0.75rem; margin-bottom: 5px;">⏱️ SEGMENT</p>
-                            <p style="color: #4ade80; font-size: 1rem; font-weight: 600;">{est_time(seg_dist, selected_speed)}</p>
+                        <div class="nav-step">
+                            <div class="nav-number">{direction}</div>
+                            <div class="nav-content">
+                                <p class="nav-cities">{frm} → {to}</p>
+                                <p class="nav-meta">📏 ~{seg_dist:.0f} km • ⏱️ {est_time(seg_dist, selected_speed)} • Total: {cumulative:.0f} km</p>
+                            </div>
                         </div>
                         """, unsafe_allow_html=True)
                     
-                    # Progress Bar
                     st.markdown(f"""
-                    <div style="background: #111; border-radius: 12px; padding: 15px; margin: 15px 0;">
-                        <div style="display: flex; justify-content: space-between; margin-bottom: 10px;">
-                            <span style="color: #888; font-size: 0.85rem;">Journey Progress</span>
-                            <span style="color: #22c55e; font-weight: 600;">{progress_pct:.0f}%</span>
-                        </div>
-                        <div style="background: #222; border-radius: 10px; height: 12px; overflow: hidden;">
-                            <div style="background: linear-gradient(90deg, #22c55e, #4ade80); width: {progress_pct:.0f}%; height: 100%; border-radius: 10px; transition: width 0.5s;"></div>
-                        </div>
-                        <div style="display: flex; justify-content: space-between; margin-top: 10px;">
-                            <span style="color: #888;">📏 {remaining:.0f} km left</span>
-                            <span style="color: #22c55e; font-weight: 600;">🕐 ETA: {eta}</span>
+                    <div class="nav-step" style="border-left-color: var(--error);">
+                        <div class="nav-number" style="background: var(--error);">🏁</div>
+                        <div class="nav-content">
+                            <p class="nav-cities">Arrived at {path[-1]}</p>
+                            <p class="nav-meta">🎉 Journey Complete!</p>
                         </div>
                     </div>
                     """, unsafe_allow_html=True)
+                
+            with tabs[3]:  # OFFLINE SAVE
+                if tab_is_open(tabs[3]):
+                    st.markdown("### 💾 Save for Offline")
+                    st.markdown("*Download your route to use without internet*")
                     
-                    # Next stop preview
-                    if current_step + 2 < len(path):
-                        st.markdown(f"""
-                        <div style="background: #0a0a0a; border: 1px solid #222; border-radius: 12px; padding: 12px;">
-                            <p style="color: #666; font-size: 0.75rem; margin-bottom: 5px;">⏭️ THEN CONTINUE TO</p>
-                            <p style="color: #888; font-size: 0.95rem;">{path[current_step + 2]}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
+                    # Generate offline data once per route and settings
+                    offline_key = (mode_key, fuel_avg, fuel_price, selected_speed)
+                    offline_cache = st.session_state.route_data.setdefault('offline', {})
+                    if offline_key not in offline_cache:
+                        offline_cache.clear()
+                        offline_cache[offline_key] = generate_offline_data(path, distance, all_locations, mode_key, fuel_avg, fuel_price, selected_speed, segments)
+                    offline_data = offline_cache[offline_key]
+                    file_stem = f"SafarPak_Route_{path[0]}_to_{path[-1]}"
+                    
+                    st.markdown("---")
+                    
+                    # Text file download
+                    st.markdown("""
+                    <div class="offline-card">
+                        <p class="offline-title">📄 Text Route (Printable)</p>
+                        <p class="offline-desc">Plain text format - perfect for printing or viewing on any device</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                    lazy_download_button(f"📥 Download {file_stem}.txt",
+                                         lambda: create_text_route(offline_data).encode(),
+                                         f"{file_stem}.txt", "text/plain", key="dl_txt")
                     
                     st.markdown("<br>", unsafe_allow_html=True)
                     
-                    # Navigation Controls
-                    col_d1, col_d2, col_d3 = st.columns([1, 1, 1])
-                    with col_d1:
-                        if st.button("⬅️ BACK", use_container_width=True, disabled=(current_step == 0)):
-                            if st.session_state.drive_step > 0:
-                                st.session_state.drive_step -= 1
-                                st.rerun()
-                    with col_d2:
-                        if st.button("🔄 RESTART", use_container_width=True):
-                            st.session_state.drive_step = 0
-                            st.rerun()
-                    with col_d3:
-                        if st.button("NEXT ➡️", use_container_width=True, type="primary"):
-                            if st.session_state.drive_step < len(path) - 2:
-                                st.session_state.drive_step += 1
-                                st.rerun()
-                
-                else:
-                    # Arrived at destination
-                    st.markdown(f"""
-                    <div style="background: linear-gradient(135deg, #1a472a 0%, #0d1f12 100%); border-radius: 20px; padding: 40px; text-align: center; border: 3px solid #22c55e;">
-                        <div style="font-size: 5rem; margin-bottom: 15px;">🏁</div>
-                        <h2 style="color: #22c55e; font-size: 2rem; margin-bottom: 10px;">You Have Arrived!</h2>
-                        <p style="color: #fff; font-size: 1.3rem; margin-bottom: 5px;">{path[-1]}</p>
-                        <p style="color: #888; font-size: 1rem;">Journey Complete • Total: ~{distance:.0f} km</p>
+                    # JSON file download
+                    st.markdown("""
+                    <div class="offline-card">
+                        <p class="offline-title">📊 JSON Data (Technical)</p>
+                        <p class="offline-desc">Machine-readable format with coordinates for GPS apps</p>
                     </div>
                     """, unsafe_allow_html=True)
+                    lazy_download_button(f"📥 Download {file_stem}.json",
+                                         lambda: json.dumps(offline_data, indent=2).encode(),
+                                         f"{file_stem}.json", "application/json", key="dl_json")
                     
-                    if st.button("🔄 Start Over", use_container_width=True):
-                        st.session_state.drive_step = 0
-                        st.rerun()
+                    st.markdown("<br>", unsafe_allow_html=True)
                     
-                    st.balloons()
-            
-            with tabs[2]:  # DIRECTIONS
-                st.markdown("### 🧭 Directions")
-                st.markdown(f"*Distances are road estimates at **{selected_speed} km/h***")
-                badge_color = "var(--info)" if route_mode == "local" else "var(--success)"
-                badge_text = "🏙️ Local" if route_mode == "local" else "🛣️ Inter-City"
-                st.markdown(f'<span style="background:{badge_color};color:white;padding:4px 12px;border-radius:20px;font-size:0.8rem;">{badge_text}</span>', unsafe_allow_html=True)
-                
-                cumulative = 0
-                for i in range(len(path) - 1):
-                    frm, to = path[i], path[i+1]
-                    seg_straight = calculate_distance_km(all_locations[frm]["lat"], all_locations[frm]["lon"],
-                                                        all_locations[to]["lat"], all_locations[to]["lon"])
-                    seg_dist = get_road_distance(seg_straight)
-                    cumulative += seg_dist
-                    direction = get_direction_icon(frm, to, all_locations)
-                    st.markdown(f"""
-                    <div class="nav-step">
-                        <div class="nav-number">{direction}</div>
-                        <div class="nav-content">
-                            <p class="nav-cities">{frm} → {to}</p>
-                            <p class="nav-meta">📏 ~{seg_dist:.0f} km • ⏱️ {est_time(seg_dist, selected_speed)} • Total: {cumulative:.0f} km</p>
-                        </div>
+                    # GPS formats
+                    st.markdown("""
+                    <div class="offline-card">
+                        <p class="offline-title">🛰️ GPX / GeoJSON (GPS & Mapping)</p>
+                        <p class="offline-desc">Import into GPS devices, navigation apps or GIS tools</p>
                     </div>
                     """, unsafe_allow_html=True)
-                
-                st.markdown(f"""
-                <div class="nav-step" style="border-left-color: var(--error);">
-                    <div class="nav-number" style="background: var(--error);">🏁</div>
-                    <div class="nav-content">
-                        <p class="nav-cities">Arrived at {path[-1]}</p>
-                        <p class="nav-meta">🎉 Journey Complete!</p>
+                    col_gpx, col_geojson = st.columns(2)
+                    with col_gpx:
+                        lazy_download_button(f"📥 {file_stem}.gpx",
+                                             lambda: create_gpx(offline_data).encode(),
+                                             f"{file_stem}.gpx", "application/gpx+xml", key="dl_gpx")
+                    with col_geojson:
+                        lazy_download_button(f"📥 {file_stem}.geojson",
+                                             lambda: json.dumps(create_geojson(offline_data)).encode(),
+                                             f"{file_stem}.geojson", "application/geo+json", key="dl_geojson")
+                    
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    
+                    # Previews are only sent to the browser when switched on
+                    if st.toggle("👁️ Preview Text Route", key="preview_txt"):
+                        st.code(create_text_route(offline_data), language=None)
+                    
+                    if st.toggle("👁️ Preview JSON Data", key="preview_json"):
+                        st.json(offline_data)
+                    
+                    st.markdown("""
+                    <div style="background: var(--bg-card); border: 1px solid var(--border); border-radius: 12px; padding: 1rem; margin-top: 1rem;">
+                        <p style="color: var(--text-secondary); font-size: 0.85rem;">
+                            💡 <strong>Tip:</strong> Save these files before your journey. The text file works offline on any device, 
+                            while the GPX and GeoJSON files can be imported into GPS navigation apps.
+                        </p>
                     </div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with tabs[3]:  # OFFLINE SAVE
-                st.markdown("### 💾 Save for Offline")
-                st.markdown("*Download your route to use without internet*")
-                
-                # Generate offline data
-                offline_data = generate_offline_data(path, distance, all_locations, mode_key, fuel_avg, fuel_price, selected_speed)
-                text_route = create_text_route(offline_data)
-                
-                st.markdown("---")
-                
-                # Text file download
-                st.markdown("""
-                <div class="offline-card">
-                    <p class="offline-title">📄 Text Route (Printable)</p>
-                    <p class="offline-desc">Plain text format - perfect for printing or viewing on any device</p>
-                </div>
-                """, unsafe_allow_html=True)
-                st.markdown(get_download_link(text_route, f"SafarPak_Route_{path[0]}_to_{path[-1]}.txt", "text"), unsafe_allow_html=True)
-                
-                st.markdown("<br>", unsafe_allow_html=True)
-                
-                # JSON file download
-                st.markdown("""
-                <div class="offline-card">
-                    <p class="offline-title">📊 JSON Data (Technical)</p>
-                    <p class="offline-desc">Machine-readable format with coordinates for GPS apps</p>
-                </div>
-                """, unsafe_allow_html=True)
-                st.markdown(get_download_link(offline_data, f"SafarPak_Route_{path[0]}_to_{path[-1]}.json", "json"), unsafe_allow_html=True)
-                
-                st.markdown("<br>", unsafe_allow_html=True)
-                
-                # Preview
-                with st.expander("👁️ Preview Text Route"):
-                    st.code(text_route, language=None)
-                
-                with st.expander("👁️ Preview JSON Data"):
-                    st.json(offline_data)
+                    """, unsafe_allow_html=True)
                 
-                st.markdown("""
-                <div style="background: var(--bg-card); border: 1px solid var(--border); border-radius: 12px; padding: 1rem; margin-top: 1rem;">
-                    <p style="color: var(--text-secondary); font-size: 0.85rem;">
-                        💡 <strong>Tip:</strong> Save these files before your journey. The text file works offline on any device, 
-                        while the JSON file can be imported into GPS navigation apps.
-                    </p>
-                </div>
-                """, unsafe_allow_html=True)
-            
             # Nearby places tabs (adjusted indices)
             categories = [(4, "restaurants", "🍽️"), (5, "hotels", "🏨"), (6, "cafes", "☕"), (7, "parks", "🌳")]
             
             for idx, cat, icon in categories:
                 with tabs[idx]:
-                    st.markdown(f"### {icon} Nearby {cat.title()}")
-                    selected = st.selectbox(f"📍 Location:", path, index=len(path)-1, key=f"sel_{cat}", label_visibility="collapsed")
-                    st.markdown(f"*Showing {cat} near **{selected}***")
-                    
-                    for place in get_nearby_places(selected, cat):
-                        stars = "⭐" * int(place['rating'])
-                        st.markdown(f"""
-                        <div class="place-card">
-                            <div class="place-icon">{icon}</div>
-                            <div class="place-info">
-                                <p class="place-name">{place['name']}</p>
-                                <p class="place-detail">{place['type']} • {place['price']}</p>
-                                <p class="place-rating">{stars} {place['rating']}</p>
+                    if tab_is_open(tabs[idx]):
+                        st.markdown(f"### {icon} Nearby {cat.title()}")
+                        selected = st.selectbox(f"📍 Location:", path, index=len(path)-1, key=f"sel_{cat}", label_visibility="collapsed")
+                        parent_city = snap_location(selected, all_locations, cities, snap_table)[0]
+                        area_note = f" ({parent_city} area)" if parent_city and parent_city != selected else ""
+                        st.markdown(f"*Showing {cat} near **{selected}**{area_note}*")
+                        
+                        for place in get_nearby_places(selected, cat, all_locations):
+                            stars = "⭐" * int(place['rating'])
+                            st.markdown(f"""
+                            <div class="place-card">
+                                <div class="place-icon">{icon}</div>
+                                <div class="place-info">
+                                    <p class="place-name">{place['name']}</p>
+                                    <p class="place-detail">{place['type']} • {place['price']}</p>
+                                    <p class="place-rating">{stars} {place['rating']}</p>
+                                </div>
+                                <div class="place-distance">{place['distance']}</div>
                             </div>
-                            <div class="place-distance">{place['distance']}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-            
+                            """, unsafe_allow_html=True)
+                
             st.markdown(f'<div class="success-banner"><p class="success-text">✅ Route: {len(path)} locations, {distance} km</p></div>', unsafe_allow_html=True)
         else:
             st.markdown("""
@@ -4145,20 +3991,6 @@ def main():
             pointer-events: none !important;
         }
     </style>
-    <script>
-        (function() {
-            function hideToggle() {
-                // Remove ONLY the button, not the parent div
-                document.querySelectorAll('button[name="keyboard_double_arrow_left"]').forEach(b => {
-                    b.style.cssText = 'display:none!important;visibility:hidden!important;opacity:0!important;width:0!important;height:0!important;padding:0!important;margin:0!important;position:absolute!important;left:-9999px!important;pointer-events:none!important;';
-                    try { b.remove(); } catch(e) {}
-                });
-            }
-            hideToggle();
-            setInterval(hideToggle, 5);
-            requestAnimationFrame(function loop() { hideToggle(); requestAnimationFrame(loop); });
-        })();
-    </script>
     """, unsafe_allow_html=True)
 
 
@@ -0,0 +1,501 @@
+"""
+Benchmark Suite
+Times the routing pipeline on a fixed, seeded workload so runs can be
+compared: loading the city CSV (as the list of dicts and as the columnar
+store, plus mapping the binary store), building the range graph at every
+slider threshold with each builder, single Dijkstra queries over a fixed
+random set of city pairs, and end-to-end routing through RouteEngine,
+snapping included, between known places and between arbitrary points.
+
+With --scaling, the same builders and queries, plus every name search
+(SearchIndex, SQLite FTS5) and nearest-place engine (linear scan, grid,
+SQLite R*Tree), run on synthetic city sets of growing size (see
+synthetic_cities.py), and --chart draws build and query cost against n as
+a log-log SVG. A case stops at the first size it is predicted, from its
+growth so far, to take longer than --budget-s.
+
+Every case reports min / median / mean / p95 / max in milliseconds. Results
+are written as JSON together with the machine, Python version and commit;
+--compare prints the change in median against an earlier results file.
+
+Usage:
+    python benchmark.py [--pairs 200] [--repeat 5] [--seed 42] [--output bench.json]
+    python benchmark.py --compare bench_before.json [--output bench_after.json]
+    python benchmark.py --scaling [--sizes 1000 10000 100000 1000000] [--output scaling.json] [--chart scaling.svg]
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from xml.sax.saxutils import escape
+
+from dijkstra import load_cities, build_graph, dijkstra
+from city_store import CityStore, load_city_store
+from gazetteer import Gazetteer, CITY_CATEGORY
+from location_db import LocationDB, build_location_db
+from route_engine import RouteEngine, DEFAULT_CITIES_FILE
+from route_loadgen import percentile
+from search_index import SearchIndex
+from spatial_index import GridIndex
+from synthetic_cities import generate_cities, write_cities
+
+
+# Range thresholds of the app's slider (min, max, step)
+SLIDER_THRESHOLDS = tuple(range(100, 501, 25))
+
+# Settings that change the workload; results are only comparable when they match
+WORKLOAD_KEYS = ("cities_file", "cities", "locations", "pairs", "seed")
+
+# Bounding box random points are drawn from (Pakistan)
+PAKISTAN_BBOX = (23.5, 60.8, 37.1, 77.8)
+
+# Synthetic city set sizes measured by --scaling
+SCALING_SIZES = (1000, 3000, 10000, 30000, 100000, 300000, 1000000)
+
+# Graph threshold at each size keeps the real dataset's density: 300 km at
+# 277 cities, shrinking with sqrt(n) so the average degree stays about the same
+SCALING_BASE_KM, SCALING_BASE_CITIES = 300, 277
+
+# A scaling case stops once its next size is predicted to take longer than this
+SCALING_BUDGET_S = 60
+
+# Lowest growth exponent assumed per scaling case (default 1): the graph
+# builders compare every pair of cities, so they are predicted as O(n^2)
+# from their first size on
+SCALING_EXPONENTS = {"graph.dicts": 2.0, "graph.store": 2.0}
+
+# Queries per size for the scaling query cases
+SCALING_QUERIES = 200
+
+
+# ==================== TIMING ====================
+def summarize(samples):
+    """Millisecond statistics of a list of durations in seconds."""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 4),
+        "median_ms": round(statistics.median(ordered) * 1000, 4),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+def time_calls(fn, repeat):
+    """Durations of `repeat` calls of fn()."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def time_each(fn, items):
+    """Durations of fn(item) for each item, and the results."""
+    samples, results = [], []
+    for item in items:
+        start = time.perf_counter()
+        results.append(fn(item))
+        samples.append(time.perf_counter() - start)
+    return samples, results
+
+
+# ==================== WORKLOAD ====================
+def random_pairs(rng, names, count):
+    """`count` (source, destination) pairs of distinct names."""
+    return [tuple(rng.sample(names, 2)) for _ in range(count)]
+
+
+def random_points(rng, count, bbox=PAKISTAN_BBOX):
+    """`count` "lat,lon" strings inside a bounding box."""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    return [f"{rng.uniform(min_lat, max_lat):.5f},{rng.uniform(min_lon, max_lon):.5f}" for _ in range(count)]
+
+
+# ==================== CASES ====================
+def bench_load(cities_file, repeat):
+    """CSV to list of dicts, CSV to columnar store, and mapping the binary store."""
+    load_city_store(cities_file)  # make sure the binary store exists and is current
+    return {
+        "load.csv_dicts": summarize(time_calls(lambda: load_cities(cities_file), repeat)),
+        "load.csv_store": summarize(time_calls(lambda: CityStore.from_csv(cities_file), repeat)),
+        "load.binary_store": summarize(time_calls(lambda: load_city_store(cities_file, write_cache=False), repeat)),
+    }
+
+
+def bench_graphs(cities, store, thresholds, repeat):
+    """Graph build at each threshold with dijkstra.build_graph() and CityStore.build_graph()."""
+    results, edges = {}, {}
+    for threshold in thresholds:
+        results[f"graph.dicts@{threshold}"] = summarize(time_calls(lambda: build_graph(cities, threshold), repeat))
+        results[f"graph.store@{threshold}"] = summarize(time_calls(lambda: store.build_graph(threshold), repeat))
+        edges[threshold] = sum(len(neighbors) for neighbors in store.build_graph(threshold).values()) // 2
+    return results, edges
+
+
+def bench_queries(store, thresholds, pairs):
+    """Single dijkstra() queries over the fixed city pairs, on each threshold's graph."""
+    results, found = {}, {}
+    for threshold in thresholds:
+        graph = store.build_graph(threshold)
+        samples, paths = time_each(lambda pair: dijkstra(graph, *pair), pairs)
+        results[f"dijkstra@{threshold}"] = summarize(samples)
+        found[threshold] = sum(1 for path, _ in paths if path)
+    return results, found
+
+
+def bench_routes(engine, thresholds, place_pairs, point_pairs):
+    """
+    End-to-end routing through RouteEngine, snapping included.
+
+    Places snap through the gazetteer table; points are resolved into a
+    per-query overlay and snapped with a nearest-city search, as the app
+    does for map pins. cached_route() shares shortest-path trees across
+    queries, as the server does: timed from an empty tree cache, then again
+    with every tree cached.
+    """
+    results = {}
+
+    def route_points(pair, threshold):
+        overlay = {}
+        source, dest = (engine.resolve(p, overlay) for p in pair)
+        return engine.route(source, dest, threshold, engine.location_view(overlay), engine.snap_view({}))
+
+    for threshold in thresholds:
+        engine.graph(threshold)  # graph build is timed separately
+        samples, _ = time_each(lambda pair: engine.route(pair[0], pair[1], threshold), place_pairs)
+        results[f"find_route@{threshold}"] = summarize(samples)
+        samples, _ = time_each(lambda pair: route_points(pair, threshold), point_pairs)
+        results[f"find_route.points@{threshold}"] = summarize(samples)
+        engine.tree.cache_clear()
+        samples, _ = time_each(lambda pair: engine.cached_route(pair[0], pair[1], threshold), place_pairs)
+        results[f"cached_route@{threshold}"] = summarize(samples)
+        samples, _ = time_each(lambda pair: engine.cached_route(pair[0], pair[1], threshold), place_pairs)
+        results[f"cached_route.warm@{threshold}"] = summarize(samples)
+    return results
+
+
+# ==================== SCALING ====================
+def scaling_threshold(n):
+    """Graph threshold (km) that gives n cities about the real dataset's average degree."""
+    return round(SCALING_BASE_KM * math.sqrt(SCALING_BASE_CITIES / n), 2)
+
+
+def city_gazetteer(store):
+    """Gazetteer of a city set alone (ids in dataset order, every city its own snap)."""
+    return Gazetteer([
+        {"id": i, "name": name, "type": "city", "category": CITY_CATEGORY, "also_in": (), "aliases": (),
+         "parent_id": i, "parent_km": 0.0, "lat": store.lat[i], "lon": store.lon[i]}
+        for i, name in enumerate(store.names)
+    ])
+
+
+def name_queries(rng, names, count):
+    """Search queries: prefixes of 1-8 characters of random names, some with a typo."""
+    queries = []
+    for _ in range(count):
+        name = rng.choice(names)
+        query = name[:rng.randint(1, 8)]
+        if len(query) > 4 and rng.random() < 0.2:
+            pos = rng.randrange(1, len(query) - 1)
+            query = query[:pos] + query[pos + 1] + query[pos] + query[pos + 2:]
+        queries.append(query)
+    return queries
+
+
+class ScalingRun:
+    """
+    Times cases across growing sizes, skipping a case once it would exceed the budget.
+
+    The time of a case's next run is predicted from its last two sizes
+    (power-law growth), never below the case's exponent in SCALING_EXPONENTS.
+    """
+
+    def __init__(self, budget_s):
+        self.budget_s = budget_s
+        self.history = {}
+        self.results = {}
+        self.skipped = {}
+
+    def allowed(self, case, n):
+        history = self.history.get(case, [])
+        if case in self.skipped:
+            return False
+        if history:
+            (n1, t1), slope = history[-1], SCALING_EXPONENTS.get(case, 1.0)
+            if len(history) > 1:
+                (n0, t0) = history[-2]
+                if t0 > 0 and t1 > 0:
+                    slope = max(slope, math.log(t1 / t0) / math.log(n1 / n0))
+            if t1 * (n / n1) ** slope > self.budget_s:
+                self.skipped[case] = n
+                return False
+        return True
+
+    def record(self, case, n, samples, total_s=None):
+        self.history.setdefault(case, []).append((n, sum(samples) if total_s is None else total_s))
+        self.results[f"{case}@{n}"] = summarize(samples)
+
+    def build(self, case, n, fn):
+        """Run fn() once as a timed build step; returns its result, or None when skipped."""
+        if not self.allowed(case, n):
+            return None
+        start = time.perf_counter()
+        built = fn()
+        self.record(case, n, [time.perf_counter() - start])
+        return built
+
+    def queries(self, case, n, fn, items):
+        """Time fn(item) per item; skipped when over budget."""
+        if self.allowed(case, n):
+            samples, _ = time_each(fn, items)
+            self.record(case, n, samples)
+
+
+def run_scaling(sizes, seed, budget_s, pair_count=SCALING_QUERIES):
+    """Build and query cost of every graph builder and search engine on synthetic city sets."""
+    run = ScalingRun(budget_s)
+    thresholds = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            rng = random.Random(seed)
+            cities_file = os.path.join(tmp, f"cities_{n}.csv")
+            write_cities(cities_file, generate_cities(n, seed))
+            print(f"n={n}", file=sys.stderr)
+
+            store = run.build("load.csv_store", n, lambda: CityStore.from_csv(cities_file))
+            if store is None:
+                break
+            names = sorted(store.names)
+            pairs = random_pairs(rng, names, pair_count)
+            points = [tuple(map(float, p.split(","))) for p in random_points(rng, pair_count)]
+            queries = name_queries(rng, names, pair_count)
+            threshold = thresholds[n] = scaling_threshold(n)
+
+            # Graph builders, and single queries on the graph
+            cities = run.build("load.csv_dicts", n, lambda: load_cities(cities_file))
+            if cities is not None:
+                run.build("graph.dicts", n, lambda: build_graph(cities, threshold))
+            del cities
+            graph = run.build("graph.store", n, lambda: store.build_graph(threshold))
+            if graph is not None:
+                run.queries("dijkstra", n, lambda pair: dijkstra(graph, *pair), pairs)
+            del graph
+
+            # Name search engines
+            index = run.build("search.index.build", n, lambda: SearchIndex((i, name, (), 0) for i, name in enumerate(store.names)))
+            if index is not None:
+                run.queries("search.index.query", n, lambda q: index.search(q, 10), queries)
+            del index
+            db_file = os.path.join(tmp, f"locations_{n}.db")
+            built = run.build("location_db.build", n, lambda: build_location_db(city_gazetteer(store), db_file) or True)
+            db = LocationDB.open(db_file) if built else None
+            if db is not None:
+                run.queries("search.fts.query", n, lambda q: db.search(q, 10), queries)
+
+            # Nearest-place engines
+            run.queries("nearest.scan.query", n, lambda p: store.nearest(*p), points)
+            grid = run.build("nearest.grid.build", n, lambda: _grid(store))
+            if grid is not None:
+                run.queries("nearest.grid.query", n, lambda p: grid.nearest(p[0], p[1], k=5), points)
+            if db is not None:
+                run.queries("nearest.rtree.query", n, lambda p: db.nearest(p[0], p[1], 5), points)
+            del grid, db
+            os.remove(db_file)
+            os.remove(cities_file)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "cities_file": "synthetic",
+            "sizes": list(sizes),
+            "pairs": pair_count,
+            "seed": seed,
+            "budget_s": budget_s,
+        },
+        "thresholds": {str(n): t for n, t in thresholds.items()},
+        "skipped_from": run.skipped,
+        "results": run.results,
+    }
+
+
+def _grid(store):
+    index = GridIndex()
+    for i, name in enumerate(store.names):
+        index.insert(store.lat[i], store.lon[i], name)
+    return index
+
+
+def write_chart(path, doc):
+    """
+    Log-log SVG chart of a scaling run: build cost (total) and query cost
+    (median per query) against the number of cities, one line per case.
+    """
+    series = {}
+    for key, stats in doc["results"].items():
+        case, _, n = key.rpartition("@")
+        value = stats["min_ms"] if stats["n"] == 1 else stats["median_ms"]
+        series.setdefault(case, []).append((int(n), value))
+    panels = [("Build cost (ms)", {c: v for c, v in series.items() if "query" not in c and c != "dijkstra"}),
+              ("Query cost (median ms)", {c: v for c, v in series.items() if "query" in c or c == "dijkstra"})]
+    colors = ("#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f")
+    width, height, pad = 560, 380, 60
+    sizes = [n for points in series.values() for n, _ in points]
+    x_lo, x_hi = math.log10(min(sizes)), math.log10(max(sizes)) + 1e-9
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{2 * width}" height="{height}" font-family="sans-serif" font-size="11">']
+    for p, (title, cases) in enumerate(panels):
+        values = [max(v, 1e-4) for points in cases.values() for _, v in points] or [1]
+        y_lo, y_hi = math.floor(math.log10(min(values))), math.ceil(math.log10(max(values))) + 1e-9
+        left = p * width + pad
+
+        def x(n):
+            return left + (math.log10(n) - x_lo) / (x_hi - x_lo) * (width - 2 * pad)
+
+        def y(v):
+            return height - pad - (math.log10(max(v, 1e-4)) - y_lo) / (y_hi - y_lo) * (height - 2 * pad)
+
+        parts.append(f'<text x="{left}" y="20" font-size="14">{escape(title)} vs cities (log-log)</text>')
+        parts.append(f'<rect x="{left}" y="{pad}" width="{width - 2 * pad}" height="{height - 2 * pad}" fill="none" stroke="#999"/>')
+        for e in range(int(y_lo), int(math.ceil(y_hi))):
+            parts.append(f'<text x="{left - 5}" y="{y(10 ** e) + 4:.1f}" text-anchor="end">1e{e}</text>')
+        for n in sorted(set(sizes)):
+            parts.append(f'<text x="{x(n):.1f}" y="{height - pad + 15}" text-anchor="middle">{n:,}</text>')
+        for i, (case, points) in enumerate(sorted(cases.items())):
+            color = colors[i % len(colors)]
+            line = " ".join(f"{x(n):.1f},{y(v):.1f}" for n, v in sorted(points))
+            parts.append(f'<polyline points="{line}" fill="none" stroke="{color}" stroke-width="2"/>')
+            for n, v in points:
+                parts.append(f'<circle cx="{x(n):.1f}" cy="{y(v):.1f}" r="3" fill="{color}"/>')
+            parts.append(f'<text x="{left + 8}" y="{pad + 14 + 13 * i}" fill="{color}">{escape(case)}</text>')
+    parts.append("</svg>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts) + "\n")
+
+
+# ==================== REPORT ====================
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_suite(cities_file, thresholds, pair_count, repeat, seed):
+    """Run every case and return the results document."""
+    rng = random.Random(seed)
+    cities = load_cities(cities_file)
+    store = load_city_store(cities_file)
+    engine = RouteEngine(cities_file, custom_locations=False)
+    city_pairs = random_pairs(rng, sorted(store.names), pair_count)
+    place_pairs = random_pairs(rng, engine.location_names, pair_count)
+    points = random_points(rng, 2 * pair_count)
+    point_pairs = list(zip(points[::2], points[1::2]))
+
+    results = bench_load(cities_file, repeat)
+    graph_results, edges = bench_graphs(cities, store, thresholds, repeat)
+    results.update(graph_results)
+    query_results, found = bench_queries(store, thresholds, city_pairs)
+    results.update(query_results)
+    results.update(bench_routes(engine, thresholds, place_pairs, point_pairs))
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "cities_file": os.path.basename(cities_file),
+            "cities": len(store),
+            "locations": len(engine.location_names),
+            "location_db": engine.location_db is not None,
+            "thresholds": list(thresholds),
+            "pairs": pair_count,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "graph_edges": {str(t): n for t, n in edges.items()},
+        "paths_found": {str(t): n for t, n in found.items()},
+        "results": results,
+    }
+
+
+def print_results(doc, baseline=None):
+    """Table of the results, with the change in median against a baseline document."""
+    old = baseline["results"] if baseline else {}
+    header = f"{'case':<32} {'n':>5} {'median ms':>11} {'p95 ms':>10}"
+    print(header + (f" {'before ms':>11} {'change':>8}" if baseline else ""))
+    for name, stats in doc["results"].items():
+        line = f"{name:<32} {stats['n']:>5} {stats['median_ms']:>11.4f} {stats['p95_ms']:>10.4f}"
+        if name in old and old[name]["median_ms"] > 0:
+            change = stats["median_ms"] / old[name]["median_ms"] - 1
+            line += f" {old[name]['median_ms']:>11.4f} {change:>+8.1%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time city loading, graph builds, Dijkstra queries and find_route")
+    parser.add_argument("--cities", default=DEFAULT_CITIES_FILE, help="city CSV (default pak_cities.csv)")
+    parser.add_argument("--thresholds", type=int, nargs="+", default=list(SLIDER_THRESHOLDS),
+                        help="range thresholds in km (default: every slider step, 100-500 by 25)")
+    parser.add_argument("--pairs", type=int, default=200, help="random query pairs per threshold (default 200)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each load and graph build (default 5)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="earlier results JSON to compare medians against")
+    parser.add_argument("--scaling", action="store_true", help="measure cost against n on synthetic city sets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SCALING_SIZES),
+                        help="synthetic city set sizes for --scaling (default 1k to 1M)")
+    parser.add_argument("--budget-s", type=float, default=SCALING_BUDGET_S,
+                        help="longest predicted run of a --scaling case before it stops (default 60)")
+    parser.add_argument("--chart", help="write a log-log SVG chart of a --scaling run to this file")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.scaling:
+        doc = run_scaling(sorted(args.sizes), args.seed, args.budget_s)
+        meta = doc["meta"]
+        for case, n in doc["skipped_from"].items():
+            print(f"{case}: stopped before n={n} (over the {args.budget_s:g}s budget)", file=sys.stderr)
+        if args.chart:
+            write_chart(args.chart, doc)
+    else:
+        doc = run_suite(args.cities, args.thresholds, args.pairs, args.repeat, args.seed)
+        meta = doc["meta"]
+        print(f"{meta['cities']} cities, {meta['locations']} locations, {meta['pairs']} pairs, seed {meta['seed']} "
+              f"(Python {meta['python']}, {meta['machine']}, commit {meta['commit']})", file=sys.stderr)
+    if baseline:
+        differ = [k for k in WORKLOAD_KEYS if baseline["meta"].get(k) != meta.get(k)]
+        if differ:
+            print(f"warning: workload differs from {args.compare} in {', '.join(differ)}", file=sys.stderr)
+    print_results(doc, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
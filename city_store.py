@@ -0,0 +1,268 @@
+"""
+Columnar City Store
+Keeps the city dataset as parallel columns (names, float64 latitude and
+longitude, their radians and cos(latitude)) instead of one dict per city.
+Hot loops such as graph building and nearest-city search read the columns
+directly and never convert degrees or look up dict keys.
+
+The store is persisted to a small binary file next to the CSV (generated by
+data_preparation.py). Loading it maps the file and casts the float sections
+to memoryviews, so the numeric columns are used in place without copying.
+
+File layout (little-endian, every section 8-byte aligned):
+    header     magic, version, count, source CSV size and mtime
+    offsets    uint32 x (count + 1) byte offsets into the names blob
+    names      UTF-8 names, concatenated
+    lat, lon, lat_rad, lon_rad, cos_lat    float64 x count each
+"""
+
+import os
+import sys
+import math
+import mmap
+import array
+import struct
+from types import MappingProxyType
+from collections import Counter
+
+from dijkstra import load_cities
+
+
+MAGIC = b"SPCITIES"
+VERSION = 1
+
+# magic, version, count, source size, source mtime (ns), names blob length
+HEADER = struct.Struct("<8sIIqqQ")
+
+COLUMNS = ("lat", "lon", "lat_rad", "lon_rad", "cos_lat")
+
+# Earth's radius in kilometers (same as calculate_distance_km)
+EARTH_RADIUS_KM = 6371
+
+
+def _pad(n):
+    return (8 - n % 8) % 8
+
+
+def store_path_for(csv_path):
+    """Binary store that belongs to a city CSV (pak_cities.csv -> pak_cities.bin)."""
+    return os.path.splitext(csv_path)[0] + ".bin"
+
+
+class CityStore:
+    """
+    Column-oriented, read-only city table.
+
+    Attributes:
+        names: Tuple of city names, in dataset order
+        lat, lon: float64 sequences in degrees
+        lat_rad, lon_rad: The same coordinates in radians
+        cos_lat: cos(lat_rad), precomputed for the haversine formula
+    """
+
+    def __init__(self, names, columns, source=None, buffer=None):
+        self.names = names
+        self.lat, self.lon, self.lat_rad, self.lon_rad, self.cos_lat = (columns[c] for c in COLUMNS)
+        self.source = source
+        # Keeps a memory-mapped file alive for as long as its views are used
+        self._buffer = buffer
+        self._index = None
+        self._records = None
+
+    def __len__(self):
+        return len(self.names)
+
+    # ---------- construction ----------
+    @classmethod
+    def from_records(cls, cities, source=None):
+        """Build a store from load_cities()-style dicts with name, lat, lon (names must be unique)."""
+        names = tuple(c["name"] for c in cities)
+        if len(set(names)) != len(names):
+            repeated = sorted(name for name, count in Counter(names).items() if count > 1)
+            raise ValueError(f"{source or 'city list'} repeats city names, which would be merged: "
+                             f"{', '.join(repeated[:5])}{', ...' if len(repeated) > 5 else ''}")
+        lat = array.array("d", (c["lat"] for c in cities))
+        lon = array.array("d", (c["lon"] for c in cities))
+        lat_rad = array.array("d", (math.radians(v) for v in lat))
+        lon_rad = array.array("d", (math.radians(v) for v in lon))
+        cos_lat = array.array("d", (math.cos(v) for v in lat_rad))
+        columns = dict(zip(COLUMNS, (lat, lon, lat_rad, lon_rad, cos_lat)))
+        return cls(names, columns, source)
+
+    @classmethod
+    def from_csv(cls, filepath):
+        return cls.from_records(load_cities(filepath), source=filepath)
+
+    def save(self, path, source_csv=None):
+        """
+        Write the store to `path`, recording the CSV it was built from.
+
+        The file is written next to its destination and renamed into place,
+        so a reader never maps a half-written store.
+        """
+        source_csv = source_csv or self.source
+        stat = os.stat(source_csv) if source_csv and os.path.exists(source_csv) else None
+        encoded = [name.encode("utf-8") for name in self.names]
+        offsets = array.array("I", [0])
+        for name in encoded:
+            offsets.append(offsets[-1] + len(name))
+        blob = b"".join(encoded)
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self.names),
+                                stat.st_size if stat else -1, stat.st_mtime_ns if stat else -1, len(blob)))
+            for section in (_little_endian(offsets), blob):
+                f.write(section)
+                f.write(b"\0" * _pad(len(section)))
+            for column in COLUMNS:
+                f.write(_little_endian(array.array("d", getattr(self, column))))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, source_csv=None):
+        """
+        Map a store file written by save().
+
+        Returns:
+            CityStore, or None if the file is missing, malformed, or older
+            than source_csv (size or modification time differ)
+        """
+        try:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        view = memoryview(buffer)
+        try:
+            magic, version, count, src_size, src_mtime, blob_len = HEADER.unpack_from(view, 0)
+            if magic != MAGIC or version != VERSION:
+                return None
+            if source_csv is not None:
+                stat = os.stat(source_csv)
+                if (stat.st_size, stat.st_mtime_ns) != (src_size, src_mtime):
+                    return None
+
+            pos = HEADER.size
+            offsets_len = 4 * (count + 1)
+            offsets = _native(view[pos:pos + offsets_len], "I")
+            pos += offsets_len + _pad(offsets_len)
+            blob = view[pos:pos + blob_len]
+            names = tuple(bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in range(count))
+            pos += blob_len + _pad(blob_len)
+
+            columns = {}
+            for column in COLUMNS:
+                columns[column] = _native(view[pos:pos + 8 * count], "d")
+                pos += 8 * count
+            if pos > len(view):
+                return None
+        except (struct.error, ValueError, TypeError, UnicodeDecodeError, OSError):
+            return None
+        return cls(names, columns, source=source_csv, buffer=buffer)
+
+    # ---------- lookups ----------
+    def index_of(self, name):
+        """Position of a city by name (raises KeyError for unknown names)."""
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self.names)}
+        return self._index[name]
+
+    def records(self):
+        """Adapter for list-of-dicts callers: read-only {name, lat, lon} per city."""
+        if self._records is None:
+            self._records = tuple(
+                MappingProxyType({"name": name, "lat": self.lat[i], "lon": self.lon[i]})
+                for i, name in enumerate(self.names)
+            )
+        return self._records
+
+    def distance_km(self, i, j):
+        """Haversine distance between cities i and j from the precomputed columns."""
+        lat_rad, lon_rad, cos_lat = self.lat_rad, self.lon_rad, self.cos_lat
+        dlat = lat_rad[j] - lat_rad[i]
+        dlon = lon_rad[j] - lon_rad[i]
+        a = math.sin(dlat / 2)**2 + cos_lat[i] * cos_lat[j] * math.sin(dlon / 2)**2
+        return EARTH_RADIUS_KM * (2 * math.asin(math.sqrt(a)))
+
+    def nearest(self, lat, lon):
+        """
+        City closest to (lat, lon) by great-circle distance.
+
+        Returns:
+            tuple: (city name, distance_km); the first city wins ties
+        """
+        lat_rad, lon_rad, cos_lat = self.lat_rad, self.lon_rad, self.cos_lat
+        q_lat, q_lon = math.radians(lat), math.radians(lon)
+        q_cos = math.cos(q_lat)
+        best_a, best = float("inf"), -1
+        sin = math.sin
+        for i in range(len(self.names)):
+            a = sin((lat_rad[i] - q_lat) / 2)**2 + q_cos * cos_lat[i] * sin((lon_rad[i] - q_lon) / 2)**2
+            if a < best_a:
+                best_a, best = a, i
+        if best < 0:
+            return None, float("inf")
+        return self.names[best], EARTH_RADIUS_KM * (2 * math.asin(math.sqrt(best_a)))
+
+    def build_graph(self, threshold_km=300, keys=None):
+        """
+        Adjacency list linking cities at most threshold_km apart.
+
+        Same output as dijkstra.build_graph(), computed from the columns.
+        Nodes are city names, or keys[i] for city i when keys (e.g.
+        gazetteer ids) are given.
+        """
+        names = self.names if keys is None else keys
+        n = len(names)
+        lat_rad, lon_rad, cos_lat = self.lat_rad, self.lon_rad, self.cos_lat
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+        adjacency_list = {name: [] for name in names}
+        for i in range(n):
+            lat_i, lon_i, cos_i = lat_rad[i], lon_rad[i], cos_lat[i]
+            edges_i = adjacency_list[names[i]]
+            for j in range(i + 1, n):
+                a = sin((lat_rad[j] - lat_i) / 2)**2 + cos_i * cos_lat[j] * sin((lon_rad[j] - lon_i) / 2)**2
+                distance = EARTH_RADIUS_KM * (2 * asin(sqrt(a)))
+                if distance <= threshold_km:
+                    d = round(distance, 2)
+                    edges_i.append((names[j], d))
+                    adjacency_list[names[j]].append((names[i], d))
+        return adjacency_list
+
+
+def _little_endian(values):
+    if sys.byteorder != "little":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _native(section, typecode):
+    """Typed view of a little-endian section; zero-copy on little-endian hosts."""
+    if sys.byteorder == "little":
+        return section.cast(typecode)
+    values = array.array(typecode, bytes(section))
+    values.byteswap()
+    return values
+
+
+def load_city_store(csv_path, write_cache=True):
+    """
+    Columnar store for a city CSV, using its binary file when it is current.
+
+    Falls back to parsing the CSV when the binary is missing or stale, and
+    then (best effort) rewrites the binary so the next load is zero-copy.
+    """
+    bin_path = store_path_for(csv_path)
+    store = CityStore.load(bin_path, source_csv=csv_path)
+    if store is not None:
+        return store
+    store = CityStore.from_csv(csv_path)
+    if write_cache:
+        try:
+            store.save(bin_path, source_csv=csv_path)
+        except OSError:
+            pass
+    return store
@@ -0,0 +1,209 @@
+"""
+Custom Location Store
+Map pins saved by users, kept in a small SQLite file (stdlib sqlite3) next to
+the city dataset so they survive the session and app restarts and are shared
+by every session. Pins sit in an R*Tree, so the nearest pin to a click is an
+index query, and a pin dropped within a few metres of an existing one reuses
+it instead of adding a duplicate. Each pin stores its nearest city when it is
+saved, so snapping it later is a row lookup.
+
+The store is a mutable mapping of pin name -> {lat, lon, type}, so it can be
+used directly as the overlay of RouteEngine.location_view().
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+from location_db import nearest_in_boxes, within_radius
+
+
+# Same file name RouteEngine looks for
+CUSTOM_LOCATIONS_FILE = "custom_locations.db"
+
+# A pin this close to an existing one is the same place
+DEDUPE_METRES = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pins (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    snap_city TEXT,
+    snap_km REAL,
+    created REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pins_rtree USING rtree (id, min_lat, max_lat, min_lon, max_lon);
+"""
+
+
+def custom_locations_path_for(cities_file):
+    """Custom location store that belongs to a city CSV (kept in the same directory)."""
+    return os.path.join(os.path.dirname(os.path.abspath(cities_file)), CUSTOM_LOCATIONS_FILE)
+
+
+def pin_name(lat, lon):
+    """Display name of a pin, as the app has always named custom locations."""
+    return f"Custom Location ({lat:.4f}, {lon:.4f})"
+
+
+class _Snaps(MutableMapping):
+    """Pin name -> (nearest city, distance km), stored with each pin."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, name):
+        rows = self.store._query("SELECT snap_city, snap_km FROM pins WHERE name = ?", (name,))
+        row = rows[0] if rows else None
+        if row is None or row[0] is None:
+            raise KeyError(name)
+        return row[0], row[1]
+
+    def __setitem__(self, name, snap):
+        if name not in self.store:
+            raise KeyError(name)
+        self.store._write("UPDATE pins SET snap_city = ?, snap_km = ? WHERE name = ?", (snap[0], snap[1], name))
+
+    def __delitem__(self, name):
+        self.store._write("UPDATE pins SET snap_city = NULL, snap_km = NULL WHERE name = ?", (name,))
+
+    def __iter__(self):
+        return iter([name for name, in self.store._query("SELECT name FROM pins WHERE snap_city IS NOT NULL ORDER BY id")])
+
+    def __len__(self):
+        return self.store._query("SELECT COUNT(*) FROM pins WHERE snap_city IS NOT NULL")[0][0]
+
+
+class CustomLocationStore(MutableMapping):
+    """
+    Persistent, shared custom pins with an R*Tree spatial index.
+
+    One connection is shared by every thread behind a lock; the name list
+    is cached and re-read only after a write, from this process or (seen
+    through SQLite's data_version) any other.
+
+    Args:
+        path: SQLite file (created if missing); ":memory:" keeps pins for this process only
+        snap: Optional callable (lat, lon) -> (city, distance km) run when a pin is saved
+    """
+
+    def __init__(self, path, snap=None):
+        self.path = path
+        self.snap = snap
+        self._lock = threading.RLock()
+        self._con = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # Readers in other processes never wait for a writer
+            self._con.execute("PRAGMA journal_mode = WAL")
+        self._con.executescript(SCHEMA)
+        self._names = None
+        self._version = None
+        self.snaps = _Snaps(self)
+
+    def _query(self, sql, params=()):
+        """All rows of a query (read under the lock, so threads never share a live cursor)."""
+        with self._lock:
+            return self._con.execute(sql, params).fetchall()
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            self._con.execute(sql, params)
+            self._names = None
+
+    def _pin_names(self):
+        with self._lock:
+            version = self._con.execute("PRAGMA data_version").fetchone()[0]
+            if self._names is None or version != self._version:
+                self._names = tuple(name for name, in self._con.execute("SELECT name FROM pins ORDER BY id"))
+                self._version = version
+            return self._names
+
+    # ---------- mapping ----------
+    def __getitem__(self, name):
+        rows = self._query("SELECT lat, lon FROM pins WHERE name = ?", (name,))
+        if not rows:
+            raise KeyError(name)
+        lat, lon = rows[0]
+        return {"lat": lat, "lon": lon, "type": "custom"}
+
+    def __setitem__(self, name, value):
+        """Save a pin under `name` (replacing any pin of that name), with its snap."""
+        lat, lon = float(value["lat"]), float(value["lon"])
+        snap = self.snap(lat, lon) if self.snap is not None else (None, None)
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete(name)
+                cur = self._con.execute("INSERT INTO pins (name, lat, lon, snap_city, snap_km, created) VALUES (?, ?, ?, ?, ?, ?)",
+                                        (name, lat, lon, snap[0], snap[1], time.time()))
+                self._con.execute("INSERT INTO pins_rtree VALUES (?, ?, ?, ?, ?)", (cur.lastrowid, lat, lat, lon, lon))
+                self._con.execute("COMMIT")
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+            self._names = None
+
+    def _delete(self, name):
+        row = self._con.execute("SELECT id FROM pins WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            self._con.execute("DELETE FROM pins WHERE id = ?", row)
+            self._con.execute("DELETE FROM pins_rtree WHERE id = ?", row)
+        return row is not None
+
+    def __delitem__(self, name):
+        with self._lock:
+            if not self._delete(name):
+                raise KeyError(name)
+            self._names = None
+
+    def __contains__(self, name):
+        return name in self._pin_names()
+
+    def __iter__(self):
+        return iter(self._pin_names())
+
+    def __len__(self):
+        return len(self._pin_names())
+
+    # ---------- pins ----------
+    def add(self, lat, lon):
+        """
+        Save a pin at (lat, lon) and return its name.
+
+        A pin within DEDUPE_METRES, or one with the same display name (they
+        share the 4-decimal grid cell, ~10 m), is returned instead of adding
+        a second one.
+        """
+        with self._lock:
+            hits = self.within(lat, lon, DEDUPE_METRES / 1000)
+            if hits:
+                return hits[0][1]
+            name = pin_name(lat, lon)
+            if name not in self:
+                self[name] = {"lat": lat, "lon": lon}
+            return name
+
+    def in_box(self, min_lat, min_lon, max_lat, max_lon):
+        """(name, lat, lon) of the pins inside a bounding box, from the R*Tree."""
+        return self._query(
+            "SELECT p.name, p.lat, p.lon FROM pins_rtree r JOIN pins p ON p.id = r.id "
+            "WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?",
+            (max_lat, min_lat, max_lon, min_lon))
+
+    def within(self, lat, lon, radius_km):
+        """(distance_km, name) of the pins within radius_km of (lat, lon), nearest first."""
+        return within_radius(self.in_box, lat, lon, radius_km)
+
+    def nearest(self, lat, lon, k=1, max_km=None):
+        """The k pins closest to (lat, lon) as (distance_km, name), reading only nearby rows."""
+        if not self._pin_names():
+            return []
+        return nearest_in_boxes(self.in_box, lat, lon, k, max_km)
+
+    def close(self):
+        with self._lock:
+            self._con.close()
@@ -2,63 +2,307 @@
 Phase 1: Data Preparation
 Filters the world cities dataset to keep only Pakistani cities.
 Extracts: City Name, Latitude, Longitude
+
+The source is read as a stream (CSV rows or XLSX sheet rows), only the
+city/lat/lng/country columns are kept, and matching rows are written out
+as they are found, so memory stays flat however large the source is.
 """
 
-import pandas as pd
+import os
+import csv
+import sys
+import argparse
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+from city_store import CityStore, store_path_for
+from gazetteer import Gazetteer, build_gazetteer, gazetteer_path_for
+from location_db import build_location_db, location_db_path_for, source_fingerprint
+
+
+# Source columns kept from the world cities dataset
+INGEST_COLUMNS = ("city", "lat", "lng", "country")
+
+# Rows handed to the writer at a time
+DEFAULT_CHUNK_SIZE = 5000
+
+SOURCE_DIR = "simplemaps_worldcities_basicv1.901"
+
+XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+# ==================== SOURCE READERS ====================
+def iter_csv_rows(input_file):
+    """Yield each row of a CSV file as a list of strings, header first."""
+    with open(input_file, newline='', encoding='utf-8-sig') as f:
+        yield from csv.reader(f)
+
+
+def _xlsx_first_sheet(archive):
+    """Path inside the archive of the workbook's first worksheet."""
+    try:
+        workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+        rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        rel_id = workbook.find(f"{XLSX_NS}sheets/{XLSX_NS}sheet").get(f"{REL_NS}id")
+        for rel in rels.iter(f"{PKG_REL_NS}Relationship"):
+            if rel.get("Id") == rel_id:
+                target = rel.get("Target")
+                return target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+    except (KeyError, AttributeError):
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+
+def _xlsx_shared_strings(archive):
+    """The workbook's shared string table (the only part not streamed)."""
+    strings = []
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return strings
+    with archive.open("xl/sharedStrings.xml") as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == f"{XLSX_NS}si":
+                strings.append("".join(t.text or "" for t in elem.iter(f"{XLSX_NS}t")))
+                elem.clear()
+    return strings
+
+
+def _column_index(ref):
+    """Zero-based column of a cell reference like 'C12'."""
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + (ord(ch.upper()) - 64)
+    return index - 1
+
+
+def iter_xlsx_rows(input_file):
+    """
+    Yield each row of the first worksheet of an XLSX file as a list of strings.
+
+    Sheet XML is parsed incrementally and every row element is cleared once
+    read, so memory does not grow with the number of rows.
+    """
+    with zipfile.ZipFile(input_file) as archive:
+        shared = _xlsx_shared_strings(archive)
+        with archive.open(_xlsx_first_sheet(archive)) as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag != f"{XLSX_NS}row":
+                    continue
+                values = []
+                for cell in elem.iter(f"{XLSX_NS}c"):
+                    col = _column_index(cell.get("r", "")) if cell.get("r") else len(values)
+                    kind = cell.get("t")
+                    if kind == "inlineStr":
+                        text = "".join(t.text or "" for t in cell.iter(f"{XLSX_NS}t"))
+                    else:
+                        v = cell.find(f"{XLSX_NS}v")
+                        text = "" if v is None or v.text is None else v.text
+                        if kind == "s" and text:
+                            text = shared[int(text)]
+                    values.extend([""] * (col - len(values)))
+                    values.append(text)
+                elem.clear()
+                yield values
+
+
+def iter_source_rows(input_file):
+    if input_file.lower().endswith((".xlsx", ".xlsm")):
+        return iter_xlsx_rows(input_file)
+    return iter_csv_rows(input_file)
+
+
+# ==================== STREAMING INGEST ====================
+def iter_city_chunks(input_file, countries, chunk_size=DEFAULT_CHUNK_SIZE, stats=None):
+    """
+    Stream (city, lat, lng, country) tuples for the given countries, in chunks.
+
+    Args:
+        input_file: worldcities .csv or .xlsx
+        countries: Country names to keep (case-insensitive)
+        chunk_size: Rows per yielded chunk
+        stats: Optional dict updated with rows_read / rows_kept / rows_invalid
+
+    Yields:
+        Lists of at most chunk_size tuples
+    """
+    wanted = {c.strip().casefold() for c in countries}
+    stats = stats if stats is not None else {}
+    stats.update(rows_read=0, rows_kept=0, rows_invalid=0)
+
+    rows = iter_source_rows(input_file)
+    header = [h.strip().lower() for h in next(rows, [])]
+    missing = [c for c in INGEST_COLUMNS if c not in header]
+    if missing:
+        raise ValueError(f"{input_file} is missing column(s): {', '.join(missing)}")
+    # Project to the four columns we need before doing anything else with a row
+    positions = [header.index(c) for c in INGEST_COLUMNS]
+    last = max(positions)
+
+    chunk = []
+    for row in rows:
+        stats["rows_read"] += 1
+        if len(row) <= last:
+            stats["rows_invalid"] += 1
+            continue
+        city, lat, lng, country = (row[i].strip() for i in positions)
+        if country.casefold() not in wanted:
+            continue
+        try:
+            # Normalise spreadsheet float noise (67.01000000000001 -> 67.01)
+            lat, lng = repr(round(float(lat), 8)), repr(round(float(lng), 8))
+        except ValueError:
+            stats["rows_invalid"] += 1
+            continue
+        if not city:
+            stats["rows_invalid"] += 1
+            continue
+        chunk.append((city, lat, lng, country))
+        stats["rows_kept"] += 1
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_filter_cities(input_file, output_file, countries=("Pakistan",), chunk_size=DEFAULT_CHUNK_SIZE,
+                         with_country=None, write_store=True):
+    """
+    Filter a world cities dataset to the given countries without loading it whole.
+
+    Rows are written to output_file as each chunk is filtered. Output uses the
+    pak_cities.csv schema (City, Latitude, Longitude), plus a Country column
+    when with_country is set (default: when more than one country is kept).
+    Duplicate city names keep their first occurrence, as before. With the
+    Country column, a name already taken by a city of another country is
+    written as "Name, Country": the city store, gazetteer and app key places
+    by name alone, so repeated names would be merged.
+
+    With write_store, the columnar binary store the app loads (see
+    city_store.py) is generated next to the CSV, and the CSV's own gazetteer
+    (see gazetteer_path_for) is rebuilt, keeping the ids it already had. A
+    SQLite location store of that CSV (see location_db.py) is rebuilt with it.
+    Only pak_cities.csv uses the app's gazetteer.csv and locations.db.
+
+    Returns:
+        Dict of counts: rows_read, rows_kept, rows_invalid, duplicates, renamed, written,
+        plus the paths of the binary store and the gazetteer (or None)
+    """
+    if with_country is None:
+        with_country = len(countries) > 1
+    stats = {}
+    seen = set()
+    names = set()
+    duplicates = renamed = written = 0
+
+    tmp_file = output_file + ".tmp"
+    with open(tmp_file, "w", newline='', encoding='utf-8') as out:
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(["City", "Latitude", "Longitude"] + (["Country"] if with_country else []))
+        for chunk in iter_city_chunks(input_file, countries, chunk_size, stats):
+            for city, lat, lng, country in chunk:
+                key = (city, country) if with_country else city
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                name = city
+                if name in names:
+                    name = f"{city}, {country}"
+                    if name in names:
+                        duplicates += 1
+                        continue
+                    renamed += 1
+                names.add(name)
+                writer.writerow([name, lat, lng] + ([country] if with_country else []))
+                written += 1
+            out.flush()
+    # Replace the old output only once the new one is complete
+    os.replace(tmp_file, output_file)
+
+    store_file = gazetteer_file = None
+    if write_store:
+        store_file = store_path_for(output_file)
+        store = CityStore.from_csv(output_file)
+        store.save(store_file, source_csv=output_file)
+        gazetteer_file = gazetteer_path_for(output_file)
+        gazetteer = build_gazetteer(store, previous=Gazetteer.load(gazetteer_file))
+        gazetteer.save(gazetteer_file)
+        db_file = location_db_path_for(output_file)
+        if os.path.exists(db_file):
+            build_location_db(gazetteer, db_file, source_fingerprint(output_file, gazetteer_file))
+
+    stats.update(duplicates=duplicates, renamed=renamed, written=written, store=store_file, gazetteer=gazetteer_file)
+    return stats
+
 
 def filter_pakistani_cities(input_file, output_file):
     """
     Filter the world cities dataset to keep only Pakistani cities.
-    
+
     Args:
-        input_file: Path to the original worldcities.csv
+        input_file: Path to the original worldcities.csv or worldcities.xlsx
         output_file: Path to save the filtered Pakistani cities
-    
+
     Returns:
         DataFrame with Pakistani cities
     """
-    # Step 1: Load the dataset
-    print("Loading world cities dataset...")
-    df = pd.read_csv(input_file)
-    
-    print(f"Total cities in dataset: {len(df)}")
-    
-    # Step 2: Filter for Pakistan only
-    # Using the 'country' column to filter
-    pakistan_df = df[df['country'] == 'Pakistan']
-    
-    print(f"Cities in Pakistan: {len(pakistan_df)}")
-    
-    # Step 3: Extract only the required columns
-    # Rename columns to match project requirements
-    cleaned_df = pakistan_df[['city', 'lat', 'lng']].copy()
-    cleaned_df.columns = ['City', 'Latitude', 'Longitude']
-    
-    # Step 4: Remove any duplicates and reset index
-    cleaned_df = cleaned_df.drop_duplicates(subset=['City']).reset_index(drop=True)
-    
-    print(f"Unique Pakistani cities after cleanup: {len(cleaned_df)}")
-    
-    # Step 5: Save to CSV
-    cleaned_df.to_csv(output_file, index=False)
+    print("Streaming world cities dataset...")
+    stats = stream_filter_cities(input_file, output_file, ("Pakistan",))
+    print(f"Total cities in dataset: {stats['rows_read']}")
+    print(f"Cities in Pakistan: {stats['rows_kept']}")
+    print(f"Unique Pakistani cities after cleanup: {stats['written']}")
     print(f"Saved filtered data to: {output_file}")
-    
-    return cleaned_df
+
+    # Only the small filtered file is loaded into a DataFrame
+    import pandas as pd
+    return pd.read_csv(output_file)
+
+
+def default_source():
+    """The worldcities file shipped with the project (.csv if present, else .xlsx)."""
+    for name in ("worldcities.csv", "worldcities.xlsx"):
+        path = os.path.join(SOURCE_DIR, name)
+        if os.path.exists(path):
+            return path
+    return os.path.join(SOURCE_DIR, "worldcities.csv")
 
 
 if __name__ == "__main__":
-    # Input and output file paths
-    input_path = "simplemaps_worldcities_basicv1.901/worldcities.csv"
-    output_path = "pak_cities.csv"
-    
-    # Run the filtering
-    pak_cities = filter_pakistani_cities(input_path, output_path)
-    
-    # Display sample of the data
-    print("\n--- Sample Pakistani Cities ---")
-    print(pak_cities.head(20))
-    
-    # Display some statistics
-    print(f"\nLatitude range: {pak_cities['Latitude'].min():.4f} to {pak_cities['Latitude'].max():.4f}")
-    print(f"Longitude range: {pak_cities['Longitude'].min():.4f} to {pak_cities['Longitude'].max():.4f}")
+    parser = argparse.ArgumentParser(description="Filter the world cities dataset by country")
+    parser.add_argument("input", nargs="?", default=None, help="worldcities .csv or .xlsx (default: the shipped dataset)")
+    parser.add_argument("-o", "--output", default="pak_cities.csv")
+    parser.add_argument("--countries", nargs="+", default=["Pakistan"], help="country names to keep")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--with-country", action="store_true", default=None, help="add a Country column")
+    args = parser.parse_args()
 
+    input_path = args.input or default_source()
+    print(f"Streaming {input_path} for: {', '.join(args.countries)}")
+    stats = stream_filter_cities(input_path, args.output, args.countries, args.chunk_size, args.with_country)
+
+    print(f"Rows read: {stats['rows_read']}")
+    print(f"Rows kept: {stats['rows_kept']} ({stats['duplicates']} duplicate names dropped, "
+          f"{stats['rows_invalid']} invalid rows skipped)")
+    if stats['renamed']:
+        print(f"{stats['renamed']} names shared across countries written as \"Name, Country\"")
+    print(f"Saved {stats['written']} cities to: {args.output}")
+    print(f"Saved columnar store to: {stats['store']}")
+    print(f"Saved gazetteer to: {stats['gazetteer']}")
+
+    # Display some statistics
+    lat_range, lon_range = [float("inf"), float("-inf")], [float("inf"), float("-inf")]
+    with open(args.output, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            lat, lon = float(row["Latitude"]), float(row["Longitude"])
+            lat_range = [min(lat_range[0], lat), max(lat_range[1], lat)]
+            lon_range = [min(lon_range[0], lon), max(lon_range[1], lon)]
+    if stats["written"]:
+        print(f"\nLatitude range: {lat_range[0]:.4f} to {lat_range[1]:.4f}")
+        print(f"Longitude range: {lon_range[0]:.4f} to {lon_range[1]:.4f}")
+    else:
+        print("No matching cities found.", file=sys.stderr)
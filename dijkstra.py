@@ -180,6 +180,77 @@ def dijkstra(adjacency_list, source, destination):
     return path, round(distances[destination], 2)
 
 
+def shortest_path_tree(adjacency_list, source):
+    """
+    Single-source Dijkstra: shortest distances from source to every city.
+    
+    Runs the same search as dijkstra() without stopping at a destination,
+    so one tree answers every query that starts from source.
+    
+    Args:
+        adjacency_list: Graph represented as adjacency list
+        source: Starting city name
+    
+    Returns:
+        tuple: (distances, previous)
+            - distances: City -> shortest distance from source (inf if unreachable)
+            - previous: City -> preceding city on its shortest path (None for source)
+    """
+    if source not in adjacency_list:
+        raise ValueError(f"Source city '{source}' not found in graph")
+    
+    distances = {city: float('inf') for city in adjacency_list}
+    distances[source] = 0
+    previous = {city: None for city in adjacency_list}
+    visited = set()
+    priority_queue = [(0, source)]
+    
+    while priority_queue:
+        current_distance, current_city = heapq.heappop(priority_queue)
+        if current_city in visited:
+            continue
+        visited.add(current_city)
+        
+        for neighbor, edge_weight in adjacency_list[current_city]:
+            if neighbor in visited:
+                continue
+            new_distance = current_distance + edge_weight
+            if new_distance < distances[neighbor]:
+                distances[neighbor] = new_distance
+                previous[neighbor] = current_city
+                heapq.heappush(priority_queue, (new_distance, neighbor))
+    
+    return distances, previous
+
+
+def path_from_tree(tree, destination):
+    """
+    Read the shortest path to destination out of a shortest_path_tree() result.
+    
+    Args:
+        tree: (distances, previous) from shortest_path_tree()
+        destination: Ending city name
+    
+    Returns:
+        tuple: (path, total_distance), same as dijkstra()
+            Returns (None, float('inf')) if no path exists
+    """
+    distances, previous = tree
+    if destination not in distances:
+        raise ValueError(f"Destination city '{destination}' not found in graph")
+    if distances[destination] == float('inf'):
+        return None, float('inf')
+    
+    path = []
+    current = destination
+    while current is not None:
+        path.append(current)
+        current = previous[current]
+    path.reverse()
+    
+    return path, round(distances[destination], 2)
+
+
 def get_all_cities(filepath):
     """
     Get list of all city names from the dataset.
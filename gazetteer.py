@@ -0,0 +1,312 @@
+"""
+Gazetteer
+One table of every routable place: the cities in pak_cities.csv and the
+areas, landmarks and facilities in locations_data.py. Each place has a
+stable integer id, its type and category, the other names it is searched by,
+the city it snaps to (and how far away that city is) and its coordinates.
+
+The table is built by `python gazetteer.py` (data_preparation.py runs the
+same step) and saved as gazetteer.csv. Ids survive rebuilds: a place keeps
+the id it had in the previous table and new places are numbered after the
+highest id in use, so an id stored anywhere keeps meaning the same place.
+
+Name collisions are resolved here, once and explicitly. A city keeps its
+name over any area of the same name; between the module dicts the last
+category wins, the order get_all_locations() merges them in. The categories
+that lost are kept in the also_in column and listed by the build. Places that
+leave the sources stay in the file as "retired" rows, so their ids are never
+handed to anything else (and come back if the place does).
+
+Usage:
+    python gazetteer.py [--cities pak_cities.csv] [-o gazetteer.csv]
+"""
+
+import os
+import csv
+import array
+import argparse
+from types import MappingProxyType
+
+from city_store import load_city_store
+from locations_data import get_all_locations, get_location_categories, LOCATION_ALIASES
+
+
+FIELDS = ("id", "name", "type", "category", "also_in", "aliases", "parent_id", "parent_km", "lat", "lon")
+
+# Category of every row that comes from the city dataset
+CITY_CATEGORY = "🌆 Cities"
+
+# Separator between the categories in the also_in column (and the names in aliases)
+ALSO_IN_SEPARATOR = "|"
+
+# Type of the rows that only reserve the id of a place no longer in the sources
+RETIRED = "retired"
+
+GAZETTEER_FILE = "gazetteer.csv"
+
+# The app's city CSV; its gazetteer (and location store) keep their plain names
+APP_CITIES_FILE = "pak_cities.csv"
+
+
+def gazetteer_path_for(cities_file):
+    """
+    Gazetteer that belongs to a city CSV, in the same directory.
+
+    The app's pak_cities.csv has gazetteer.csv; any other CSV gets its own
+    (cities.csv -> cities.gazetteer.csv), so filtering to another file never
+    touches the app's table.
+    """
+    return companion_path_for(cities_file, GAZETTEER_FILE)
+
+
+def companion_path_for(cities_file, file_name):
+    """`file_name` next to the app's cities CSV, else prefixed with the CSV's stem."""
+    folder, base = os.path.split(os.path.abspath(cities_file))
+    if base != APP_CITIES_FILE:
+        file_name = f"{os.path.splitext(base)[0]}.{file_name}"
+    return os.path.join(folder, file_name)
+
+
+class Gazetteer:
+    """
+    Read-only gazetteer with columns indexed by id.
+
+    Ids of places that have left the sources are never reused; their slots
+    stay empty (name None) and `retired` remembers them.
+
+    Attributes:
+        order: Live ids in table order (cities in dataset order, then areas by category)
+        names, types, categories, parent_ids, parent_km: Tuples indexed by id
+        also_in: Tuple of the other categories each place was listed under
+        aliases: Tuple of the other names each place is searched by
+        lat, lon: float64 arrays indexed by id
+        id_of: Read-only name -> id
+        retired: Read-only name -> id of places no longer in the sources
+    """
+
+    def __init__(self, rows, retired=None):
+        retired = dict(retired or {})
+        size = max([row["id"] for row in rows] + list(retired.values()), default=-1) + 1
+        columns = {field: [None] * size for field in ("name", "type", "category", "also_in", "aliases", "parent_id", "parent_km")}
+        lat, lon = array.array("d", bytes(8 * size)), array.array("d", bytes(8 * size))
+        for row in rows:
+            i = row["id"]
+            for field, column in columns.items():
+                column[i] = row[field]
+            lat[i], lon[i] = row["lat"], row["lon"]
+        self.order = tuple(row["id"] for row in rows)
+        self.names = tuple(columns["name"])
+        self.types = tuple(columns["type"])
+        self.categories = tuple(columns["category"])
+        self.also_in = tuple(columns["also_in"])
+        self.aliases = tuple(columns["aliases"])
+        self.parent_ids = tuple(columns["parent_id"])
+        self.parent_km = tuple(columns["parent_km"])
+        self.lat, self.lon = lat, lon
+        self.id_of = MappingProxyType({row["name"]: row["id"] for row in rows})
+        self.retired = MappingProxyType(retired)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def __contains__(self, name):
+        return name in self.id_of
+
+    @property
+    def next_id(self):
+        """First id that has never been handed out."""
+        return len(self.names)
+
+    def row(self, place_id):
+        return {
+            "id": place_id, "name": self.names[place_id], "type": self.types[place_id],
+            "category": self.categories[place_id], "also_in": self.also_in[place_id], "aliases": self.aliases[place_id],
+            "parent_id": self.parent_ids[place_id], "parent_km": self.parent_km[place_id],
+            "lat": self.lat[place_id], "lon": self.lon[place_id],
+        }
+
+    def city_ids(self):
+        """Ids of the cities, in dataset order."""
+        return tuple(i for i in self.order if self.types[i] == "city")
+
+    def category_ids(self):
+        """
+        Category label -> ids of the places listed under it, in table order.
+
+        A place appears under its own category and every category in its
+        also_in, so nothing listed in the sources goes missing from a browser.
+        """
+        members = {}
+        for i in self.order:
+            members.setdefault(self.categories[i], [])
+        for i in self.order:
+            members[self.categories[i]].append(i)
+            for label in self.also_in[i]:
+                members.setdefault(label, []).append(i)
+        return {label: tuple(ids) for label, ids in members.items()}
+
+    def collisions(self):
+        """(name, kept category, other categories) for every name listed more than once."""
+        return [(self.names[i], self.categories[i], self.also_in[i]) for i in self.order if self.also_in[i]]
+
+    # ---------- persistence ----------
+    def save(self, path):
+        """Write the table as CSV, replacing `path` only once the new file is complete."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(FIELDS)
+            for i in self.order:
+                row = self.row(i)
+                row["also_in"] = ALSO_IN_SEPARATOR.join(row["also_in"])
+                row["aliases"] = ALSO_IN_SEPARATOR.join(row["aliases"])
+                for field in ("parent_km", "lat", "lon"):
+                    row[field] = repr(row[field])
+                writer.writerow([row[field] for field in FIELDS])
+            for name, i in sorted(self.retired.items(), key=lambda item: item[1]):
+                writer.writerow([i, name, RETIRED] + [""] * (len(FIELDS) - 3))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by save(); None if it is missing or malformed."""
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                rows, retired = [], {}
+                for record in csv.DictReader(f):
+                    if record["type"] == RETIRED:
+                        retired[record["name"]] = int(record["id"])
+                        continue
+                    rows.append({
+                        "id": int(record["id"]), "name": record["name"], "type": record["type"],
+                        "category": record["category"],
+                        "also_in": tuple(record["also_in"].split(ALSO_IN_SEPARATOR)) if record["also_in"] else (),
+                        "aliases": tuple(record["aliases"].split(ALSO_IN_SEPARATOR)) if record.get("aliases") else (),
+                        "parent_id": int(record["parent_id"]), "parent_km": float(record["parent_km"]),
+                        "lat": float(record["lat"]), "lon": float(record["lon"]),
+                    })
+        except (OSError, KeyError, TypeError, ValueError):
+            return None
+        return cls(rows, retired)
+
+
+def _places(city_store, categories, coordinates):
+    """
+    Every place once, in table order, as name -> [type, category, also_in, lat, lon].
+
+    Cities come first in dataset order; an area keeps the position of the
+    category that wins its name, so each category's places stay together.
+    """
+    places = {}
+    for i, name in enumerate(city_store.names):
+        places[name] = ["city", CITY_CATEGORY, [], city_store.lat[i], city_store.lon[i]]
+    for label, names in categories.items():
+        for name in names:
+            place = places.get(name)
+            if place is not None and place[0] == "city":
+                place[2].append(label)
+                continue
+            lat, lon = coordinates[name]
+            if place is not None:
+                # A later category takes the name over; move it to that category's block
+                del places[name]
+                also_in = place[2] + [place[1]]
+            else:
+                also_in = []
+            places[name] = ["area", label, also_in, lat, lon]
+    return places
+
+
+def build_gazetteer(city_store, categories=None, coordinates=None, previous=None, aliases=None):
+    """
+    Build the gazetteer from the city dataset and the module location dicts.
+
+    Args:
+        city_store: CityStore of the city dataset
+        categories: Category label -> area names (default: get_location_categories())
+        coordinates: Area name -> (lat, lon) (default: get_all_locations())
+        previous: Earlier Gazetteer; its ids are kept, and its nearest-city
+            snaps are reused for places that have not moved when the cities
+            are unchanged
+        aliases: Place name -> other names it is searched by (default: LOCATION_ALIASES)
+
+    Returns:
+        Gazetteer
+    """
+    categories = get_location_categories() if categories is None else categories
+    coordinates = get_all_locations() if coordinates is None else coordinates
+    aliases = LOCATION_ALIASES if aliases is None else aliases
+    places = _places(city_store, categories, coordinates)
+
+    # Ids: kept from the previous table (retired places get theirs back);
+    # new cities (by name) and then new areas are numbered after the highest
+    ids, retired, next_id = {}, {}, 0
+    if previous is not None:
+        known = dict(previous.retired, **previous.id_of)
+        ids = {name: known[name] for name in places if name in known}
+        retired = {name: i for name, i in known.items() if name not in places}
+        next_id = previous.next_id
+    new_cities = sorted(name for name, place in places.items() if place[0] == "city" and name not in ids)
+    new_areas = [name for name, place in places.items() if place[0] != "city" and name not in ids]
+    for name in new_cities + new_areas:
+        ids[name] = next_id
+        next_id += 1
+
+    # Snaps depend only on the cities, so a previous table built from the same ones still holds
+    reuse = previous is not None and [
+        (previous.names[i], previous.lat[i], previous.lon[i]) for i in previous.city_ids()
+    ] == list(zip(city_store.names, city_store.lat, city_store.lon))
+
+    rows = []
+    for name, (kind, category, also_in, lat, lon) in places.items():
+        old = previous.id_of.get(name) if reuse else None
+        if old is not None and (previous.lat[old], previous.lon[old]) == (lat, lon):
+            parent, parent_km = previous.names[previous.parent_ids[old]], previous.parent_km[old]
+        else:
+            parent, parent_km = city_store.nearest(lat, lon)
+        rows.append({
+            "id": ids[name], "name": name, "type": kind, "category": category, "also_in": tuple(also_in),
+            "aliases": tuple(aliases.get(name, ())),
+            "parent_id": ids[parent], "parent_km": parent_km, "lat": lat, "lon": lon,
+        })
+    return Gazetteer(rows, retired)
+
+
+def load_gazetteer(city_store, path):
+    """
+    Gazetteer for the current sources, numbered like the table saved at `path`.
+
+    Builds in memory; when the saved table is current this only re-reads it
+    and checks the sources, without any nearest-city search.
+    """
+    return build_gazetteer(city_store, previous=Gazetteer.load(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the gazetteer table with stable ids")
+    parser.add_argument("--cities", default="pak_cities.csv", help="city CSV (default pak_cities.csv)")
+    parser.add_argument("-o", "--output", default=None, help="output CSV (default: the gazetteer next to the cities, see gazetteer_path_for)")
+    args = parser.parse_args()
+
+    output = args.output or gazetteer_path_for(args.cities)
+    previous = Gazetteer.load(output)
+    gazetteer = build_gazetteer(load_city_store(args.cities), previous=previous)
+    gazetteer.save(output)
+
+    cities = len(gazetteer.city_ids())
+    print(f"Saved {len(gazetteer)} places ({cities} cities, {len(gazetteer) - cities} areas) to: {output}")
+    if previous is not None:
+        added = [n for n in gazetteer.id_of if n not in previous.id_of]
+        retired = [n for n in previous.id_of if n not in gazetteer.id_of]
+        print(f"{len(added)} new, {len(retired)} retired; ids of existing places unchanged")
+        for name in retired:
+            print(f"  retired id {gazetteer.retired[name]}: {name}")
+    for name, kept, others in gazetteer.collisions():
+        print(f"Collision: '{name}' kept as {kept}, also listed under {', '.join(others)}")
+
+
+if __name__ == "__main__":
+    main()
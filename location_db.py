@@ -0,0 +1,488 @@
+"""
+SQLite Location Store
+Optional on-disk backend for the place table: every city and known area in
+one SQLite file (stdlib sqlite3), with an R*Tree index for bounding-box and
+nearest queries, an FTS5 index for name search and the trigram postings of
+SearchIndex for its typo-tolerant fallback. Lookups read single rows
+on demand, so the engine does not hold every place, snap and search term in
+memory; only the sorted name list the pickers need is loaded.
+
+The file is built from the gazetteer (pak_cities.csv + locations_data.py,
+ids from gazetteer.csv) and records the size and modification time of those
+sources; RouteEngine uses locations.db next to the cities file when it is
+present and current, and the in-memory stores otherwise.
+
+Usage:
+    python location_db.py [--cities pak_cities.csv] [-o locations.db]
+"""
+
+import os
+import json
+import math
+import sqlite3
+import argparse
+import threading
+import functools
+from urllib.parse import quote
+from collections.abc import Mapping
+from types import MappingProxyType
+
+import locations_data
+from dijkstra import calculate_distance_km
+from city_store import load_city_store
+from gazetteer import ALSO_IN_SEPARATOR, load_gazetteer, gazetteer_path_for, companion_path_for
+from search_index import normalize, trigrams, FUZZY_MIN_QUERY, FUZZY_MIN_SIMILARITY, FUZZY_POSTING_BUDGET, FUZZY_CANDIDATES
+
+
+SCHEMA_VERSION = 2
+
+# Same file name RouteEngine looks for
+LOCATION_DB_FILE = "locations.db"
+
+# Rows (by id and by name) kept in memory per store
+ROW_CACHE_SIZE = 4096
+
+# Kilometres per degree of latitude (Earth radius 6371 km)
+KM_PER_DEGREE = 6371 * math.pi / 180
+
+# Nearest queries search this radius first and widen it 4x until enough places are found
+NEAREST_START_KM = 5
+HALF_EARTH_KM = 20038
+
+# Boxes holding more than this many points per requested neighbour are narrowed before reading them
+CROWDED_BOX = 64
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE places (
+    id INTEGER PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    name TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    category TEXT NOT NULL,
+    also_in TEXT NOT NULL,
+    aliases TEXT NOT NULL,
+    parent_id INTEGER NOT NULL,
+    parent_km REAL NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL
+);
+CREATE INDEX places_seq ON places (seq);
+CREATE INDEX places_type ON places (type, name);
+CREATE VIRTUAL TABLE places_rtree USING rtree (id, min_lat, max_lat, min_lon, max_lon);
+CREATE VIRTUAL TABLE places_fts USING fts5 (name, aliases, tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3');
+CREATE TABLE search_keys (id INTEGER PRIMARY KEY, place_id INTEGER NOT NULL, alias TEXT, key TEXT NOT NULL);
+CREATE TABLE search_trigrams (gram TEXT NOT NULL, key_id INTEGER NOT NULL);
+CREATE TABLE search_gram_counts (gram TEXT PRIMARY KEY, count INTEGER NOT NULL) WITHOUT ROWID;
+"""
+
+# Built after the trigram rows are in, so SQLite sorts them once
+SEARCH_INDEXES = """
+CREATE INDEX search_trigrams_gram ON search_trigrams (gram, key_id);
+INSERT INTO search_gram_counts SELECT gram, COUNT(*) FROM search_trigrams GROUP BY gram;
+"""
+
+# Between the normalised aliases in the FTS table; FTS ignores it, the ranking uses it for whole-alias matches
+ALIAS_KEY_SEPARATOR = " | "
+
+ROW_COLUMNS = "id, name, type, category, also_in, aliases, parent_id, parent_km, lat, lon"
+
+
+def location_db_path_for(cities_file):
+    """SQLite store that belongs to a city CSV (pak_cities.csv -> locations.db, cities.csv -> cities.locations.db)."""
+    return companion_path_for(cities_file, LOCATION_DB_FILE)
+
+
+def source_fingerprint(cities_file, gazetteer_file):
+    """Sizes and modification times of everything the store is built from."""
+    parts = []
+    for path in (cities_file, gazetteer_file, locations_data.__file__):
+        try:
+            stat = os.stat(path)
+            parts.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            parts.append([os.path.basename(path), None, None])
+    return json.dumps(parts)
+
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, min_lon, max_lat, max_lon) of a box holding every point within radius_km of (lat, lon)."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = min(180.0, radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def within_radius(in_box, lat, lon, radius_km):
+    """
+    (distance_km, name) of the points within radius_km of (lat, lon), nearest first.
+
+    `in_box(min_lat, min_lon, max_lat, max_lon)` returns the candidate
+    (name, lat, lon) rows of a bounding box, e.g. from an R*Tree.
+    """
+    hits = []
+    for name, p_lat, p_lon in in_box(*bounding_box(lat, lon, radius_km)):
+        dist = calculate_distance_km(lat, lon, p_lat, p_lon)
+        if dist <= radius_km:
+            hits.append((dist, name))
+    hits.sort()
+    return hits
+
+
+def nearest_in_boxes(in_box, lat, lon, k=1, max_km=None, count_in_box=None):
+    """
+    The k points closest to (lat, lon), optionally no further than max_km.
+
+    Searches a small box first and widens it until k points lie within its
+    radius, so only points near the query are read. Once a box holds k
+    points, the k-th closest of them bounds the answer, so the next box is
+    the last one. With `count_in_box` (same arguments, returns a count),
+    boxes are sized by counting alone and a crowded one is narrowed before
+    any of its rows are read.
+
+    Returns:
+        List of (distance_km, name), nearest first, like GridIndex.nearest()
+    """
+    radius, floor, exact = NEAREST_START_KM, 0.0, False
+    while True:
+        if max_km is not None:
+            radius = min(radius, max_km)
+        last = radius >= HALF_EARTH_KM or (max_km is not None and radius >= max_km)
+        if count_in_box is not None and not exact:
+            count = count_in_box(*bounding_box(lat, lon, radius))
+            if count < k and not last:
+                floor, radius = radius, radius * 4
+                continue
+            while count > CROWDED_BOX * k and radius - floor > 0.001:
+                middle = (floor + radius) / 2
+                middle_count = count_in_box(*bounding_box(lat, lon, middle))
+                if middle_count >= k:
+                    radius, count = middle, middle_count
+                else:
+                    floor = middle
+            last = radius >= HALF_EARTH_KM or (max_km is not None and radius >= max_km)
+        candidates = sorted((calculate_distance_km(lat, lon, p_lat, p_lon), name)
+                            for name, p_lat, p_lon in in_box(*bounding_box(lat, lon, radius)))
+        hits = [hit for hit in candidates if hit[0] <= radius]
+        if len(hits) >= k or last:
+            return hits[:k]
+        if len(candidates) >= k:
+            radius, exact = candidates[k - 1][0], True
+        else:
+            radius *= 4
+
+
+def build_location_db(gazetteer, path, fingerprint=""):
+    """
+    Write every place of a gazetteer to a SQLite store at `path`.
+
+    The file is written next to its destination and renamed into place, so
+    a reader never opens a half-built store.
+    """
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    con = sqlite3.connect(tmp_path)
+    try:
+        con.executescript(SCHEMA)
+        rows = [gazetteer.row(i) for i in gazetteer]
+        con.executemany(
+            "INSERT INTO places VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((r["id"], seq, r["name"], r["type"], r["category"], ALSO_IN_SEPARATOR.join(r["also_in"]),
+              ALSO_IN_SEPARATOR.join(r["aliases"]), r["parent_id"], r["parent_km"], r["lat"], r["lon"])
+             for seq, r in enumerate(rows)))
+        con.executemany("INSERT INTO places_rtree VALUES (?, ?, ?, ?, ?)",
+                        ((r["id"], r["lat"], r["lat"], r["lon"], r["lon"]) for r in rows))
+        con.executemany("INSERT INTO places_fts (rowid, name, aliases) VALUES (?, ?, ?)",
+                        ((r["id"], normalize(r["name"]), ALIAS_KEY_SEPARATOR.join(normalize(a) for a in r["aliases"]))
+                         for r in rows))
+        # One search key per name and alias, as SearchIndex keys them
+        keys = ((r["id"], alias, normalize(alias if alias is not None else r["name"]))
+                for r in rows for alias in (None,) + tuple(r["aliases"]))
+        for key_id, (place_id, alias, key) in enumerate(k for k in keys if k[2]):
+            con.execute("INSERT INTO search_keys VALUES (?, ?, ?, ?)", (key_id, place_id, alias, key))
+            con.executemany("INSERT INTO search_trigrams VALUES (?, ?)", ((gram, key_id) for gram in trigrams(key)))
+        con.executescript(SEARCH_INDEXES)
+        con.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("schema_version", str(SCHEMA_VERSION)),
+            ("fingerprint", fingerprint),
+            ("places", str(len(rows))),
+        ])
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp_path, path)
+
+
+class _Column:
+    """Read-only id -> value view of one column (None for unknown ids), like a Gazetteer tuple."""
+
+    def __init__(self, fetch, position):
+        self.fetch = fetch
+        self.position = position
+
+    def __getitem__(self, place_id):
+        row = self.fetch(place_id)
+        return None if row is None else row[self.position]
+
+
+class _Mapping(Mapping):
+    """Read-only name -> value view over the store, iterating names in table order."""
+
+    def __init__(self, db, value):
+        self.db = db
+        self.value = value
+
+    def __getitem__(self, name):
+        row = self.db._row_by_name(name)
+        if row is None:
+            raise KeyError(name)
+        return self.value(row)
+
+    def __contains__(self, name):
+        return isinstance(name, str) and self.db._row_by_name(name) is not None
+
+    def __iter__(self):
+        for (name,) in self.db._query("SELECT name FROM places ORDER BY seq"):
+            yield name
+
+    def __len__(self):
+        return len(self.db)
+
+
+class LocationDB:
+    """
+    SQLite-backed place table.
+
+    Offers the same read API as gazetteer.Gazetteer (names, id_of, types,
+    categories, ... indexed by id), plus read-only `locations` and
+    `snap_table` mappings and spatial and name queries. Each thread gets its
+    own read-only connection; rows are cached per store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._fetch = functools.lru_cache(maxsize=ROW_CACHE_SIZE)(self._fetch_row)
+        self._row_by_name = functools.lru_cache(maxsize=ROW_CACHE_SIZE)(self._fetch_row_by_name)
+        self.names = _Column(self._fetch, 1)
+        self.types = _Column(self._fetch, 2)
+        self.categories = _Column(self._fetch, 3)
+        self.also_in = _Column(self._fetch, 4)
+        self.aliases = _Column(self._fetch, 5)
+        self.parent_ids = _Column(self._fetch, 6)
+        self.parent_km = _Column(self._fetch, 7)
+        self.lat = _Column(self._fetch, 8)
+        self.lon = _Column(self._fetch, 9)
+        self.id_of = _Mapping(self, lambda row: row[0])
+        self.locations = _Mapping(self, lambda row: MappingProxyType({"id": row[0], "lat": row[8], "lon": row[9], "type": row[2]}))
+        self.snap_table = _Mapping(self, lambda row: (self.names[row[6]], row[7]))
+        self._len = None
+
+    @classmethod
+    def open(cls, path, fingerprint=None):
+        """
+        Open a store written by build_location_db().
+
+        Returns:
+            LocationDB, or None if the file is missing, from another schema
+            version, or built from different sources than `fingerprint`
+        """
+        if not os.path.exists(path):
+            return None
+        db = cls(path)
+        try:
+            meta = dict(db._query("SELECT key, value FROM meta"))
+        except sqlite3.Error:
+            return None
+        if meta.get("schema_version") != str(SCHEMA_VERSION):
+            return None
+        if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+            return None
+        return db
+
+    def _connection(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(f"file:{quote(os.path.abspath(self.path))}?mode=ro", uri=True)
+        return con
+
+    def _query(self, sql, params=()):
+        return self._connection().execute(sql, params)
+
+    def _decode(self, row):
+        if row is None:
+            return None
+        row = list(row)
+        for i in (4, 5):
+            row[i] = tuple(row[i].split(ALSO_IN_SEPARATOR)) if row[i] else ()
+        return tuple(row)
+
+    def _fetch_row(self, place_id):
+        return self._decode(self._query(f"SELECT {ROW_COLUMNS} FROM places WHERE id = ?", (place_id,)).fetchone())
+
+    def _fetch_row_by_name(self, name):
+        return self._decode(self._query(f"SELECT {ROW_COLUMNS} FROM places WHERE name = ?", (name,)).fetchone())
+
+    # ---------- Gazetteer API ----------
+    def __len__(self):
+        if self._len is None:
+            self._len = self._query("SELECT COUNT(*) FROM places").fetchone()[0]
+        return self._len
+
+    def __iter__(self):
+        for (place_id,) in self._query("SELECT id FROM places ORDER BY seq"):
+            yield place_id
+
+    def __contains__(self, name):
+        return name in self.id_of
+
+    def row(self, place_id):
+        row = self._fetch(place_id)
+        if row is None:
+            raise KeyError(place_id)
+        return dict(zip(("id", "name", "type", "category", "also_in", "aliases", "parent_id", "parent_km", "lat", "lon"), row))
+
+    def city_ids(self):
+        """Ids of the cities, in dataset order."""
+        return tuple(i for (i,) in self._query("SELECT id FROM places WHERE type = 'city' ORDER BY seq"))
+
+    def category_ids(self):
+        """Category label -> ids of the places listed under it, as Gazetteer.category_ids()."""
+        members = {}
+        rows = self._query("SELECT id, category, also_in FROM places ORDER BY seq").fetchall()
+        for _, category, _ in rows:
+            members.setdefault(category, [])
+        for place_id, category, also_in in rows:
+            members[category].append(place_id)
+            for label in also_in.split(ALSO_IN_SEPARATOR) if also_in else ():
+                members.setdefault(label, []).append(place_id)
+        return {label: tuple(ids) for label, ids in members.items()}
+
+    def collisions(self):
+        rows = self._query("SELECT name, category, also_in FROM places WHERE also_in != '' ORDER BY seq")
+        return [(name, category, tuple(also_in.split(ALSO_IN_SEPARATOR))) for name, category, also_in in rows]
+
+    # ---------- ordered lists ----------
+    def sorted_names_and_ids(self):
+        """(names, ids) of every place, sorted by name."""
+        rows = self._query("SELECT name, id FROM places ORDER BY name").fetchall()
+        return tuple(name for name, _ in rows), tuple(place_id for _, place_id in rows)
+
+    def city_ids_by_name(self):
+        """Ids of the cities, sorted by name."""
+        return tuple(i for (i,) in self._query("SELECT id FROM places WHERE type = 'city' ORDER BY name"))
+
+    # ---------- spatial queries ----------
+    def in_box(self, min_lat, min_lon, max_lat, max_lon):
+        """(name, lat, lon) of the places inside a bounding box, from the R*Tree."""
+        return self._query(
+            "SELECT p.name, p.lat, p.lon FROM places_rtree r JOIN places p ON p.id = r.id "
+            "WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?",
+            (max_lat, min_lat, max_lon, min_lon)).fetchall()
+
+    def count_in_box(self, min_lat, min_lon, max_lat, max_lon):
+        """Number of places inside a bounding box, counted on the R*Tree alone."""
+        return self._query(
+            "SELECT COUNT(*) FROM places_rtree WHERE min_lat <= ? AND max_lat >= ? AND min_lon <= ? AND max_lon >= ?",
+            (max_lat, min_lat, max_lon, min_lon)).fetchone()[0]
+
+    def within(self, lat, lon, radius_km):
+        """(distance_km, name) of the places within radius_km of (lat, lon), nearest first."""
+        return within_radius(self.in_box, lat, lon, radius_km)
+
+    def nearest(self, lat, lon, k=1, max_km=None):
+        """The k places closest to (lat, lon) as (distance_km, name), reading only nearby rows."""
+        return nearest_in_boxes(self.in_box, lat, lon, k, max_km, self.count_in_box)
+
+    # ---------- name search ----------
+    def search(self, query, k=10):
+        """
+        Places matching every word of `query` as a word prefix, from FTS5.
+
+        Ranked like SearchIndex.search(): whole-name, then whole-alias
+        matches, then names and aliases starting with the query, then other
+        word matches; cities first and shorter names first within each. When
+        that leaves room, names sharing enough trigrams with the query follow,
+        as in SearchIndex.search().
+
+        Returns:
+            List of up to k (id, alias) pairs; alias is the alias that matched, or None
+        """
+        q = normalize(query)
+        if not q or k <= 0:
+            return []
+        match = " ".join(f'"{token}"*' for token in q.split())
+        rows = self._query(
+            "SELECT p.id, f.name, f.aliases, p.aliases FROM places_fts f JOIN places p ON p.id = f.rowid "
+            "WHERE places_fts MATCH :match "
+            "ORDER BY CASE WHEN f.name = :q THEN 0 "
+            "WHEN instr('| ' || f.aliases || ' |', '| ' || :q || ' |') THEN 1 "
+            "WHEN substr(f.name, 1, length(:q)) = :q THEN 2 "
+            "WHEN instr('| ' || f.aliases, '| ' || :q) THEN 3 ELSE 4 END, "
+            "p.type != 'city', length(p.name), p.name LIMIT :k",
+            {"match": match, "q": q, "k": k}).fetchall()
+        hits = []
+        for place_id, name_key, alias_keys, aliases in rows:
+            alias = None
+            if not all(any(word.startswith(token) for word in name_key.split()) for token in q.split()):
+                # Matched through an alias: report the first one that covers the query
+                for original in aliases.split(ALSO_IN_SEPARATOR) if aliases else ():
+                    words = normalize(original).split()
+                    if all(any(word.startswith(token) for word in words) for token in q.split()):
+                        alias = original
+                        break
+            hits.append((place_id, alias))
+        if len(hits) < k and len(q) >= FUZZY_MIN_QUERY:
+            seen = {place_id for place_id, _ in hits}
+            for place_id, alias in self._fuzzy(q):
+                if place_id not in seen:
+                    seen.add(place_id)
+                    hits.append((place_id, alias))
+                    if len(hits) >= k:
+                        break
+        return hits
+
+    def _fuzzy(self, q):
+        """(id, alias) of places with a name or alias sharing enough trigrams with q, most similar first."""
+        grams = trigrams(q)
+        marks = ", ".join("?" * len(grams))
+        counts = dict(self._query(f"SELECT gram, count FROM search_gram_counts WHERE gram IN ({marks})", tuple(grams)))
+        # Rarest trigrams first, within the same posting budget as SearchIndex
+        used, budget = [], FUZZY_POSTING_BUDGET
+        for gram in sorted(counts, key=counts.get):
+            if counts[gram] > budget:
+                break
+            budget -= counts[gram]
+            used.append(gram)
+        if not used:
+            return []
+        marks = ", ".join("?" * len(used))
+        rows = self._query(
+            "SELECT k.place_id, k.alias, k.key, p.type, p.name FROM search_keys k JOIN places p ON p.id = k.place_id "
+            f"WHERE k.id IN (SELECT key_id FROM search_trigrams WHERE gram IN ({marks}) "
+            "GROUP BY key_id ORDER BY COUNT(*) DESC LIMIT ?)", (*used, FUZZY_CANDIDATES)).fetchall()
+        scored = []
+        for place_id, alias, key, place_type, name in rows:
+            key_grams = trigrams(key)
+            similarity = 2 * len(grams & key_grams) / (len(grams) + len(key_grams))
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((-similarity, place_type != "city", len(name), name, place_id, alias))
+        scored.sort()
+        return [(place_id, alias) for *_, place_id, alias in scored]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the SQLite location store (R*Tree + FTS5)")
+    parser.add_argument("--cities", default="pak_cities.csv", help="city CSV (default pak_cities.csv)")
+    parser.add_argument("-o", "--output", default=None, help="output file (default: the store next to the cities, see location_db_path_for)")
+    args = parser.parse_args()
+
+    output = args.output or location_db_path_for(args.cities)
+    gazetteer_file = gazetteer_path_for(args.cities)
+    gazetteer = load_gazetteer(load_city_store(args.cities), gazetteer_file)
+    build_location_db(gazetteer, output, source_fingerprint(args.cities, gazetteer_file))
+    print(f"Saved {len(gazetteer)} places to: {output} ({os.path.getsize(output) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
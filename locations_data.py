@@ -219,6 +219,27 @@ HOSPITALS = {
     "Lady Reading Hospital Peshawar": (34.0167, 71.5667),
 }
 
+# Other names people search by: short forms, former names and airport codes
+LOCATION_ALIASES = {
+    "Rawalpindi": ("Pindi",),
+    "Faisalabad": ("Lyallpur",),
+    "Nawabshah": ("Shaheed Benazirabad",),
+    "Dera Ghazi Khan": ("DG Khan",),
+    "Dera Ismail Khan": ("DI Khan",),
+    "Rahimyar Khan": ("Rahim Yar Khan", "RY Khan"),
+    "Jinnah International Airport Karachi": ("KHI",),
+    "Allama Iqbal Airport Lahore": ("LHE",),
+    "Islamabad International Airport": ("ISB",),
+    "Bacha Khan Airport Peshawar": ("PEW",),
+    "Quetta International Airport": ("UET",),
+    "Multan International Airport": ("MUX",),
+    "Faisalabad Airport": ("LYP",),
+    "Sialkot Airport": ("SKT",),
+    "Skardu Airport": ("KDU",),
+    "Gilgit Airport": ("GIL",),
+}
+
+
 def get_all_locations():
     """Combine all locations into a single dictionary."""
     all_locations = {}
@@ -0,0 +1,110 @@
+"""
+Nearby Places Database
+Restaurants, hotels, cafés and parks with coordinates, used by the
+FOOD / STAY / CAFÉS / PARKS tabs to show the closest places to a stop.
+"""
+
+# Places grouped by city, then by category
+KARACHI_PLACES = {
+    "restaurants": [
+        {"name": "Kolachi", "type": "Seafood", "rating": 4.6, "price": "$$$", "lat": 24.7844, "lon": 67.0647},
+        {"name": "BBQ Tonight", "type": "Pakistani BBQ", "rating": 4.5, "price": "$$", "lat": 24.8195, "lon": 67.0330},
+        {"name": "Café Zouk", "type": "Continental", "rating": 4.4, "price": "$$", "lat": 24.8160, "lon": 67.0400},
+        {"name": "Burns Road Food Street", "type": "Street Food", "rating": 4.7, "price": "$", "lat": 24.8555, "lon": 67.0160},
+        {"name": "Okra", "type": "Fine Dining", "rating": 4.8, "price": "$$$", "lat": 24.8110, "lon": 67.0420},
+    ],
+    "hotels": [
+        {"name": "Pearl Continental", "type": "5-Star", "rating": 4.8, "price": "$$$", "lat": 24.8480, "lon": 67.0297},
+        {"name": "Marriott Hotel", "type": "5-Star", "rating": 4.7, "price": "$$$", "lat": 24.8450, "lon": 67.0270},
+        {"name": "Ramada Hotel", "type": "4-Star", "rating": 4.4, "price": "$$", "lat": 24.8990, "lon": 67.1590},
+        {"name": "Avari Towers", "type": "5-Star", "rating": 4.6, "price": "$$$", "lat": 24.8500, "lon": 67.0290},
+    ],
+    "cafes": [
+        {"name": "Gloria Jean's", "type": "Coffee Shop", "rating": 4.4, "price": "$$", "lat": 24.8150, "lon": 67.0290},
+        {"name": "Espresso", "type": "Café", "rating": 4.3, "price": "$$", "lat": 24.8050, "lon": 67.0500},
+        {"name": "The Second Cup", "type": "Coffee Shop", "rating": 4.2, "price": "$$", "lat": 24.8200, "lon": 67.0300},
+        {"name": "Butlers Chocolate Café", "type": "Café", "rating": 4.5, "price": "$$", "lat": 24.8120, "lon": 67.0480},
+    ],
+    "parks": [
+        {"name": "Beach Park", "type": "Recreation", "rating": 4.5, "price": "Free", "lat": 24.7940, "lon": 67.0350},
+        {"name": "Safari Park", "type": "Zoo & Park", "rating": 4.3, "price": "Rs.50", "lat": 24.9240, "lon": 67.1010},
+        {"name": "Hill Park", "type": "Public Park", "rating": 4.4, "price": "Free", "lat": 24.8700, "lon": 67.0700},
+    ],
+}
+
+ISLAMABAD_PLACES = {
+    "restaurants": [
+        {"name": "Monal Restaurant", "type": "Pakistani", "rating": 4.7, "price": "$$$", "lat": 33.7596, "lon": 73.0780},
+        {"name": "Savour Foods", "type": "Pakistani", "rating": 4.6, "price": "$$", "lat": 33.7130, "lon": 73.0590},
+        {"name": "Kabul Restaurant", "type": "Afghani", "rating": 4.5, "price": "$$", "lat": 33.7210, "lon": 73.0560},
+        {"name": "Chaaye Khana", "type": "Café Restaurant", "rating": 4.4, "price": "$$", "lat": 33.7290, "lon": 73.0760},
+        {"name": "Des Pardes", "type": "Pakistani", "rating": 4.3, "price": "$$", "lat": 33.7420, "lon": 73.0670},
+    ],
+    "hotels": [
+        {"name": "Serena Hotel", "type": "5-Star", "rating": 4.9, "price": "$$$", "lat": 33.7160, "lon": 73.1010},
+        {"name": "Islamabad Hotel", "type": "4-Star", "rating": 4.5, "price": "$$", "lat": 33.7070, "lon": 73.0850},
+        {"name": "Ramada Hotel", "type": "4-Star", "rating": 4.4, "price": "$$", "lat": 33.6970, "lon": 73.1000},
+        {"name": "Hotel One", "type": "Business", "rating": 4.2, "price": "$$", "lat": 33.7220, "lon": 73.0600},
+    ],
+    "cafes": [
+        {"name": "Gloria Jean's", "type": "Coffee Shop", "rating": 4.4, "price": "$$", "lat": 33.7200, "lon": 73.0570},
+        {"name": "Coffee Bean & Tea Leaf", "type": "Coffee Shop", "rating": 4.3, "price": "$$", "lat": 33.7330, "lon": 73.0790},
+        {"name": "The Second Cup", "type": "Coffee Shop", "rating": 4.2, "price": "$$", "lat": 33.7180, "lon": 73.0550},
+    ],
+    "parks": [
+        {"name": "Fatima Jinnah Park", "type": "National Park", "rating": 4.6, "price": "Free", "lat": 33.7000, "lon": 73.0250},
+        {"name": "Lake View Park", "type": "Recreation", "rating": 4.4, "price": "$", "lat": 33.7150, "lon": 73.1300},
+        {"name": "Daman-e-Koh", "type": "Viewpoint", "rating": 4.8, "price": "Free", "lat": 33.7390, "lon": 73.0600},
+        {"name": "Shakarparian Park", "type": "Public Park", "rating": 4.5, "price": "Free", "lat": 33.6900, "lon": 73.0700},
+    ],
+}
+
+LAHORE_PLACES = {
+    "restaurants": [
+        {"name": "Cuckoo's Den", "type": "Pakistani", "rating": 4.8, "price": "$$$", "lat": 31.5870, "lon": 74.3100},
+        {"name": "Butt Karahi", "type": "Pakistani BBQ", "rating": 4.7, "price": "$$", "lat": 31.5660, "lon": 74.3250},
+        {"name": "Food Street", "type": "Street Food", "rating": 4.6, "price": "$", "lat": 31.5860, "lon": 74.3110},
+        {"name": "Salt'n Pepper", "type": "Pakistani", "rating": 4.5, "price": "$$", "lat": 31.5150, "lon": 74.3450},
+        {"name": "Haveli Restaurant", "type": "Pakistani", "rating": 4.4, "price": "$$", "lat": 31.5880, "lon": 74.3100},
+    ],
+    "hotels": [
+        {"name": "Pearl Continental", "type": "5-Star", "rating": 4.8, "price": "$$$", "lat": 31.5540, "lon": 74.3380},
+        {"name": "Nishat Hotel", "type": "5-Star", "rating": 4.7, "price": "$$$", "lat": 31.5180, "lon": 74.3500},
+        {"name": "Avari Hotel", "type": "5-Star", "rating": 4.6, "price": "$$$", "lat": 31.5550, "lon": 74.3300},
+    ],
+    "cafes": [
+        {"name": "Gloria Jean's", "type": "Coffee Shop", "rating": 4.4, "price": "$$", "lat": 31.5130, "lon": 74.3500},
+        {"name": "Espresso", "type": "Café", "rating": 4.3, "price": "$$", "lat": 31.5160, "lon": 74.3480},
+    ],
+    "parks": [
+        {"name": "Jinnah Park", "type": "Public Park", "rating": 4.5, "price": "Free", "lat": 31.5540, "lon": 74.3300},
+        {"name": "Race Course Park", "type": "Recreation", "rating": 4.6, "price": "Rs.20", "lat": 31.5410, "lon": 74.3410},
+    ],
+}
+
+# Shown when no listed place is close to the selected stop
+DEFAULT_PLACES = {
+    "restaurants": [
+        {"name": "Local Restaurant", "type": "Pakistani", "rating": 4.0, "distance": "0.5 km", "price": "$$"},
+        {"name": "Food Point", "type": "Fast Food", "rating": 3.8, "distance": "1.0 km", "price": "$"},
+    ],
+    "hotels": [
+        {"name": "Local Hotel", "type": "3-Star", "rating": 3.5, "distance": "1.0 km", "price": "$$"},
+    ],
+    "cafes": [
+        {"name": "Local Café", "type": "Coffee Shop", "rating": 3.8, "distance": "0.5 km", "price": "$$"},
+    ],
+    "parks": [
+        {"name": "Local Park", "type": "Public Park", "rating": 4.0, "distance": "1.0 km", "price": "Free"},
+    ],
+}
+
+
+def get_all_places():
+    """Flatten all places into one list, tagging each with its city and category."""
+    all_places = []
+    for city, places in (("Karachi", KARACHI_PLACES), ("Islamabad", ISLAMABAD_PLACES), ("Lahore", LAHORE_PLACES)):
+        for category, entries in places.items():
+            for place in entries:
+                all_places.append({**place, "city": city, "category": category})
+    return all_places
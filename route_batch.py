@@ -0,0 +1,217 @@
+"""
+Batch Routing
+Routes origin-destination pairs from a CSV or JSONL file with the same logic
+as the app and writes one result per input line as it goes, so input of any
+length is processed in constant memory.
+
+Input (one pair per line):
+    CSV    header with `from,to` (names or "lat,lon"), or
+           `from_lat,from_lon,to_lat,to_lon`; an optional `id` column is copied
+    JSONL  {"from": ..., "to": ...} where each end is a name, "lat,lon" or
+           [lat, lon]; or from_lat/from_lon/to_lat/to_lon keys; optional "id"
+
+Output columns: line, id, from, to, route_mode, stops, path,
+straight_distance_km, road_distance_km, time_min, est_time, fuel_liters,
+fuel_cost, error
+
+Usage:
+    python route_batch.py pairs.csv -o routes.jsonl
+    cat pairs.jsonl | python route_batch.py - --format csv > routes.csv
+"""
+
+import sys
+import csv
+import json
+import time
+import argparse
+from collections import ChainMap
+
+from route_engine import RouteEngine, get_road_distance, est_time, fuel_liters, fuel_cost
+
+
+OUTPUT_FIELDS = [
+    "line", "id", "from", "to", "route_mode", "stops", "path",
+    "straight_distance_km", "road_distance_km", "time_min", "est_time",
+    "fuel_liters", "fuel_cost", "error",
+]
+
+# Seconds between progress lines on stderr (output is flushed at the same time)
+PROGRESS_INTERVAL = 1.0
+
+# Separator between stops in the CSV `path` column
+CSV_PATH_SEPARATOR = " > "
+
+
+def positive_float(text):
+    """argparse type for speeds and fuel figures, which must be above zero."""
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number: {text!r}")
+    if not value > 0 or value == float("inf"):
+        raise argparse.ArgumentTypeError(f"must be a positive number: {text!r}")
+    return value
+
+
+def detect_format(path, explicit=None):
+    if explicit:
+        return explicit
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_pairs(stream, input_format):
+    """Yield (line_number, id, from_ref, to_ref, error) for each input line."""
+    if input_format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield (reader.line_num,) + pair_from_record(record)
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, None, None, None, "invalid JSON"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, None, None, "expected a JSON object"
+                continue
+            yield (line_number,) + pair_from_record(record)
+
+
+def pair_from_record(record):
+    """(id, from_ref, to_ref, error) from a parsed CSV row or JSON object."""
+    pair_id = record.get("id")
+    if record.get("from") not in (None, "") and record.get("to") not in (None, ""):
+        return pair_id, record["from"], record["to"], None
+    try:
+        return (pair_id,
+                (float(record["from_lat"]), float(record["from_lon"])),
+                (float(record["to_lat"]), float(record["to_lon"])),
+                None)
+    except (KeyError, TypeError, ValueError):
+        return pair_id, None, None, "need from/to or from_lat/from_lon/to_lat/to_lon"
+
+
+class ResultWriter:
+    """Writes result rows as CSV or JSONL."""
+
+    def __init__(self, stream, output_format):
+        self.stream = stream
+        self.output_format = output_format
+        if output_format == "csv":
+            self.writer = csv.DictWriter(stream, fieldnames=OUTPUT_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.output_format == "csv":
+            row = dict(row, path=CSV_PATH_SEPARATOR.join(row["path"]) if row["path"] else "")
+            self.writer.writerow(row)
+        else:
+            self.stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self.stream.flush()
+
+
+def route_pair(engine, threshold, speed, mode, fuel_avg, fuel_price, line_number, pair_id, from_ref, to_ref, error):
+    """Route one pair and return its output row; failures are reported in `error`."""
+    row = dict.fromkeys(OUTPUT_FIELDS)
+    row.update({"line": line_number, "id": pair_id, "path": None})
+    if error:
+        row["error"] = error
+        return row
+
+    # Fresh overlays per pair keep coordinate inputs from accumulating
+    overlay = {}
+    try:
+        source = engine.resolve(from_ref, overlay)
+        dest = engine.resolve(to_ref, overlay)
+    except KeyError as e:
+        row["error"] = f"unknown location {e}"
+        return row
+    except (TypeError, ValueError) as e:
+        row["error"] = str(e) or "invalid location"
+        return row
+
+    all_locations = engine.location_view(overlay) if overlay else engine.locations
+    path, straight, route_mode = engine.cached_route(source, dest, threshold, all_locations, ChainMap({}, engine.snap_table))
+    road = get_road_distance(straight)
+    row.update({
+        "from": source,
+        "to": dest,
+        "route_mode": route_mode,
+        "stops": len(path),
+        "path": path,
+        "straight_distance_km": straight,
+        "road_distance_km": road,
+        "time_min": round(road / speed * 60, 1),
+        "est_time": est_time(road, speed),
+        "fuel_liters": round(fuel_liters(road, mode, fuel_avg), 2),
+        "fuel_cost": fuel_cost(road, mode, fuel_avg, fuel_price),
+    })
+    return row
+
+
+def report(count, errors, start, final=False):
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0.0
+    end = "\n" if final else "\r"
+    sys.stderr.write(f"{count:,} pairs routed, {errors:,} errors, {elapsed:.1f}s, {rate:,.0f} pairs/s{end}")
+    sys.stderr.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route origin-destination pairs from a CSV or JSONL stream")
+    parser.add_argument("input", help="input file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, or - for stdout (default)")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"], help="default: from the input file extension")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="output format (default: from -o, else jsonl)")
+    parser.add_argument("--threshold", type=int, default=300, help="range in km between connected cities (default 300)")
+    parser.add_argument("--speed", type=positive_float, default=60, help="average speed in km/h (default 60)")
+    parser.add_argument("--mode", choices=["car", "bike", "cycle", "walk"], default="car")
+    parser.add_argument("--fuel-avg", type=positive_float, default=12.0, help="km per litre (default 12)")
+    parser.add_argument("--fuel-price", type=positive_float, default=260, help="Rs per litre (default 260)")
+    parser.add_argument("--quiet", action="store_true", help="no progress on stderr")
+    args = parser.parse_args()
+
+    input_format = detect_format(args.input, args.input_format) if args.input != "-" else (args.input_format or "csv")
+    output_format = args.format or (detect_format(args.output) if args.output != "-" else "jsonl")
+
+    engine = RouteEngine()
+    engine.graph(args.threshold)
+
+    source = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    writer = ResultWriter(sink, output_format)
+
+    count = errors = 0
+    start = last_report = time.perf_counter()
+    try:
+        for pair in read_pairs(source, input_format):
+            row = route_pair(engine, args.threshold, args.speed, args.mode, args.fuel_avg, args.fuel_price, *pair)
+            writer.write(row)
+            count += 1
+            errors += row["error"] is not None
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                writer.flush()
+                if not args.quiet:
+                    report(count, errors, start)
+                last_report = now
+    except BrokenPipeError:
+        # Downstream consumer (e.g. head) closed early
+        sys.stderr.write("\n")
+    finally:
+        writer.flush()
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    if not args.quiet:
+        report(count, errors, start, final=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,627 @@
+"""
+Route Engine
+Headless routing core shared by the app, batch jobs and services: the city
+and location stores, range graphs, nearest-city snapping, route search and
+the road distance, travel time and fuel estimates.
+
+Only the standard library and the project's own data modules are imported,
+so loading this module costs a few milliseconds; all data is built lazily
+on first use.
+"""
+
+import os
+import re
+import math
+import heapq
+import bisect
+import threading
+import functools
+from collections import ChainMap
+from collections.abc import MutableMapping
+from types import MappingProxyType
+
+from dijkstra import dijkstra, shortest_path_tree, path_from_tree, calculate_distance_km
+from city_store import CityStore, load_city_store
+from gazetteer import load_gazetteer, gazetteer_path_for, companion_path_for
+from search_index import SearchIndex, normalize
+from spatial_index import GridIndex
+
+
+# City dataset shipped next to this module
+DEFAULT_CITIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pak_cities.csv")
+
+# Average road winding factor: roads are typically 1.3-1.5x the straight line
+ROAD_FACTOR = 1.4
+
+# Routes shorter than this (km) skip the city graph and go point to point
+LOCAL_ROUTE_KM = 50
+
+# Travel modes that burn fuel, and how much further a bike goes per litre
+FUEL_MODES = ("car", "bike")
+BIKE_FUEL_FACTOR = 1.5
+
+# Shortest-path trees kept per engine, keyed by (threshold, source city)
+TREE_CACHE_SIZE = 512
+
+# SQLite location store used when present next to the cities (see location_db.py)
+LOCATION_DB_FILE = "locations.db"
+
+# Custom pins saved next to the cities and shared by every session (see custom_locations.py)
+CUSTOM_LOCATIONS_FILE = "custom_locations.db"
+
+# "lat,lon" accepted wherever a location name is
+POINT_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+# ==================== ESTIMATES ====================
+def get_road_distance(straight_dist):
+    """Convert straight-line distance to approximate road distance."""
+    return round(straight_dist * ROAD_FACTOR, 1)
+
+
+def est_time(dist, speed):
+    """Estimate travel time based on distance and speed."""
+    hrs = dist / speed if speed > 0 else 0
+    if hrs < 1:
+        return f"{int(hrs * 60)} min"
+    else:
+        h = int(hrs)
+        m = int((hrs - h) * 60)
+        return f"{h}h {m}m"
+
+
+def fuel_liters(distance, mode_key, fuel_avg):
+    """Litres of fuel needed for a road distance; 0 for modes that use none."""
+    if mode_key not in FUEL_MODES:
+        return 0
+    return distance / (fuel_avg * (BIKE_FUEL_FACTOR if mode_key == "bike" else 1))
+
+
+def fuel_cost(distance, mode_key, fuel_avg, fuel_price):
+    """Fuel cost in rupees for a road distance, truncated to a whole amount."""
+    return int(fuel_liters(distance, mode_key, fuel_avg) * fuel_price)
+
+
+# ==================== SNAPPING & SEARCH ====================
+def find_nearest_city(loc_coords, cities):
+    if isinstance(cities, CityStore):
+        return cities.nearest(loc_coords["lat"], loc_coords["lon"])
+    min_dist, nearest = float('inf'), None
+    for city in cities:
+        dist = calculate_distance_km(loc_coords["lat"], loc_coords["lon"], city["lat"], city["lon"])
+        if dist < min_dist:
+            min_dist, nearest = dist, city["name"]
+    return nearest, min_dist
+
+
+def snap_location(name, all_locations, cities, snap_table):
+    """Look up the nearest city for a location, adding it to the table on a miss."""
+    snap = snap_table.get(name)
+    if snap is None:
+        snap = find_nearest_city(all_locations[name], cities)
+        snap_table[name] = snap
+    return snap
+
+
+def find_route(source, dest, all_locations, cities, graph, snap_table=None, trees=None, gazetteer=None):
+    """
+    Route between two named locations over a city graph.
+
+    The graph's nodes are city names, or gazetteer ids when `gazetteer` is
+    given; either way the returned path is a list of names. `trees` maps a
+    source city name to a shortest-path tree over the same graph.
+    """
+    src_coords, dst_coords = all_locations[source], all_locations[dest]
+    direct = calculate_distance_km(src_coords["lat"], src_coords["lon"], dst_coords["lat"], dst_coords["lon"])
+
+    if direct < LOCAL_ROUTE_KM:
+        return [source, dest], round(direct, 2), "local"
+
+    if snap_table is None:
+        snap_table = {}
+    src_city, src_dist = snap_location(source, all_locations, cities, snap_table)
+    dst_city, dst_dist = snap_location(dest, all_locations, cities, snap_table)
+
+    if src_city == dst_city:
+        return [source, dest], round(direct, 2), "local"
+
+    try:
+        # A precomputed shortest-path tree from the source city answers without searching
+        tree = trees.get(src_city) if trees else None
+        src_node, dst_node = (gazetteer.id_of[src_city], gazetteer.id_of[dst_city]) if gazetteer else (src_city, dst_city)
+        city_path, city_dist = path_from_tree(tree, dst_node) if tree else dijkstra(graph, src_node, dst_node)
+        if city_path and gazetteer:
+            city_path = [gazetteer.names[node] for node in city_path]
+        if city_path:
+            path = [source] + ([src_city] if source != src_city else [])
+            path += city_path[1:-1]
+            path += ([dst_city] if dest != dst_city else []) + [dest]
+            seen, unique = set(), []
+            for p in path:
+                if p not in seen:
+                    seen.add(p)
+                    unique.append(p)
+            return unique, round(src_dist + city_dist + dst_dist, 2), "intercity"
+    except:
+        pass
+    return [source, dest], round(direct, 2), "direct"
+
+
+# ==================== ROUTE GEOMETRY ====================
+def calculate_bearing(lat1, lon1, lat2, lon2):
+    """Initial compass bearing (degrees clockwise from north) from point 1 to point 2."""
+    lat1_rad, lat2_rad = math.radians(lat1), math.radians(lat2)
+    dlon = math.radians(lon2 - lon1)
+    x = math.sin(dlon) * math.cos(lat2_rad)
+    y = math.cos(lat1_rad) * math.sin(lat2_rad) - math.sin(lat1_rad) * math.cos(lat2_rad) * math.cos(dlon)
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+
+def get_direction_icon(from_loc, to_loc, all_locations):
+    """Get appropriate direction icon based on bearing."""
+    from_coords = all_locations[from_loc]
+    to_coords = all_locations[to_loc]
+
+    lat_diff = to_coords["lat"] - from_coords["lat"]
+    lon_diff = to_coords["lon"] - from_coords["lon"]
+
+    if abs(lat_diff) > abs(lon_diff):
+        return "⬆️" if lat_diff > 0 else "⬇️"
+    else:
+        return "➡️" if lon_diff > 0 else "⬅️"
+
+
+def build_route_segments(path, all_locations):
+    """Precompute the geometry of a route once so every consumer can reuse it.
+
+    Returns a dict of per-segment arrays (straight and road distances, bearings,
+    direction icons) plus prefix sums, so remaining distance from any step is a
+    single subtraction instead of a loop over the rest of the route.
+    """
+    segments = {
+        "straight": [],
+        "road": [],
+        "bearings": [],
+        "icons": [],
+        "cum_straight": [0.0],
+        "cum_road": [0.0],
+    }
+    for frm, to in zip(path, path[1:]):
+        a, b = all_locations[frm], all_locations[to]
+        seg_straight = calculate_distance_km(a["lat"], a["lon"], b["lat"], b["lon"])
+        seg_road = get_road_distance(seg_straight)
+        segments["straight"].append(seg_straight)
+        segments["road"].append(seg_road)
+        segments["bearings"].append(calculate_bearing(a["lat"], a["lon"], b["lat"], b["lon"]))
+        segments["icons"].append(get_direction_icon(frm, to, all_locations))
+        segments["cum_straight"].append(segments["cum_straight"][-1] + seg_straight)
+        segments["cum_road"].append(segments["cum_road"][-1] + seg_road)
+    return segments
+
+
+def remaining_road_distance(segments, step):
+    """Road distance left from stop `step` to the end of the route."""
+    return get_road_distance(segments["cum_straight"][-1] - segments["cum_straight"][step])
+
+
+# ==================== LOCATION STORE ====================
+class LocationView(MutableMapping):
+    """Per-caller view of the shared location store with custom pins on top.
+
+    Lookups check the small overlay first and fall back to the shared base;
+    writes always land in the overlay. The base and its presorted name list
+    are never copied, so building a view costs O(overlay).
+
+    Base locations are identified by their gazetteer id; custom pins get
+    negative ids (-1, -2, ...) in the order they were added, so widgets can
+    key off integers for every option.
+
+    `nearest_base(lat, lon, k, max_km)` answers nearest-place queries over
+    the base (see RouteEngine.nearest_locations()); an overlay with its own
+    nearest() (see custom_locations.py) answers them for the pins. Whatever
+    has neither is scanned.
+    """
+
+    def __init__(self, base, base_names, base_index, overlay, base_ids=None, gazetteer=None, search_index=None,
+                 nearest_base=None):
+        self.base = base
+        self.base_names = base_names
+        self.base_index = base_index
+        self.overlay = overlay
+        self.base_ids = base_ids
+        self.gazetteer = gazetteer
+        self.search_index = search_index
+        self.nearest_base = nearest_base
+
+    def __getitem__(self, name):
+        if name in self.overlay:
+            return self.overlay[name]
+        return self.base[name]
+
+    def __setitem__(self, name, value):
+        self.overlay[name] = value
+
+    def __delitem__(self, name):
+        del self.overlay[name]
+
+    def __contains__(self, name):
+        return name in self.overlay or name in self.base
+
+    def __iter__(self):
+        yield from self.base
+        for name in self.overlay:
+            if name not in self.base:
+                yield name
+
+    def __len__(self):
+        return len(self.base) + len(self._extra_names())
+
+    def _extra_names(self):
+        return sorted(name for name in self.overlay if name not in self.base)
+
+    def _custom_names(self):
+        """Custom pin names in the order they were added (position k has id -(k + 1))."""
+        return [name for name in self.overlay if name not in self.base]
+
+    def names(self):
+        """All location names in sorted order, merging the presorted base with the overlay."""
+        extra = self._extra_names()
+        if not extra:
+            return self.base_names
+        return list(heapq.merge(self.base_names, extra))
+
+    def ids(self):
+        """Ids of all locations, in the same order as names()."""
+        custom = self._custom_names()
+        if not custom:
+            return self.base_ids
+        custom_ids = {name: -(k + 1) for k, name in enumerate(custom)}
+        return [self.gazetteer.id_of[name] if name in self.base else custom_ids[name] for name in self.names()]
+
+    def id_of(self, name):
+        """Id of a location name (raises KeyError for unknown names)."""
+        if name in self.base:
+            return self.gazetteer.id_of[name]
+        custom = self._custom_names()
+        if name in self.overlay:
+            return -(custom.index(name) + 1)
+        raise KeyError(name)
+
+    def name_of(self, location_id):
+        """Name of a location id, the inverse of id_of()."""
+        if location_id >= 0:
+            return self.gazetteer.names[location_id]
+        return self._custom_names()[-location_id - 1]
+
+    def search(self, query, k=10):
+        """
+        Top-k (id, alias) matches for a search query, best first.
+
+        Custom pins whose name contains the query come first; the rest come
+        from the shared search index (alias is the alias that matched, or None).
+        """
+        q = normalize(query)
+        hits = [(self.id_of(name), None) for name in self._custom_names() if q and q in normalize(name)][:k]
+        if self.search_index is not None and len(hits) < k:
+            hits += self.search_index.search(query, k - len(hits))
+        return hits
+
+    def nearest(self, lat, lon, max_km=None):
+        """
+        (distance_km, name) of the location closest to (lat, lon), or None
+        if there is none within max_km.
+
+        Known places come from nearest_base and pins from the overlay's own
+        index when it has one; whatever has no index is scanned.
+        """
+        best = None
+        overlay_nearest = getattr(self.overlay, "nearest", None)
+        for source in (self.nearest_base, overlay_nearest):
+            if source is not None:
+                hits = source(lat, lon, 1, max_km)
+                if hits and (best is None or hits[0][0] < best[0]):
+                    best = hits[0]
+        scan = list(self.base) if self.nearest_base is None else []
+        if overlay_nearest is None:
+            scan += self._custom_names()
+        for name in scan:
+            coords = self[name]
+            dist = calculate_distance_km(lat, lon, coords["lat"], coords["lon"])
+            if (max_km is None or dist <= max_km) and (best is None or dist < best[0]):
+                best = (dist, name)
+        return best
+
+    def index(self, name):
+        """Position of `name` in names(), without scanning the list.
+
+        Base names use the precomputed index shifted by the custom names that
+        sort before them; custom names are placed by bisecting the base list.
+        Raises ValueError for unknown names, like list.index.
+        """
+        extra = self._extra_names()
+        if name in self.base_index:
+            return self.base_index[name] + bisect.bisect_left(extra, name)
+        pos = bisect.bisect_left(extra, name)
+        if pos < len(extra) and extra[pos] == name:
+            return bisect.bisect_left(self.base_names, name) + pos
+        raise ValueError(f"'{name}' is not a known location")
+
+
+# ==================== ENGINE ====================
+class RouteEngine:
+    """
+    Process-wide routing data with lazily built, read-only stores.
+
+    The city list, gazetteer, location store, name index, snapping table and
+    range graphs are each built once on first use and wrapped in read-only
+    views, so one engine can be shared by every session or request thread.
+    Places are keyed by their gazetteer id internally (graph nodes and
+    shortest-path trees are ids); the methods take and return names.
+    Per-caller custom locations live in overlays (see location_view() and
+    snap_view()) and never touch the shared copies.
+
+    When a current SQLite location store is available (see location_db.py),
+    places, snaps and name search are read from it on demand instead of
+    being held in memory; only the sorted name list is loaded.
+
+    Args:
+        cities_file: Path to the city CSV (default: pak_cities.csv next to this module)
+        tree_cache_size: Shortest-path trees kept for cached_route()
+        gazetteer_file: Gazetteer whose ids are used (default: the cities' own, see gazetteer_path_for)
+        location_db: Path of the SQLite location store, True for the cities'
+            own (locations.db next to pak_cities.csv), or False to keep everything in memory; a
+            store that is missing or out of date is ignored
+        custom_locations: Path of the saved custom pins, True for
+            custom_locations.db next to the cities, or False to keep them
+            in memory for this process only
+    """
+
+    def __init__(self, cities_file=DEFAULT_CITIES_FILE, tree_cache_size=TREE_CACHE_SIZE, gazetteer_file=None,
+                 location_db=True, custom_locations=True):
+        self.cities_file = cities_file
+        self.gazetteer_file = gazetteer_file or gazetteer_path_for(cities_file)
+        if location_db is True:
+            location_db = companion_path_for(cities_file, LOCATION_DB_FILE)
+        self.location_db_file = location_db or None
+        if custom_locations is True:
+            custom_locations = os.path.join(os.path.dirname(os.path.abspath(cities_file)), CUSTOM_LOCATIONS_FILE)
+        self.custom_locations_file = custom_locations or ":memory:"
+        self._lock = threading.RLock()
+        self._stores = {}
+        self._graphs = {}
+        # Bounded, thread-safe memo of shortest_path_tree()
+        self.tree = functools.lru_cache(maxsize=tree_cache_size)(self.shortest_path_tree)
+
+    def _store(self, name, build):
+        store = self._stores.get(name)
+        if store is None:
+            with self._lock:
+                store = self._stores.get(name)
+                if store is None:
+                    store = self._stores[name] = build()
+        return store
+
+    @property
+    def city_store(self):
+        """Columnar city table, mapped from the binary store next to the CSV when current."""
+        return self._store("city_store", lambda: load_city_store(self.cities_file))
+
+    @property
+    def cities(self):
+        """Tuple of read-only city records (name, lat, lon), for list-of-dicts callers."""
+        return self.city_store.records()
+
+    @property
+    def location_db(self):
+        """The SQLite location store in use, or None when places are kept in memory."""
+        def build():
+            if self.location_db_file is None or not os.path.exists(self.location_db_file):
+                return False
+            # sqlite3 is only imported when there is a store to open
+            from location_db import LocationDB, source_fingerprint
+            db = LocationDB.open(self.location_db_file, source_fingerprint(self.cities_file, self.gazetteer_file))
+            return db if db is not None else False
+        return self._store("location_db", build) or None
+
+    @property
+    def gazetteer(self):
+        """Every city and known area with its stable id, category and nearest city."""
+        db = self.location_db
+        if db is not None:
+            return db
+        return self._store("gazetteer", lambda: load_gazetteer(self.city_store, self.gazetteer_file))
+
+    @property
+    def locations(self):
+        """Read-only name -> {id, lat, lon, type} for every city and known area."""
+        db = self.location_db
+        if db is not None:
+            return db.locations
+
+        def build():
+            gaz = self.gazetteer
+            return MappingProxyType({
+                gaz.names[i]: MappingProxyType({"id": i, "lat": gaz.lat[i], "lon": gaz.lon[i], "type": gaz.types[i]})
+                for i in gaz
+            })
+        return self._store("locations", build)
+
+    @property
+    def custom_locations(self):
+        """Saved custom pins shared by every caller, with their snaps (usable as a location_view() overlay)."""
+        def build():
+            from custom_locations import CustomLocationStore
+            return CustomLocationStore(self.custom_locations_file, snap=self.city_store.nearest)
+        return self._store("custom_locations", build)
+
+    def _sorted_places(self):
+        """(names, ids) of every place, sorted by name."""
+        def build():
+            db = self.location_db
+            if db is not None:
+                return db.sorted_names_and_ids()
+            names = tuple(sorted(self.locations))
+            return names, tuple(self.gazetteer.id_of[name] for name in names)
+        return self._store("sorted_places", build)
+
+    @property
+    def location_names(self):
+        """Sorted names of the location store."""
+        return self._sorted_places()[0]
+
+    @property
+    def location_ids(self):
+        """Gazetteer ids in the order of location_names."""
+        return self._sorted_places()[1]
+
+    @property
+    def city_ids(self):
+        """Gazetteer ids of the cities, in name order."""
+        def build():
+            db = self.location_db
+            if db is not None:
+                return db.city_ids_by_name()
+            return tuple(i for i in self.location_ids if self.gazetteer.types[i] == "city")
+        return self._store("city_ids", build)
+
+    @property
+    def search_index(self):
+        """Prefix and fuzzy search over every place name and alias (cities rank first); FTS5 with a location store."""
+        db = self.location_db
+        if db is not None:
+            return db
+
+        def build():
+            gaz = self.gazetteer
+            return SearchIndex((i, gaz.names[i], gaz.aliases[i], 0 if gaz.types[i] == "city" else 1) for i in gaz)
+        return self._store("search_index", build)
+
+    @property
+    def location_categories(self):
+        """Category label -> gazetteer ids of the places listed under it."""
+        return self._store("location_categories", lambda: MappingProxyType(self.gazetteer.category_ids()))
+
+    @property
+    def location_index(self):
+        """Map each location name to its position in location_names."""
+        return self._store("location_index", lambda: MappingProxyType({name: i for i, name in enumerate(self.location_names)}))
+
+    @property
+    def snap_table(self):
+        """Nearest city (and distance to it) for every known location, from the gazetteer."""
+        db = self.location_db
+        if db is not None:
+            return db.snap_table
+
+        def build():
+            gaz = self.gazetteer
+            return MappingProxyType({gaz.names[i]: (gaz.names[gaz.parent_ids[i]], gaz.parent_km[i]) for i in gaz})
+        return self._store("snap_table", build)
+
+    def has_graph(self, threshold):
+        """Whether the graph for `threshold` is already built (graph() would return at once)."""
+        return threshold in self._graphs
+
+    def graph(self, threshold):
+        """Read-only graph linking cities (by gazetteer id) at most `threshold` km apart."""
+        graph = self._graphs.get(threshold)
+        if graph is None:
+            with self._lock:
+                graph = self._graphs.get(threshold)
+                if graph is None:
+                    store = self.city_store
+                    ids = self.gazetteer.id_of
+                    built = store.build_graph(threshold, keys=tuple(ids[name] for name in store.names))
+                    graph = self._graphs[threshold] = MappingProxyType({city: tuple(neighbors) for city, neighbors in built.items()})
+        return graph
+
+    def location_view(self, overlay):
+        """Location store with the caller's custom locations layered on top."""
+        return LocationView(self.locations, self.location_names, self.location_index, overlay,
+                            self.location_ids, self.gazetteer, self.search_index, self.nearest_locations)
+
+    def snap_view(self, overlay):
+        """Snapping table with the caller's custom snaps layered on top."""
+        return ChainMap(overlay, self.snap_table)
+
+    def resolve(self, value, overlay):
+        """
+        Turn a location reference into a location name.
+
+        Accepts a known location name, a "lat,lon" string or a (lat, lon)
+        pair. Points are added to `overlay` under a "lat,lon" name so they
+        can be routed through a location_view(overlay).
+
+        Raises:
+            KeyError: for names that are neither known nor coordinates
+            ValueError: for coordinates outside the valid range
+        """
+        if isinstance(value, str):
+            if value in self.locations:
+                return value
+            match = POINT_RE.match(value)
+            if not match:
+                raise KeyError(value)
+            lat, lon = float(match.group(1)), float(match.group(2))
+        else:
+            lat, lon = (float(v) for v in value)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f"coordinates out of range: {lat}, {lon}")
+        name = f"{lat:.5f},{lon:.5f}"
+        overlay[name] = {"lat": lat, "lon": lon, "type": "point"}
+        return name
+
+    def nearest_locations(self, lat, lon, k=1, max_km=None):
+        """
+        The k known places closest to (lat, lon), optionally no further than max_km.
+
+        Returns:
+            List of (distance_km, name), nearest first
+        """
+        db = self.location_db
+        if db is not None:
+            return db.nearest(lat, lon, k, max_km)
+
+        def build():
+            index = GridIndex()
+            for name, coords in self.locations.items():
+                index.insert(coords["lat"], coords["lon"], name)
+            return index
+        return self._store("location_grid", build).nearest(lat, lon, k=k, max_km=max_km)
+
+    def nearest_city(self, coords):
+        """(city name, distance km) of the city closest to a {lat, lon} mapping."""
+        return find_nearest_city(coords, self.city_store)
+
+    def snap(self, name, all_locations=None, snap_table=None):
+        """Nearest city for a named location, caching misses in snap_table."""
+        return snap_location(name, all_locations if all_locations is not None else self.locations,
+                             self.city_store, snap_table if snap_table is not None else ChainMap({}, self.snap_table))
+
+    def shortest_path_tree(self, threshold, src_city):
+        """Single-source shortest-path tree (over gazetteer ids) from a city on the given range graph."""
+        return shortest_path_tree(self.graph(threshold), self.gazetteer.id_of[src_city])
+
+    def route(self, source, dest, threshold=300, all_locations=None, snap_table=None, trees=None):
+        """
+        Find a route between two locations.
+
+        Returns:
+            tuple: (path, straight_distance_km, route_mode) where route_mode is
+            "local", "intercity" or "direct"
+        """
+        if all_locations is None:
+            all_locations = self.locations
+        if snap_table is None:
+            snap_table = ChainMap({}, self.snap_table)
+        return find_route(source, dest, all_locations, self.city_store, self.graph(threshold), snap_table, trees,
+                          self.gazetteer)
+
+    def cached_route(self, source, dest, threshold=300, all_locations=None, snap_table=None):
+        """Same as route(), answered from a cached shortest-path tree of the source city."""
+        if all_locations is None:
+            all_locations = self.locations
+        if snap_table is None:
+            snap_table = ChainMap({}, self.snap_table)
+        src_city, _ = self.snap(source, all_locations, snap_table)
+        return self.route(source, dest, threshold, all_locations, snap_table, {src_city: self.tree(threshold, src_city)})
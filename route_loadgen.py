@@ -0,0 +1,126 @@
+"""
+Load Generator for the Routing Service
+Opens a number of keep-alive connections to route_server.py and fires /route
+(or /nearest) queries over fixed, seeded random location pairs, then reports
+throughput and latency percentiles.
+
+Usage:
+    python route_server.py &
+    python route_loadgen.py [--connections 32] [--duration 10] [--endpoint route] [--output results.json]
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from urllib.parse import urlencode
+
+from route_engine import RouteEngine
+
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def build_targets(endpoint, count, seed, threshold):
+    """Request paths for `count` seeded random queries."""
+    rng = random.Random(seed)
+    engine = RouteEngine()
+    names = engine.location_names
+    targets = []
+    for _ in range(count):
+        if endpoint == "route":
+            src, dst = rng.sample(names, 2)
+            query = {"from": src, "to": dst, "threshold": threshold}
+        else:
+            query = {"lat": round(rng.uniform(24.0, 36.0), 4), "lon": round(rng.uniform(61.0, 75.0), 4), "k": 5}
+        targets.append(f"/{endpoint}?{urlencode(query)}")
+    return targets
+
+
+async def worker(host, port, targets, offset, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = offset
+    try:
+        while time.perf_counter() < deadline:
+            target = targets[i % len(targets)]
+            i += 1
+            start = time.perf_counter()
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                if key.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if not status_line.startswith(b"HTTP/1.1 200"):
+                errors.append(status_line.decode("latin-1").strip())
+    finally:
+        writer.close()
+
+
+async def run(host, port, connections, duration, targets):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        worker(host, port, targets, i * len(targets) // connections, deadline, latencies, errors)
+        for i in range(connections)
+    ))
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the routing service and report latency percentiles")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--endpoint", choices=["route", "nearest"], default="route")
+    parser.add_argument("--connections", type=int, default=32, help="concurrent keep-alive connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--queries", type=int, default=2000, help="distinct queries to cycle through")
+    parser.add_argument("--threshold", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    targets = build_targets(args.endpoint, args.queries, args.seed, args.threshold)
+    latencies, errors, elapsed = asyncio.run(run(args.host, args.port, args.connections, args.duration, targets))
+    latencies.sort()
+
+    results = {
+        "endpoint": args.endpoint,
+        "connections": args.connections,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "latency_ms": {f"p{p:g}": round(percentile(latencies, p) * 1000, 3) for p in PERCENTILES},
+    }
+    results["latency_ms"]["max"] = round(latencies[-1] * 1000, 3) if latencies else None
+
+    print(f"{results['requests']} requests in {results['duration_s']}s over {args.connections} connections "
+          f"-> {results['requests_per_s']} req/s, {results['errors']} errors")
+    print("latency (ms): " + "  ".join(f"{k}={v}" for k, v in results["latency_ms"].items()))
+    if errors:
+        print(f"first error: {errors[0]}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
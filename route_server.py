@@ -0,0 +1,333 @@
+"""
+Routing Service
+Small HTTP/JSON server over RouteEngine, built on asyncio streams from the
+standard library. The engine (cities, locations, graphs, snapping table) is
+loaded once at startup and shared by every connection; connections are
+kept alive so clients can pipeline many queries over one socket.
+
+Endpoints:
+    GET  /route?from=A&to=B[&threshold=300&speed=60&mode=car&fuel_avg=12&fuel_price=260]
+    GET  /nearest?lat=..&lon=..[&k=5]
+    GET  /search?q=lah[&k=10]
+    POST /matrix   {"sources": [...], "destinations": [...], "threshold": 300}
+    GET  /health
+
+Locations are names from the app's location list or "lat,lon" strings.
+Thresholds are rounded to the slider's 25 km steps.
+
+Usage:
+    python route_server.py [--host 127.0.0.1] [--port 8765]
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit, parse_qs
+
+from route_engine import RouteEngine, get_road_distance, est_time, fuel_liters, fuel_cost
+from spatial_index import GridIndex
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Range thresholds allowed by the app's slider, rounded to its steps so at
+# most one graph per step is ever built and kept
+MIN_THRESHOLD, MAX_THRESHOLD, DEFAULT_THRESHOLD = 100, 500, 300
+THRESHOLD_STEP = 25
+
+# Largest matrix (sources x destinations) served in one request
+MAX_MATRIX_CELLS = 10000
+
+# Largest k for /nearest and /search, and largest request body accepted
+MAX_NEAREST = 50
+MAX_SEARCH = 50
+MAX_BODY_BYTES = 1 << 20
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """A client error, returned to the caller as a JSON error body."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RoutingService:
+    """
+    Request handlers over one shared RouteEngine.
+
+    Args:
+        engine: RouteEngine to serve (default: a new engine over pak_cities.csv)
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine or RouteEngine()
+        self.city_index = GridIndex()
+        self.requests = 0
+        self.started = time.time()
+
+    def warm(self, threshold=DEFAULT_THRESHOLD):
+        """Build the stores and the default graph up front so no request pays for them."""
+        for city in self.engine.cities:
+            self.city_index.insert(city["lat"], city["lon"], city["name"])
+        self.engine.snap_table
+        self.engine.search_index
+        # Any query builds the in-memory location grid (the SQLite store needs none)
+        self.engine.nearest_locations(30.0, 70.0)
+        self.engine.graph(threshold)
+
+    # ---------- argument parsing ----------
+    def resolve(self, text, overlay):
+        """Return the location name for `text`, adding "lat,lon" points to overlay."""
+        if not isinstance(text, str) or text == "":
+            raise RequestError(400, "missing location")
+        try:
+            return self.engine.resolve(text, overlay)
+        except KeyError:
+            raise RequestError(404, f"unknown location '{text}'")
+        except ValueError as e:
+            raise RequestError(400, str(e))
+
+    @staticmethod
+    def number(params, key, default, cast=float, low=None, high=None):
+        value = params.get(key, default)
+        try:
+            value = cast(value)
+        except (TypeError, ValueError):
+            raise RequestError(400, f"'{key}' must be a number")
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise RequestError(400, f"'{key}' must be between {low} and {high}")
+        return value
+
+    def threshold(self, params):
+        value = self.number(params, "threshold", DEFAULT_THRESHOLD, int, MIN_THRESHOLD, MAX_THRESHOLD)
+        return MIN_THRESHOLD + round((value - MIN_THRESHOLD) / THRESHOLD_STEP) * THRESHOLD_STEP
+
+    # ---------- queries ----------
+    def route(self, params):
+        overlay = {}
+        source = self.resolve(params.get("from"), overlay)
+        dest = self.resolve(params.get("to"), overlay)
+        threshold = self.threshold(params)
+        speed = self.number(params, "speed", 60, float, 1, 300)
+        mode = params.get("mode", "car")
+        fuel_avg = self.number(params, "fuel_avg", 12.0, float, 1, 100)
+        fuel_price = self.number(params, "fuel_price", 260, float, 0, 10000)
+
+        all_locations = self.engine.location_view(overlay)
+        path, straight, route_mode = self.engine.cached_route(source, dest, threshold, all_locations, self.engine.snap_view({}))
+        road = get_road_distance(straight)
+        return {
+            "from": source,
+            "to": dest,
+            "threshold_km": threshold,
+            "route_mode": route_mode,
+            "path": [{"name": p, "lat": all_locations[p]["lat"], "lon": all_locations[p]["lon"]} for p in path],
+            "straight_distance_km": straight,
+            "road_distance_km": road,
+            "est_time": est_time(road, speed),
+            "fuel_liters": round(fuel_liters(road, mode, fuel_avg), 2),
+            "fuel_cost": fuel_cost(road, mode, fuel_avg, fuel_price),
+        }
+
+    def matrix(self, params):
+        sources, dests = params.get("sources"), params.get("destinations")
+        if not isinstance(sources, list) or not isinstance(dests, list):
+            raise RequestError(400, "'sources' and 'destinations' must be lists")
+        if len(sources) * len(dests) > MAX_MATRIX_CELLS:
+            raise RequestError(413, f"matrix larger than {MAX_MATRIX_CELLS} cells")
+        threshold = self.threshold(params)
+
+        overlay = {}
+        sources = [self.resolve(s, overlay) for s in sources]
+        dests = [self.resolve(d, overlay) for d in dests]
+        all_locations = self.engine.location_view(overlay)
+        snap_table = self.engine.snap_view({})
+
+        straight_rows, road_rows = [], []
+        for source in sources:
+            straight_row, road_row = [], []
+            for dest in dests:
+                path, straight, _ = self.engine.cached_route(source, dest, threshold, all_locations, snap_table)
+                straight_row.append(straight)
+                road_row.append(get_road_distance(straight))
+            straight_rows.append(straight_row)
+            road_rows.append(road_row)
+        return {
+            "sources": sources,
+            "destinations": dests,
+            "threshold_km": threshold,
+            "straight_distance_km": straight_rows,
+            "road_distance_km": road_rows,
+        }
+
+    def nearest(self, params):
+        lat = self.number(params, "lat", None, float, -90, 90)
+        lon = self.number(params, "lon", None, float, -180, 180)
+        k = self.number(params, "k", 1, int, 1, MAX_NEAREST)
+        locations = self.engine.locations
+        hits = self.engine.nearest_locations(lat, lon, k=k)
+        [(city_dist, city)] = self.city_index.nearest(lat, lon)
+        return {
+            "lat": lat,
+            "lon": lon,
+            "nearest_city": {"name": city, "distance_km": round(city_dist, 3)},
+            "locations": [
+                {"name": name, "type": locations[name]["type"], "distance_km": round(dist, 3)}
+                for dist, name in hits
+            ],
+        }
+
+    def search(self, params):
+        query = params.get("q", "")
+        k = self.number(params, "k", 10, int, 1, MAX_SEARCH)
+        gaz = self.engine.gazetteer
+        return {
+            "q": query,
+            "matches": [
+                {"id": i, "name": gaz.names[i], "alias": alias, "type": gaz.types[i], "category": gaz.categories[i]}
+                for i, alias in self.engine.search_index.search(query, k)
+            ],
+        }
+
+    def health(self, params):
+        return {
+            "status": "ok",
+            "locations": len(self.engine.locations),
+            "cities": len(self.engine.cities),
+            "requests": self.requests,
+            "uptime_s": round(time.time() - self.started, 1),
+            "tree_cache": self.engine.tree.cache_info()._asdict(),
+        }
+
+    # ---------- HTTP ----------
+    ROUTES = {
+        ("GET", "/route"): "route",
+        ("GET", "/nearest"): "nearest",
+        ("GET", "/search"): "search",
+        ("POST", "/matrix"): "matrix",
+        ("GET", "/health"): "health",
+    }
+
+    async def dispatch(self, method, target, body):
+        """Return (status, payload) for one request."""
+        url = urlsplit(target)
+        handler = self.ROUTES.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self.ROUTES):
+                raise RequestError(405, f"{method} not allowed on {url.path}")
+            raise RequestError(404, f"no endpoint {url.path}")
+
+        if method == "POST":
+            try:
+                params = json.loads(body or b"{}")
+            except ValueError:
+                raise RequestError(400, "request body is not valid JSON")
+            if not isinstance(params, dict):
+                raise RequestError(400, "request body must be a JSON object")
+        else:
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        loop = asyncio.get_running_loop()
+        if handler == "matrix":
+            # Matrices can be large; keep the event loop free for other clients
+            return 200, await loop.run_in_executor(None, self.matrix, params)
+        if handler == "route":
+            # So is a graph not built yet; the route itself then runs inline
+            threshold = self.threshold(params)
+            if not self.engine.has_graph(threshold):
+                await loop.run_in_executor(None, self.engine.graph, threshold)
+        return 200, getattr(self, handler)(params)
+
+    async def handle(self, reader, writer):
+        """Serve one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0 or length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413 if length > 0 else 400, {"error": "bad content length"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                self.requests += 1
+                try:
+                    status, payload = await self.dispatch(method.upper(), target, body)
+                except RequestError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive=True):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode("latin-1")
+        writer.write(head + body)
+        await writer.drain()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, service=None):
+    service = service or RoutingService()
+    start = time.perf_counter()
+    service.warm()
+    print(f"Loaded {len(service.engine.locations)} locations and the {DEFAULT_THRESHOLD} km graph "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms", file=sys.stderr)
+    server = await asyncio.start_server(service.handle, host, port, backlog=1024)
+    print(f"Routing service listening on http://{host}:{port}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON routing service for Pakistani cities and locations")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
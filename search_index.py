@@ -0,0 +1,223 @@
+"""
+Search Index for Place Names
+Server-side autocomplete over place names and their aliases. A query matches
+the start of a name or of any word in it ("iqbal" finds "Gulshan-e-Iqbal"),
+and, when that leaves room, names that share enough trigrams with it, so
+typos still find something ("rawalpndi").
+
+Prefix matches come from one sorted list of terms, so a query only looks
+at its own range of that list. Prefixes whose range is too long to rank per
+query (short ones like "k" or "isl") keep their best matches precomputed.
+Short and long queries alike answer in well under a millisecond for tens of
+thousands of places.
+"""
+
+import re
+import bisect
+import unicodedata
+from array import array
+from collections import Counter
+
+
+# Match tiers, best first
+EXACT, PREFIX, WORD_PREFIX, FUZZY = range(4)
+
+# Fuzzy matching: shortest query it runs for, and the least trigram similarity (Dice) kept
+FUZZY_MIN_QUERY = 3
+FUZZY_MIN_SIMILARITY = 0.4
+
+# Fuzzy matching reads trigram postings rarest first and stops after this many entries
+FUZZY_POSTING_BUDGET = 4000
+
+# Prefix ranges longer than this are not ranked per query; their best
+# PRECOMPUTED_TOP matches are stored instead
+SCAN_LIMIT = 1024
+PRECOMPUTED_TOP = 32
+
+# Candidates (by shared trigram count) that get an exact similarity score
+FUZZY_CANDIDATES = 32
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Sorts after any normalised text, so [q, q + _MAX_CHAR) is the range of terms starting with q
+_MAX_CHAR = "\U0010ffff"
+
+
+def normalize(text):
+    """Case-, accent- and punctuation-insensitive form of a name ("Gulshan-e-Iqbal" -> "gulshan e iqbal")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(_NON_ALNUM.sub(" ", stripped.casefold()).split())
+
+
+def trigrams(key):
+    """Set of 3-character slices of a normalised key, padded so word edges count."""
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    Prefix and fuzzy search over names and aliases.
+
+    Args:
+        entries: Iterable of (id, name, aliases, rank); a lower rank sorts
+            first among matches of the same kind (e.g. cities before areas)
+    """
+
+    def __init__(self, entries):
+        self.ids = array("q")
+        self.names = []
+        self.ranks = ranks = []
+        # One key per name or alias: normalised text, owning entry and the alias (None for the name)
+        self.keys, self.key_entry, self.key_alias = [], array("i"), []
+        for entry_id, name, aliases, rank in entries:
+            entry = len(self.names)
+            self.ids.append(entry_id)
+            self.names.append(name)
+            ranks.append(rank)
+            for alias in (None,) + tuple(aliases):
+                key = normalize(alias if alias is not None else name)
+                if key:
+                    self.keys.append(key)
+                    self.key_entry.append(entry)
+                    self.key_alias.append(alias)
+
+        # Terms: every key, plus each of its suffixes that starts a word
+        terms = []
+        for k, key in enumerate(self.keys):
+            terms.append((key, k, PREFIX))
+            for pos, ch in enumerate(key):
+                if ch == " ":
+                    terms.append((key[pos + 1:], k, WORD_PREFIX))
+        terms.sort()
+        self.terms = [t[0] for t in terms]
+        self.term_key = array("i", (t[1] for t in terms))
+        self.term_tier = bytes(t[2] for t in terms)
+
+        # Global ranking of terms: by match kind, then alias last, rank, shorter name, name
+        def static_score(t):
+            k = self.term_key[t]
+            entry = self.key_entry[k]
+            return (self.term_tier[t], self.key_alias[k] is not None, ranks[entry], len(self.names[entry]), self.names[entry])
+        self.order = array("i", sorted(range(len(self.terms)), key=static_score))
+        self.term_pos = array("i", bytes(4 * len(self.terms)))
+        for pos, t in enumerate(self.order):
+            self.term_pos[t] = pos
+        self.top = self._precompute_top()
+
+        self.key_trigrams = [None] * len(self.keys)
+        self.postings = {}
+        for k, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                self.postings.setdefault(gram, array("i")).append(k)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _precompute_top(self):
+        """Prefix -> best terms (one per entry, ranked) for every prefix with more than SCAN_LIMIT terms."""
+        heavy = set()
+        length = 1
+        while True:
+            found = False
+            start = 0
+            terms = self.terms
+            while start < len(terms):
+                prefix = terms[start][:length]
+                if len(prefix) < length:
+                    # A term shorter than the prefixes being grouped
+                    start += 1
+                    continue
+                end = bisect.bisect_left(terms, prefix + _MAX_CHAR, start)
+                if end - start > SCAN_LIMIT:
+                    heavy.add(prefix)
+                    found = True
+                start = end
+            if not found:
+                break
+            length += 1
+
+        top, seen = {prefix: [] for prefix in heavy}, {prefix: set() for prefix in heavy}
+        for t in self.order:
+            term = self.terms[t]
+            entry = self.key_entry[self.term_key[t]]
+            for length in range(1, len(term) + 1):
+                prefix = term[:length]
+                if prefix not in top:
+                    break
+                if len(top[prefix]) < PRECOMPUTED_TOP and entry not in seen[prefix]:
+                    seen[prefix].add(entry)
+                    top[prefix].append(t)
+        return {prefix: array("i", terms) for prefix, terms in top.items()}
+
+    def search(self, query, k=10):
+        """
+        Best matches for a query.
+
+        Returns:
+            List of up to k (id, alias) pairs, best first; alias is the alias
+            that matched, or None when the name did
+        """
+        q = normalize(query)
+        if not q or k <= 0:
+            return []
+        hits, seen = [], set()
+
+        def add(key):
+            entry = self.key_entry[key]
+            if entry not in seen:
+                seen.add(entry)
+                hits.append((self.ids[entry], self.key_alias[key]))
+            return len(hits) >= k
+
+        terms, term_key, term_tier, term_pos = self.terms, self.term_key, self.term_tier, self.term_pos
+        lo = bisect.bisect_left(terms, q)
+        hi = bisect.bisect_left(terms, q + _MAX_CHAR, lo)
+
+        # Whole-key matches first, then the prefix range in ranked order
+        exact_hi = bisect.bisect_right(terms, q, lo, hi)
+        for pos in sorted(term_pos[t] for t in range(lo, exact_hi) if term_tier[t] == PREFIX):
+            if add(term_key[self.order[pos]]):
+                return hits
+
+        top = self.top.get(q)
+        if top is not None and k <= PRECOMPUTED_TOP:
+            ranked = top
+        else:
+            ranked = [self.order[pos] for pos in sorted(term_pos[t] for t in range(lo, hi))]
+        for t in ranked:
+            if add(term_key[t]):
+                return hits
+
+        if len(q) >= FUZZY_MIN_QUERY:
+            for key, _ in self._fuzzy(q):
+                if add(key):
+                    break
+        return hits
+
+    def _fuzzy(self, q):
+        """(key, similarity) of keys sharing enough trigrams with q, most similar first."""
+        grams = trigrams(q)
+        counts = Counter()
+        budget = FUZZY_POSTING_BUDGET
+        for gram in sorted(grams, key=lambda g: len(self.postings.get(g, ()))):
+            posting = self.postings.get(gram)
+            if not posting:
+                continue
+            if len(posting) > budget:
+                break
+            budget -= len(posting)
+            counts.update(posting)
+
+        scored = []
+        for key, _ in counts.most_common(FUZZY_CANDIDATES):
+            key_grams = self.key_trigrams[key]
+            if key_grams is None:
+                key_grams = self.key_trigrams[key] = trigrams(self.keys[key])
+            similarity = 2 * len(grams & key_grams) / (len(grams) + len(key_grams))
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((key, similarity))
+        entry_of, ranks, names = self.key_entry, self.ranks, self.names
+        scored.sort(key=lambda item: (-item[1], ranks[entry_of[item[0]]], len(names[entry_of[item[0]]]), names[entry_of[item[0]]]))
+        return scored
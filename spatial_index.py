@@ -0,0 +1,138 @@
+"""
+Spatial Index for Latitude/Longitude Points
+Buckets points into a fixed grid of cells so nearest-neighbour and radius
+queries only look at the cells around the query point instead of every point.
+"""
+
+import math
+import heapq
+
+from dijkstra import calculate_distance_km
+
+
+# Kilometres per degree of latitude (Earth radius 6371 km)
+KM_PER_DEGREE = 6371 * math.pi / 180
+
+
+class GridIndex:
+    """
+    Grid-bucketed spatial index.
+
+    Args:
+        cell_deg: Size of each grid cell in degrees (default 0.25, ~28 km)
+    """
+
+    def __init__(self, cell_deg=0.25):
+        self.cell_deg = cell_deg
+        self.cells = {}
+        self.size = 0
+        self.min_cell = None
+        self.max_cell = None
+
+    def __len__(self):
+        return self.size
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def insert(self, lat, lon, item):
+        """Add an item located at (lat, lon)."""
+        cell = self._cell(lat, lon)
+        self.cells.setdefault(cell, []).append((lat, lon, item))
+        self.size += 1
+        if self.min_cell is None:
+            self.min_cell, self.max_cell = cell, cell
+        else:
+            self.min_cell = (min(self.min_cell[0], cell[0]), min(self.min_cell[1], cell[1]))
+            self.max_cell = (max(self.max_cell[0], cell[0]), max(self.max_cell[1], cell[1]))
+
+    def remove(self, lat, lon, item):
+        """Remove an item previously inserted at (lat, lon). Returns True if found."""
+        bucket = self.cells.get(self._cell(lat, lon), [])
+        for i, entry in enumerate(bucket):
+            if entry[2] == item:
+                bucket.pop(i)
+                self.size -= 1
+                return True
+        return False
+
+    def _ring(self, center, r):
+        """Yield the cells at Chebyshev distance exactly r from center."""
+        ci, cj = center
+        if r == 0:
+            yield center
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield (ci - r, j)
+            yield (ci + r, j)
+        for i in range(ci - r + 1, ci + r):
+            yield (i, cj - r)
+            yield (i, cj + r)
+
+    def _max_ring(self, center):
+        if self.min_cell is None:
+            return -1
+        return max(
+            center[0] - self.min_cell[0], self.max_cell[0] - center[0],
+            center[1] - self.min_cell[1], self.max_cell[1] - center[1],
+        )
+
+    def nearest(self, lat, lon, k=1, max_km=None):
+        """
+        Find the k items closest to (lat, lon).
+
+        Args:
+            lat, lon: Query point
+            k: Number of items to return
+            max_km: Optional search radius; farther items are ignored
+
+        Returns:
+            List of (distance_km, item) tuples sorted by distance
+        """
+        center = self._cell(lat, lon)
+        max_ring = self._max_ring(center)
+        best = []  # max-heap of (-distance, counter, item)
+        counter = 0
+        r = 0
+        while r <= max_ring:
+            for cell in self._ring(center, r):
+                for p_lat, p_lon, item in self.cells.get(cell, ()):
+                    dist = calculate_distance_km(lat, lon, p_lat, p_lon)
+                    if max_km is not None and dist > max_km:
+                        continue
+                    counter += 1
+                    if len(best) < k:
+                        heapq.heappush(best, (-dist, counter, item))
+                    elif dist < -best[0][0]:
+                        heapq.heapreplace(best, (-dist, counter, item))
+            # Anything outside rings 0..r is at least r cells away; longitude
+            # cells shrink towards the poles, so use the narrowest width in reach
+            lon_scale = max(0.01, math.cos(math.radians(min(89.0, abs(lat) + r * self.cell_deg))))
+            bound = r * self.cell_deg * KM_PER_DEGREE * lon_scale
+            if len(best) == k and -best[0][0] <= bound:
+                break
+            if max_km is not None and bound > max_km:
+                break
+            r += 1
+        return [(-d, item) for d, _, item in sorted(best, key=lambda e: (-e[0], e[1]))]
+
+    def within(self, lat, lon, radius_km):
+        """
+        Find all items within radius_km of (lat, lon).
+
+        Returns:
+            List of (distance_km, item) tuples sorted by distance
+        """
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = radius_km / (KM_PER_DEGREE * max(0.01, math.cos(math.radians(min(89.0, abs(lat) + dlat)))))
+        i0, j0 = self._cell(lat - dlat, lon - dlon)
+        i1, j1 = self._cell(lat + dlat, lon + dlon)
+        hits = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                for p_lat, p_lon, item in self.cells.get((i, j), ()):
+                    dist = calculate_distance_km(lat, lon, p_lat, p_lon)
+                    if dist <= radius_km:
+                        hits.append((dist, item))
+        hits.sort(key=lambda h: h[0])
+        return hits
@@ -0,0 +1,175 @@
+"""
+Startup Report
+Measures what the app costs to start: where import time goes (parsed from
+`python -X importtime`) and how long a cold first page render takes before
+any route has been searched. Exits non-zero when the cold start is over
+budget or a module that should load lazily is imported up front.
+
+Usage:
+    python startup_report.py [--top 15] [--runs 3] [--budget-ms 2000] [--output startup.json]
+    python startup_report.py --modules route_engine dijkstra
+"""
+
+import re
+import ast
+import sys
+import json
+import argparse
+import subprocess
+import time
+
+
+APP_FILE = "app.py"
+
+# A cold first render (fresh interpreter, no route yet) must finish within this
+COLD_START_BUDGET_MS = 2000
+
+# Modules that only map and picker code paths need; a first render must not import them
+LAZY_MODULES = ("pandas", "folium", "branca", "streamlit_folium")
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+COLD_START_CODE = """
+import sys, json
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+print(json.dumps({{
+    "exception": [str(e.value) for e in at.exception],
+    "has_route": bool(at.session_state["route_data"]) if "route_data" in at.session_state else False,
+    "loaded": sorted(m for m in {lazy!r} if m in sys.modules),
+}}))
+"""
+
+
+def top_level_imports(path):
+    """Module names imported at the top level of a script."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        List of (module, self_us, cumulative_us, depth) in report order
+    """
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def run_importtime(code):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def measure_imports(modules, runs):
+    """Best-of-`runs` importtime entries for importing `modules` in a fresh interpreter."""
+    code = "; ".join(f"import {m}" for m in modules)
+    # Leave out what the interpreter imports before running any code (site, encodings, ...)
+    startup = {module for module, _, _, depth in run_importtime("pass") if depth == 0}
+    best = None
+    for _ in range(runs):
+        entries, subtree = [], []
+        for entry in run_importtime(code):
+            # Children are reported before their parent, so a top-level line
+            # closes the subtree buffered since the previous one
+            subtree.append(entry)
+            if entry[3] == 0:
+                if entry[0] not in startup:
+                    entries.extend(subtree)
+                subtree = []
+        total = sum(cum for _, _, cum, depth in entries if depth == 0)
+        if best is None or total < best[0]:
+            best = (total, entries)
+    return best
+
+
+def measure_cold_start(app, runs):
+    """Best-of-`runs` wall time (ms) of a fresh interpreter rendering the app once."""
+    code = COLD_START_CODE.format(app=app, lazy=LAZY_MODULES)
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        info = json.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or elapsed_ms < best[0]:
+            best = (elapsed_ms, info)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time and cold-start render time for the app")
+    parser.add_argument("--modules", nargs="+", help=f"modules to profile (default: top-level imports of {APP_FILE})")
+    parser.add_argument("--top", type=int, default=15, help="rows in each table")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement; the best is kept")
+    parser.add_argument("--budget-ms", type=float, default=COLD_START_BUDGET_MS)
+    parser.add_argument("--skip-render", action="store_true", help="only report import time")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    modules = args.modules or top_level_imports(APP_FILE)
+    total_us, entries = measure_imports(modules, args.runs)
+    report = {"modules": modules, "import_ms": round(total_us / 1000, 1)}
+
+    print(f"Import time for: {', '.join(modules)}")
+    print(f"Total: {total_us / 1000:.1f} ms (best of {args.runs})\n")
+
+    print(f"{'cumulative ms':>14}  {'self ms':>8}  top-level module")
+    top_level = sorted((e for e in entries if e[3] == 0), key=lambda e: -e[2])
+    for module, self_us, cum_us, _ in top_level[:args.top]:
+        print(f"{cum_us / 1000:14.1f}  {self_us / 1000:8.1f}  {module}")
+
+    print(f"\n{'self ms':>14}  module (any depth)")
+    heaviest = sorted(entries, key=lambda e: -e[1])
+    for module, self_us, _, _ in heaviest[:args.top]:
+        print(f"{self_us / 1000:14.1f}  {module}")
+    report["top_level"] = [{"module": m, "cumulative_ms": round(c / 1000, 2), "self_ms": round(s / 1000, 2)}
+                           for m, s, c, _ in top_level[:args.top]]
+
+    failures = []
+    eager = sorted(m for m in LAZY_MODULES if any(e[0] == m for e in entries))
+    if eager:
+        failures.append(f"imported at startup: {', '.join(eager)}")
+
+    if not args.skip_render:
+        render_ms, info = measure_cold_start(APP_FILE, args.runs)
+        report.update({"cold_start_ms": round(render_ms), "budget_ms": args.budget_ms, "render": info})
+        print(f"\nCold first render (no route): {render_ms:.0f} ms, budget {args.budget_ms:.0f} ms")
+        if info["exception"]:
+            failures.append(f"first render raised: {info['exception'][0]}")
+        if info["loaded"]:
+            failures.append(f"loaded by first render: {', '.join(info['loaded'])}")
+        if render_ms > args.budget_ms:
+            failures.append(f"cold start {render_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+
+    report["failures"] = failures
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
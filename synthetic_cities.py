@@ -0,0 +1,152 @@
+"""
+Synthetic City Generator
+Seeded city sets of any size (1k to 1M points and beyond) inside Pakistan's
+bounding box, written in the pak_cities.csv schema (City, Latitude,
+Longitude), so graph builders, search and spatial indexes can be measured
+at sizes the real 277-city dataset cannot show.
+
+Points are clustered the way settlements are: each is drawn around a real
+city of pak_cities.csv, with the cities of each province weighted by its
+share of settlements (dense Punjab and Sindh, sparse Balochistan and the
+north) and a province-specific spread; a share of points is scattered more
+widely to fill the countryside. A point that lands outside the bounding box
+is drawn again, so none pile up on its edges. Names are built from common place-name
+parts ("Kot", "Chak", "-pur", "-abad", ...) and numbered when repeated, so
+name search sees realistic shared prefixes. The same seed and size always
+give the same file.
+
+Usage:
+    python synthetic_cities.py -n 100000 [--seed 42] [-o synthetic_cities_100000.csv]
+"""
+
+import os
+import csv
+import math
+import random
+import bisect
+import argparse
+
+from dijkstra import load_cities
+
+
+# Latitude/longitude bounds of Pakistan (min_lat, min_lon, max_lat, max_lon)
+PAKISTAN_BBOX = (23.6, 60.9, 37.1, 77.8)
+
+# Share of settlements and spread around each city (km) per province
+REGIONS = {
+    "Punjab": (0.53, 15),
+    "Sindh": (0.23, 15),
+    "Khyber Pakhtunkhwa": (0.15, 12),
+    "Balochistan": (0.06, 35),
+    "Gilgit-Baltistan and Azad Kashmir": (0.03, 10),
+}
+
+# Points scattered around a city with SCATTER_FACTOR times the usual spread
+SCATTER_SHARE = 0.15
+SCATTER_FACTOR = 4
+
+NAME_PREFIXES = ("", "", "", "Kot ", "Chak ", "Basti ", "Goth ", "Dera ", "Pind ", "Mian ", "Shah ", "Bhai ")
+NAME_ROOTS = ("Ali", "Khan", "Nawab", "Sher", "Rahim", "Karim", "Fateh", "Jalal", "Hassan", "Qadir", "Mir",
+              "Sultan", "Noor", "Ghulam", "Baha", "Sikandar", "Habib", "Latif", "Mohsin", "Yar", "Daud",
+              "Bahawal", "Sadiq", "Gul", "Jahan", "Zafar", "Raja", "Malik", "Chaudhry", "Sardar")
+NAME_SUFFIXES = ("pur", "abad", "wala", "garh", "kot", "nagar", " Sharif", " Town", " Mandi", "", "ani", "zai")
+
+KM_PER_DEGREE = 6371 * math.pi / 180
+
+
+def region_of(lat, lon):
+    """Rough province of a point, by simple coordinate rules (enough for weighting)."""
+    if lat >= 35 or (lat >= 33.8 and lon >= 73.4):
+        return "Gilgit-Baltistan and Azad Kashmir"
+    if lat < 28.5 and lon >= 66.7:
+        return "Sindh"
+    if lon < 69.3 and lat < 32.5:
+        return "Balochistan"
+    if (lat >= 31.5 and lon < 71.2) or (lat >= 33.7 and lon < 73.4):
+        return "Khyber Pakhtunkhwa"
+    return "Punjab"
+
+
+def in_bbox(lat, lon):
+    min_lat, min_lon, max_lat, max_lon = PAKISTAN_BBOX
+    return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+
+
+def default_centres():
+    """(lat, lon) of the real cities next to this module."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pak_cities.csv")
+    return [(c["lat"], c["lon"]) for c in load_cities(path)]
+
+
+def generate_cities(n, seed=42, centres=None):
+    """
+    Yield n (name, lat, lon) synthetic cities with unique names.
+
+    Args:
+        n: Number of cities
+        seed: Random seed; the same seed and n give the same cities
+        centres: (lat, lon) points to cluster around (default: the real cities);
+            any outside the bounding box (bad source rows) are skipped
+    """
+    rng = random.Random(seed)
+    centres = [c for c in (default_centres() if centres is None else centres) if in_bbox(*c)]
+    by_region = {}
+    for lat, lon in centres:
+        by_region.setdefault(region_of(lat, lon), []).append((lat, lon))
+
+    # Each centre gets an equal part of its province's share
+    weighted, cumulative, total = [], [], 0.0
+    for region, points in by_region.items():
+        share, spread = REGIONS[region]
+        for point in points:
+            total += share / len(points)
+            weighted.append((point, spread))
+            cumulative.append(total)
+
+    seen = {}
+    for _ in range(n):
+        (c_lat, c_lon), spread = weighted[bisect.bisect_left(cumulative, rng.random() * total)]
+        if rng.random() < SCATTER_SHARE:
+            spread *= SCATTER_FACTOR
+        # Redrawn around the same centre (which is inside) until it lands inside
+        lat, lon = None, None
+        while lat is None or not in_bbox(lat, lon):
+            lat = c_lat + rng.gauss(0, spread) / KM_PER_DEGREE
+            lon = c_lon + rng.gauss(0, spread) / (KM_PER_DEGREE * math.cos(math.radians(c_lat)))
+
+        name = rng.choice(NAME_PREFIXES) + rng.choice(NAME_ROOTS) + rng.choice(NAME_SUFFIXES)
+        count = seen.get(name, 0) + 1
+        seen[name] = count
+        if count > 1:
+            name = f"{name} {count}"
+        yield name, round(lat, 4), round(lon, 4)
+
+
+def write_cities(path, cities):
+    """Write (name, lat, lon) rows in the pak_cities.csv schema, replacing `path` once complete."""
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["City", "Latitude", "Longitude"])
+        for name, lat, lon in cities:
+            writer.writerow([name, lat, lon])
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic city set inside Pakistan")
+    parser.add_argument("-n", "--count", type=int, default=10000, help="number of cities (default 10000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", default=None, help="output CSV (default synthetic_cities_<n>.csv)")
+    args = parser.parse_args()
+
+    output = args.output or f"synthetic_cities_{args.count}.csv"
+    written = write_cities(output, generate_cities(args.count, args.seed))
+    print(f"Saved {written} synthetic cities (seed {args.seed}) to: {output}")
+
+
+if __name__ == "__main__":
+    main()